@@ -3,10 +3,11 @@
 このモジュールはエージェントを生成するためのガーデンを提供します。
 """
 
-from typing import Dict
+from typing import Callable, Dict, Optional, Union
 
 from google.adk.agents import Agent
 from google.adk.agents.llm_agent import LlmAgent
+from google.adk.models.base_llm import BaseLlm
 from utils.logging import setup_cloud_logging
 from tools.youtube_tools import get_recipe_from_youtube
 from tools.send_line_message import send_line_message
@@ -16,20 +17,38 @@ from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset, StdioServerParamet
 # ロガー
 logger = setup_cloud_logging("agent_manager")
 
+# エージェント名と設定上のモデル名から、エージェントに割り当てるモデルを返す関数
+ModelFactory = Callable[[str, Optional[str]], Union[str, BaseLlm]]
+
 class AgentManager:
     """エージェントのガーデン
 
     エージェントの生成ロジックをカプセル化して提供します。
     """
 
-    def __init__(self, prompts: Dict, config: Dict):
+    def __init__(self, prompts: Dict, config: Dict, model_factory: Optional[ModelFactory] = None):
         self.prompts = prompts
         self.config = config
+        # モデルの差し替え（ベンチマーク用のフェイクLLMなど）
+        self.model_factory = model_factory
         # 共通変数を追加
         self.common_variables = {
             "required_fields": "名前、材料、手順",
         }
 
+    def _model(self, agent_config: Dict) -> Union[str, BaseLlm]:
+        """エージェントに割り当てるモデルを取得
+
+        Args:
+            agent_config: エージェントの設定
+
+        Returns:
+            モデル名、またはmodel_factoryが返したモデル
+        """
+        if self.model_factory is None:
+            return agent_config["model"]
+        return self.model_factory(agent_config["name"], agent_config["model"])
+
     def recipe_manager(self) -> ParallelAgent:
         # 設定からサブエージェント情報を取得
         recipe_manager_config = self.config["recipe_manager"]
@@ -40,7 +59,7 @@ class AgentManager:
         youtube_search_instruction = self.prompts[youtube_search_agent_config["prompt_key"]]
         youtube_search_agent = LlmAgent(
             name=youtube_search_agent_config["name"],
-            model=youtube_search_agent_config["model"],
+            model=self._model(youtube_search_agent_config),
             description=youtube_search_agent_config["description"],
             instruction=youtube_search_instruction,
             tools=[
@@ -52,7 +71,7 @@ class AgentManager:
         google_search_instruction = self.prompts[google_search_agent_config["prompt_key"]]
         google_search_agent = LlmAgent(
             name=google_search_agent_config["name"],
-            model=google_search_agent_config["model"],
+            model=self._model(google_search_agent_config),
             description=google_search_agent_config["description"],
             instruction=google_search_instruction,
             tools=[google_search],
@@ -76,7 +95,7 @@ class AgentManager:
         
         return LlmAgent(
             name=cfg["name"],
-            model=cfg["model"],
+            model=self._model(cfg),
             description=cfg["description"],
             instruction=image_analysis_manager_instruction,
             tools=[],
@@ -90,7 +109,7 @@ class AgentManager:
         line_response_instruction = self.prompts[line_response_agent_config["prompt_key"]]
         line_response_agent = LlmAgent(
             name=line_response_agent_config["name"],
-            model=line_response_agent_config["model"],
+            model=self._model(line_response_agent_config),
             description=line_response_agent_config["description"],
             instruction=line_response_instruction,
             tools=[
@@ -129,7 +148,7 @@ class AgentManager:
         
         return LlmAgent(
             name=cfg["name"],
-            model=cfg["model"],
+            model=self._model(cfg),
             instruction=root_instruction,
             description=cfg["description"],
             sub_agents=[
@@ -0,0 +1,122 @@
+"""エージェントのコールバックモジュール
+
+このモジュールは、エージェントのモデル呼び出し・ツール呼び出しの前に実行する
+コールバックを提供します。Webhook受信時に決めた処理期限をサブエージェントや
+ツールの呼び出しにも適用し、期限切れ後の呼び出しを打ち切ります。
+"""
+
+from typing import Any, Callable, Dict, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.llm_agent import LlmAgent
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from utils.deadline import remaining
+from utils.logging import setup_cloud_logging
+
+logger = setup_cloud_logging("agent_callbacks")
+
+# 期限切れを示すエラーコード
+DEADLINE_EXCEEDED = "DEADLINE_EXCEEDED"
+
+
+def deadline_before_model_callback(
+    callback_context: Any, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    """モデル呼び出し前に期限を確認
+
+    期限切れの場合はモデルを呼び出さずにエラー応答を返し、
+    期限内であればモデル呼び出しのHTTPタイムアウトを残り時間に合わせます。
+
+    Args:
+        callback_context: コールバックコンテキスト
+        llm_request: モデルへのリクエスト
+
+    Returns:
+        期限切れの場合はエラー応答、それ以外はNone（通常どおり呼び出す）
+    """
+    time_left = remaining()
+    if time_left is None:
+        return None
+
+    if time_left <= 0:
+        logger.warning(
+            f"Deadline exceeded before model call: agent={callback_context.agent_name}"
+        )
+        return LlmResponse(
+            error_code=DEADLINE_EXCEEDED,
+            error_message="request deadline exceeded before model call",
+        )
+
+    http_options = llm_request.config.http_options or types.HttpOptions()
+    timeout_ms = max(1, int(time_left * 1000))
+    if http_options.timeout is None or http_options.timeout > timeout_ms:
+        http_options.timeout = timeout_ms
+    llm_request.config.http_options = http_options
+    return None
+
+
+def deadline_before_tool_callback(
+    tool: Any, args: Dict[str, Any], tool_context: Any
+) -> Optional[Dict[str, Any]]:
+    """ツール呼び出し前に期限を確認
+
+    Args:
+        tool: 呼び出すツール
+        args: ツールの引数
+        tool_context: ツールコンテキスト
+
+    Returns:
+        期限切れの場合はエラー結果、それ以外はNone（通常どおり呼び出す）
+    """
+    time_left = remaining()
+    if time_left is None or time_left > 0:
+        return None
+
+    logger.warning(f"Deadline exceeded before tool call: tool={tool.name}")
+    return {
+        "status": "error",
+        "error_code": DEADLINE_EXCEEDED,
+        "error_message": "request deadline exceeded before tool call",
+    }
+
+
+def _prepend_callback(existing: Any, callback: Callable) -> Any:
+    """既存のコールバックの前にコールバックを追加
+
+    Args:
+        existing: 既存のコールバック（単体・リスト・None）
+        callback: 追加するコールバック
+
+    Returns:
+        追加後のコールバック
+    """
+    if existing is None:
+        return callback
+    callbacks = existing if isinstance(existing, list) else [existing]
+    if callback in callbacks:
+        return existing
+    return [callback, *callbacks]
+
+
+def attach_deadline_guards(agent: BaseAgent) -> BaseAgent:
+    """エージェントとそのサブエージェントすべてに期限確認のコールバックを設定
+
+    Args:
+        agent: ルートとなるエージェント
+
+    Returns:
+        コールバックを設定したエージェント（引数と同じインスタンス）
+    """
+    if isinstance(agent, LlmAgent):
+        agent.before_model_callback = _prepend_callback(
+            agent.before_model_callback, deadline_before_model_callback
+        )
+        agent.before_tool_callback = _prepend_callback(
+            agent.before_tool_callback, deadline_before_tool_callback
+        )
+    for sub_agent in agent.sub_agents:
+        attach_deadline_guards(sub_agent)
+    return agent
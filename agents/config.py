@@ -14,6 +14,10 @@ load_dotenv()
 DEFAULT_MODEL = os.environ.get("GEMINI_DEFAULT_MODEL")
 SEARCH_MODEL = os.environ.get("GEMINI_SEARCH_MODEL")  # 検索用の軽量モデル
 
+# LLMのバックエンド（vertex: 実際のモデル / fake: スクリプトで応答するフェイクLLM）
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "vertex")
+FAKE_LLM_SCRIPT = os.environ.get("FAKE_LLM_SCRIPT")  # フェイクLLMのスクリプト（YAML）
+
 # 共通の設定値
 RECIPE_DATABASE_ID = "personal-database-id"
 ERROR_PREVENTION = (
@@ -0,0 +1,290 @@
+"""フェイクLLMモジュール
+
+このモジュールは、Vertex AIを呼び出さずにエージェント構成全体を動かすための
+フェイクのLLMバックエンドを提供します。エージェントごとのスクリプトに従って
+テキスト応答や関数呼び出しを返し、設定した分布に従って応答時間を再現します。
+フレームワークやセッション管理のオーバーヘッドをオフラインで計測する用途を想定しています。
+"""
+
+import asyncio
+import math
+import random
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+import yaml
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+from pydantic import PrivateAttr
+
+from utils.logging import setup_cloud_logging
+
+logger = setup_cloud_logging("fake_llm")
+
+# google_searchツールがGeminiモデル以外を拒否するため、Geminiの命名に合わせる
+FAKE_MODEL_NAME = "gemini-fake"
+
+# ストリーミング時に1つの応答を分割するチャンク数
+STREAM_CHUNKS = 3
+
+# 既定のスクリプト（ルートから各サブエージェントへ委譲し、テキストで応答する）
+DEFAULT_FAKE_SCRIPTS: Dict[str, Dict[str, Any]] = {
+    "root_agent": {
+        "steps": [
+            {"function_call": {"name": "transfer_to_agent", "args": {"agent_name": "recipe_manager"}}},
+        ],
+        "image_steps": [
+            {"function_call": {"name": "transfer_to_agent", "args": {"agent_name": "image_analysis_manager"}}},
+        ],
+    },
+    "youtube_search_agent": {
+        "steps": [{"text": "【YouTube】鶏むね肉の照り焼き\n材料: 鶏むね肉、醤油、みりん、砂糖\n手順: 焼いてタレを絡める"}],
+    },
+    "google_search_agent": {
+        "steps": [{"text": "【Web】鶏むね肉のガーリックソテー\n材料: 鶏むね肉、にんにく、塩こしょう\n手順: 下味をつけて焼く"}],
+    },
+    "image_analysis_manager": {
+        "steps": [{"text": "画像から次の食材を見つけました。\n- 鶏むね肉\n- 玉ねぎ\n- にんじん"}],
+    },
+    "line_response_agent": {
+        "steps": [{"text": "LINEで送信しました。"}],
+    },
+}
+
+
+@dataclass
+class LatencyModel:
+    """応答時間の分布
+
+    Attributes:
+        distribution: 分布の種類（fixed / uniform / lognormal）
+        median: fixedでは固定値、lognormalでは中央値（秒）
+        sigma: lognormalのばらつき（対数の標準偏差）
+        low: uniformの下限（秒）
+        high: uniformの上限（秒）
+    """
+
+    distribution: str = "lognormal"
+    median: float = 0.5
+    sigma: float = 0.4
+    low: float = 0.0
+    high: float = 1.0
+
+    def sample(self, rng: random.Random) -> float:
+        """応答時間を1件サンプリング
+
+        Args:
+            rng: 乱数生成器
+
+        Returns:
+            応答時間（秒）
+        """
+        if self.distribution == "fixed":
+            return max(0.0, self.median)
+        if self.distribution == "uniform":
+            return rng.uniform(self.low, self.high)
+        if self.distribution == "lognormal":
+            if self.median <= 0:
+                return 0.0
+            return rng.lognormvariate(math.log(self.median), self.sigma)
+        raise ValueError(f"Unknown latency distribution: {self.distribution}")
+
+
+class FakeLlm(BaseLlm):
+    """スクリプトに従って応答するフェイクLLM
+
+    リクエスト内でこのエージェントが完了させた関数呼び出しの数から現在のステップを決め、
+    スクリプトの該当ステップ（テキストまたは関数呼び出し）を返します。
+    最新のユーザー入力に画像が含まれる場合は image_steps を優先します。
+    """
+
+    model: str = FAKE_MODEL_NAME
+    agent_name: str = ""
+    steps: List[Dict[str, Any]] = []
+    image_steps: Optional[List[Dict[str, Any]]] = None
+    latency: LatencyModel = LatencyModel()
+    seed: Optional[int] = None
+
+    _rng: random.Random = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        return []
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        """スクリプトの次のステップを応答として返す
+
+        Args:
+            llm_request: モデルへのリクエスト
+            stream: ストリーミングで返すかどうか
+
+        Yields:
+            LlmResponse: 応答（ストリーミング時は部分応答の後に完全な応答）
+        """
+        step = self._next_step(llm_request)
+        delay = self.latency.sample(self._rng)
+        usage = self._usage(llm_request, step)
+
+        if "function_call" in step:
+            call = step["function_call"]
+            await asyncio.sleep(delay)
+            yield LlmResponse(
+                content=types.Content(
+                    role="model",
+                    parts=[types.Part(function_call=types.FunctionCall(
+                        name=call["name"], args=dict(call.get("args") or {})
+                    ))],
+                ),
+                usage_metadata=usage,
+            )
+            return
+
+        text = step.get("text", "")
+        if stream and text:
+            chunk_size = max(1, math.ceil(len(text) / STREAM_CHUNKS))
+            for start in range(0, len(text), chunk_size):
+                await asyncio.sleep(delay / STREAM_CHUNKS)
+                yield LlmResponse(
+                    content=types.Content(
+                        role="model", parts=[types.Part(text=text[start:start + chunk_size])]
+                    ),
+                    partial=True,
+                )
+        else:
+            await asyncio.sleep(delay)
+
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=text)]),
+            usage_metadata=usage,
+        )
+
+    def _next_step(self, llm_request: LlmRequest) -> Dict[str, Any]:
+        """リクエストの内容から返すべきステップを決定
+
+        Args:
+            llm_request: モデルへのリクエスト
+
+        Returns:
+            ステップ（text または function_call を持つ辞書）
+        """
+        completed_calls = 0
+        has_image = False
+        for content in reversed(llm_request.contents):
+            parts = content.parts or []
+            if content.role == "model":
+                continue
+            if parts and all(part.function_response for part in parts):
+                completed_calls += 1
+                continue
+            # 最新のユーザー入力（または他エージェントからの引き継ぎ）に到達
+            has_image = any(part.inline_data for part in parts)
+            break
+
+        steps = self.image_steps if has_image and self.image_steps else self.steps
+        if completed_calls < len(steps):
+            return steps[completed_calls]
+
+        # スクリプトを使い切った場合は、関数呼び出しを繰り返さないようテキストで終える
+        return {"text": f"（fake）{self.agent_name}の応答です。"}
+
+    @staticmethod
+    def _usage(
+        llm_request: LlmRequest, step: Dict[str, Any]
+    ) -> types.GenerateContentResponseUsageMetadata:
+        """文字数からおおよそのトークン使用量を作成
+
+        Args:
+            llm_request: モデルへのリクエスト
+            step: 返すステップ
+
+        Returns:
+            トークン使用量
+        """
+        prompt_chars = sum(
+            len(part.text or "")
+            for content in llm_request.contents
+            for part in content.parts or []
+        )
+        prompt_tokens = prompt_chars // 4 + 1
+        candidates_tokens = len(step.get("text", "")) // 4 + 1
+        return types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=candidates_tokens,
+            total_token_count=prompt_tokens + candidates_tokens,
+        )
+
+
+class FakeModelFactory:
+    """エージェントごとにFakeLlmを作成するモデルファクトリー
+
+    AgentManagerのmodel_factoryとして渡すと、設定上のモデル名の代わりに
+    FakeLlmがエージェントに割り当てられます。
+    """
+
+    def __init__(
+        self,
+        scripts: Optional[Dict[str, Dict[str, Any]]] = None,
+        latency: Optional[LatencyModel] = None,
+        seed: Optional[int] = None,
+    ):
+        """初期化
+
+        Args:
+            scripts: エージェント名ごとのスクリプト（省略時は既定のスクリプト）
+            latency: 既定の応答時間の分布（スクリプトのlatencyで上書き可能）
+            seed: 乱数のシード（エージェントごとにずらして使用）
+        """
+        self.scripts = scripts if scripts is not None else DEFAULT_FAKE_SCRIPTS
+        self.latency = latency or LatencyModel()
+        self.seed = seed
+        self._created = 0
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs: Any) -> "FakeModelFactory":
+        """YAMLファイルからスクリプトを読み込んで作成
+
+        Args:
+            path: スクリプトファイルのパス
+            **kwargs: コンストラクタに渡す追加の引数
+
+        Returns:
+            FakeModelFactory: 作成したファクトリー
+        """
+        with open(path, "r", encoding="utf-8") as file:
+            scripts = yaml.safe_load(file) or {}
+        logger.info(f"Loaded fake LLM scripts for {len(scripts)} agents from {path}")
+        return cls(scripts=scripts, **kwargs)
+
+    def __call__(self, agent_name: str, model_name: Optional[str]) -> FakeLlm:
+        """エージェント用のFakeLlmを作成
+
+        Args:
+            agent_name: エージェント名
+            model_name: 設定上のモデル名（Geminiの命名であればそのまま使用）
+
+        Returns:
+            FakeLlm: 作成したフェイクLLM
+        """
+        script = self.scripts.get(agent_name, {})
+        latency = self.latency
+        if script.get("latency"):
+            latency = LatencyModel(**{**vars(self.latency), **script["latency"]})
+
+        seed = None if self.seed is None else self.seed + self._created
+        self._created += 1
+
+        return FakeLlm(
+            model=model_name if model_name and model_name.startswith("gemini-") else FAKE_MODEL_NAME,
+            agent_name=agent_name,
+            steps=script.get("steps", []),
+            image_steps=script.get("image_steps"),
+            latency=latency,
+            seed=seed,
+        )
@@ -2,11 +2,13 @@
 """シンプルなエージェント定義モジュール"""
 
 from contextlib import AsyncExitStack
-from typing import Tuple
+from typing import Optional, Tuple
 
 from google.adk.agents.llm_agent import LlmAgent
-from agents.agent_manager import AgentManager
-from agents.config import AGENT_CONFIG
+from agents.agent_manager import AgentManager, ModelFactory
+from agents.callbacks import attach_deadline_guards
+from agents.config import AGENT_CONFIG, FAKE_LLM_SCRIPT, LLM_BACKEND
+from agents.fake_llm import FakeModelFactory
 from utils.logging import setup_cloud_logging
 from agents.prompt_manager import PromptManager
 
@@ -17,9 +19,21 @@ logger = setup_cloud_logging("root_agent")
 _root_agent = None
 _exit_stack = AsyncExitStack()
 
-async def create_agent() -> Tuple[LlmAgent, AsyncExitStack]:
+def _default_model_factory() -> Optional[ModelFactory]:
+    """LLM_BACKENDの設定に応じたモデルファクトリーを返す"""
+    if LLM_BACKEND != "fake":
+        return None
+    logger.warning("LLM_BACKEND=fake: エージェントはフェイクLLMで応答します")
+    if FAKE_LLM_SCRIPT:
+        return FakeModelFactory.from_file(FAKE_LLM_SCRIPT)
+    return FakeModelFactory()
+
+async def create_agent(model_factory: Optional[ModelFactory] = None) -> Tuple[LlmAgent, AsyncExitStack]:
     """シンプルなエージェントを作成する
 
+    Args:
+        model_factory: モデルの差し替えに使う関数（省略時はLLM_BACKENDの設定に従う）
+
     Returns:
         Tuple[LlmAgent, AsyncExitStack]: エージェントとリソース管理用のexitスタック
     """
@@ -33,7 +47,11 @@ async def create_agent() -> Tuple[LlmAgent, AsyncExitStack]:
         prompt_manager = PromptManager()
         prompts = prompt_manager.get_all_prompts()
 
-        factory = AgentManager(prompts=prompts, config=AGENT_CONFIG)
+        factory = AgentManager(
+            prompts=prompts,
+            config=AGENT_CONFIG,
+            model_factory=model_factory or _default_model_factory(),
+        )
 
         # すべての標準エージェントを作成
         agents = factory.create_all_standard_agents()
@@ -41,6 +59,9 @@ async def create_agent() -> Tuple[LlmAgent, AsyncExitStack]:
         # ルートエージェントを作成
         _root_agent = factory.create_root_agent(agents)
 
+        # 処理期限をサブエージェント・ツールの呼び出しにも適用
+        attach_deadline_guards(_root_agent)
+
     except Exception as e:
         logger.error(f"エージェント作成中にエラーが発生: {e}")
         raise
@@ -0,0 +1,196 @@
+"""エージェント構成全体のスループット・レイテンシベンチマーク
+
+フェイクLLM（agents.fake_llm）をすべてのエージェントに割り当て、Vertex AIを呼び出さずに
+AgentService.call_agent_text / call_agent_with_image を指定した並行数で実行します。
+モデルの応答時間はスクリプトの分布で再現されるため、フレームワークとセッション管理の
+オーバーヘッドをコミット間でオフラインに比較できます。
+既定では質問・画像をリクエストごとに変えるため、応答キャッシュ・画像解析キャッシュや
+実行の共有を通らずに、毎回エージェントを実行した場合の性能を計測します。
+
+使い方:
+    python -m benchmarks.agent_graph --requests 200 --concurrency 20
+    python -m benchmarks.agent_graph --mode image --latency fixed --latency-median 0 --json
+    python -m benchmarks.agent_graph --repeat-question  # 応答キャッシュの効果を計測
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import random
+import resource
+import subprocess
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from agents.fake_llm import FakeModelFactory, LatencyModel
+from services.agent_service import AgentBusyError, AgentService
+from utils.metrics import LatencyRecorder
+
+TEXT_MESSAGE = "鶏むね肉を使ったレシピを教えてください"
+IMAGE_MESSAGE = "この画像から食材を抽出してください"
+IMAGE_MIME_TYPE = "image/jpeg"
+
+
+def make_image(seed: int, size: int) -> bytes:
+    """ベンチマーク用のJPEG画像を作成
+
+    Args:
+        seed: 乱数のシード（異なるシードで異なる画像になる）
+        size: 画像の一辺のピクセル数
+
+    Returns:
+        JPEG画像のバイト列
+    """
+    rng = random.Random(seed)
+    image = Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3))
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+def git_revision() -> Optional[str]:
+    """現在のコミットを取得（gitが使えない場合はNone）"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict:
+    """ベンチマークを実行
+
+    Args:
+        args: コマンドライン引数
+
+    Returns:
+        計測結果
+    """
+    latency = LatencyModel(
+        distribution=args.latency,
+        median=args.latency_median,
+        sigma=args.latency_sigma,
+        low=args.latency_low,
+        high=args.latency_high,
+    )
+    if args.script:
+        factory = FakeModelFactory.from_file(args.script, latency=latency, seed=args.seed)
+    else:
+        factory = FakeModelFactory(latency=latency, seed=args.seed)
+
+    service = AgentService()
+    await service.init_agent(model_factory=factory)
+
+    images: List[bytes] = []
+    if args.mode == "image":
+        # 同じ画像を繰り返す場合は画像解析キャッシュの効果も計測される
+        count = 1 if args.repeat_images else args.requests + args.warmup
+        images = [make_image(args.seed + i, args.image_size) for i in range(count)]
+
+    async def call(index: int) -> None:
+        user_id = f"bench-user-{index % args.users}"
+        if args.mode == "image":
+            image = images[index % len(images)]
+            await service.call_agent_with_image(IMAGE_MESSAGE, image, IMAGE_MIME_TYPE, user_id)
+        else:
+            # 同じ質問を繰り返す場合は応答キャッシュと実行の共有の効果も計測される
+            message = TEXT_MESSAGE if args.repeat_question else f"{TEXT_MESSAGE}（{index}）"
+            await service.call_agent_text(message, user_id)
+
+    for index in range(args.warmup):
+        await call(index)
+
+    recorder = LatencyRecorder(window_size=args.requests)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    outcomes = {"ok": 0, "busy": 0, "error": 0}
+
+    async def timed_call(index: int) -> None:
+        async with semaphore:
+            started_at = time.perf_counter()
+            try:
+                await call(args.warmup + index)
+                outcomes["ok"] += 1
+            except AgentBusyError:
+                outcomes["busy"] += 1
+            except Exception:
+                outcomes["error"] += 1
+            finally:
+                recorder.record(time.perf_counter() - started_at)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    started_at = time.perf_counter()
+    await asyncio.gather(*(timed_call(index) for index in range(args.requests)))
+    elapsed = time.perf_counter() - started_at
+
+    memory = {"max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    if args.tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory.update(
+            python_heap_mb=current / 1024 / 1024,
+            python_heap_peak_mb=peak / 1024 / 1024,
+        )
+
+    return {
+        "commit": git_revision(),
+        "mode": args.mode,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "users": args.users,
+        "latency_model": vars(latency),
+        "outcomes": outcomes,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": args.requests / elapsed if elapsed else 0.0,
+        "latency_seconds": recorder.snapshot(),
+        "memory": memory,
+        "executor": service.executor_stats(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["text", "image"], default="text", help="実行する処理")
+    parser.add_argument("--requests", type=int, default=100, help="計測するリクエスト数")
+    parser.add_argument("--concurrency", type=int, default=10, help="同時に実行するリクエスト数")
+    parser.add_argument("--users", type=int, default=10, help="リクエストを振り分けるユーザー数")
+    parser.add_argument("--warmup", type=int, default=2, help="計測前に逐次実行するリクエスト数")
+    parser.add_argument("--script", help="フェイクLLMのスクリプト（YAML）。省略時は既定のスクリプト")
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal",
+                        help="モデル応答時間の分布")
+    parser.add_argument("--latency-median", type=float, default=0.5, help="fixedの値 / lognormalの中央値（秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="lognormalのばらつき")
+    parser.add_argument("--latency-low", type=float, default=0.0, help="uniformの下限（秒）")
+    parser.add_argument("--latency-high", type=float, default=1.0, help="uniformの上限（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    parser.add_argument("--image-size", type=int, default=512, help="画像の一辺のピクセル数")
+    parser.add_argument("--repeat-images", action="store_true", help="すべてのリクエストで同じ画像を使う")
+    parser.add_argument("--repeat-question", action="store_true", help="すべてのリクエストで同じ質問を使う")
+    parser.add_argument("--tracemalloc", action="store_true", help="Pythonヒープの使用量も計測する（低速）")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    latency = result["latency_seconds"]
+    print(f"commit: {result['commit']}  mode: {args.mode}  "
+          f"requests: {args.requests}  concurrency: {args.concurrency}  users: {args.users}")
+    print(f"outcomes: {result['outcomes']}")
+    print(f"throughput: {result['throughput_rps']:.2f} req/s ({result['elapsed_seconds']:.2f} s)")
+    print(f"latency: p50={latency['p50']:.3f}s p95={latency['p95']:.3f}s "
+          f"p99={latency['p99']:.3f}s avg={latency['avg']:.3f}s")
+    print("memory: " + "  ".join(f"{key}={value:.1f}" for key, value in result["memory"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""ローカルで動くLINE Messaging APIのフェイクサーバー
+
+負荷試験でLINEのAPIを呼び出さないよう、アプリが使う次のエンドポイントを実装します。
+
+    POST /v2/bot/message/reply            返信（同じ返信トークンの再利用は400）
+    POST /v2/bot/message/push             プッシュ送信
+    GET  /v2/bot/message/{id}/content     画像コンテンツ（生成したJPEGを返す）
+    GET  /stats                           エンドポイントごとの件数・レイテンシ
+
+応答時間とエラー率（429）を指定でき、受信したメッセージ数とレイテンシを記録します。
+アプリ側は LINE_API_ENDPOINT と LINE_API_DATA_ENDPOINT をこのサーバーに向けてください。
+
+使い方:
+    python -m benchmarks.fake_line_api --port 8081 --latency-ms 30 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import io
+import random
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict
+
+from aiohttp import web
+from PIL import Image
+
+from utils.metrics import LatencyRecorder
+
+
+class FakeLineApi:
+    """LINE Messaging APIのフェイク実装"""
+
+    def __init__(
+        self,
+        latency_ms: float = 30.0,
+        jitter_ms: float = 10.0,
+        error_rate: float = 0.0,
+        image_size: int = 1024,
+        seed: int = 0,
+    ):
+        """初期化
+
+        Args:
+            latency_ms: 応答までの平均時間（ミリ秒）
+            jitter_ms: 応答時間のばらつき（ミリ秒、一様分布の幅の半分）
+            error_rate: 429（レート制限）を返す割合
+            image_size: 画像コンテンツの一辺のピクセル数
+            seed: 乱数のシード
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._image = self._make_image(image_size)
+        self._used_reply_tokens = set()
+        self._latency: Dict[str, LatencyRecorder] = defaultdict(LatencyRecorder)
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._messages_sent = 0
+
+    def _make_image(self, size: int) -> bytes:
+        """画像コンテンツとして返すJPEGを作成"""
+        image = Image.frombytes("RGB", (size, size), self._rng.randbytes(size * size * 3))
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=85)
+        return output.getvalue()
+
+    async def _simulate(self, operation: str) -> bool:
+        """応答時間を再現し、レート制限を返すかどうかを決める
+
+        Args:
+            operation: 操作名
+
+        Returns:
+            レート制限を返す場合はTrue
+        """
+        delay = self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(0.0, delay) / 1000)
+        if self._rng.random() < self.error_rate:
+            self._counts[operation]["429"] += 1
+            return True
+        return False
+
+    def _observe(self, operation: str, status: int, started_at: float) -> None:
+        self._counts[operation][str(status)] += 1
+        self._latency[operation].record(time.monotonic() - started_at)
+
+    @staticmethod
+    def _sent_messages(count: int) -> dict:
+        return {
+            "sentMessages": [
+                {"id": str(uuid.uuid4().int)[:18], "quoteToken": uuid.uuid4().hex}
+                for _ in range(count)
+            ]
+        }
+
+    async def reply(self, request: web.Request) -> web.Response:
+        started_at = time.monotonic()
+        payload = await request.json()
+        if await self._simulate("reply"):
+            return web.json_response({"message": "The API rate limit has been exceeded."}, status=429)
+
+        reply_token = payload.get("replyToken")
+        if not reply_token or reply_token in self._used_reply_tokens:
+            self._observe("reply", 400, started_at)
+            return web.json_response({"message": "Invalid reply token"}, status=400)
+        self._used_reply_tokens.add(reply_token)
+
+        messages = payload.get("messages", [])
+        self._messages_sent += len(messages)
+        self._observe("reply", 200, started_at)
+        return web.json_response(self._sent_messages(len(messages)))
+
+    async def push(self, request: web.Request) -> web.Response:
+        started_at = time.monotonic()
+        payload = await request.json()
+        if await self._simulate("push"):
+            return web.json_response({"message": "The API rate limit has been exceeded."}, status=429)
+
+        messages = payload.get("messages", [])
+        self._messages_sent += len(messages)
+        self._observe("push", 200, started_at)
+        return web.json_response(self._sent_messages(len(messages)))
+
+    async def content(self, request: web.Request) -> web.Response:
+        started_at = time.monotonic()
+        if await self._simulate("content"):
+            return web.json_response({"message": "The API rate limit has been exceeded."}, status=429)
+        self._observe("content", 200, started_at)
+        return web.Response(body=self._image, content_type="image/jpeg")
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "messages_sent": self._messages_sent,
+            "counts": {operation: dict(counts) for operation, counts in self._counts.items()},
+            "latency_seconds": {
+                operation: recorder.snapshot() for operation, recorder in self._latency.items()
+            },
+        })
+
+    def create_app(self) -> web.Application:
+        """aiohttpアプリケーションを作成"""
+        app = web.Application()
+        app.router.add_post("/v2/bot/message/reply", self.reply)
+        app.router.add_post("/v2/bot/message/push", self.push)
+        app.router.add_get("/v2/bot/message/{message_id}/content", self.content)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるホスト")
+    parser.add_argument("--port", type=int, default=8081, help="待ち受けるポート")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="応答までの平均時間（ミリ秒）")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="応答時間のばらつき（ミリ秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="429を返す割合")
+    parser.add_argument("--image-size", type=int, default=1024, help="画像コンテンツの一辺のピクセル数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    args = parser.parse_args()
+
+    api = FakeLineApi(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        image_size=args.image_size,
+        seed=args.seed,
+    )
+    web.run_app(api.create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
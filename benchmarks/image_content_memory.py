@@ -0,0 +1,102 @@
+"""画像Content作成時のメモリ使用量ベンチマーク
+
+base64文字列を経由する従来の方法と、生のバイト列をそのままBlobに渡す方法で、
+画像1枚あたりのピークメモリ使用量（tracemallocで計測）を比較します。
+
+使い方:
+    python -m benchmarks.image_content_memory --size-mb 4 --images 3
+"""
+
+import argparse
+import base64
+import os
+import tracemalloc
+from typing import Callable, List, Tuple
+
+from google.genai import types
+
+from services.agent_service.message_handler import MessageHandler
+from utils.spooled_buffer import SpooledBuffer
+
+MESSAGE = "この画像から食材を抽出してください"
+MIME_TYPE = "image/jpeg"
+
+
+def build_legacy(images: List[bytes]) -> types.Content:
+    """従来の方法（base64文字列を経由）でContentを作成"""
+    parts = [types.Part(text=MESSAGE)]
+    for image in images:
+        image_base64 = base64.b64encode(image).decode("utf-8")
+        parts.append(
+            types.Part(inline_data=types.Blob(mime_type=MIME_TYPE, data=image_base64))
+        )
+    return types.Content(role="user", parts=parts)
+
+
+def build_raw(images: List[bytes]) -> types.Content:
+    """生のバイト列をそのまま渡す方法でContentを作成"""
+    return MessageHandler.create_message_content(
+        MESSAGE, images=[(image, MIME_TYPE) for image in images]
+    )
+
+
+def build_spooled(buffers: List[SpooledBuffer]) -> types.Content:
+    """一時ファイルに退避した画像からContentを作成"""
+    return MessageHandler.create_message_content(
+        MESSAGE, images=[(buffer, MIME_TYPE) for buffer in buffers]
+    )
+
+
+def measure(build: Callable[[], types.Content]) -> Tuple[int, types.Content]:
+    """Content作成中のピークメモリ増加量を計測
+
+    Args:
+        build: Contentを作成する関数
+
+    Returns:
+        ピークメモリ増加量（バイト）と作成したContent
+    """
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    content = build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - baseline, content
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=4.0, help="画像1枚のサイズ（MB）")
+    parser.add_argument("--images", type=int, default=1, help="1メッセージあたりの画像枚数")
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    images = [os.urandom(size) for _ in range(args.images)]
+
+    buffers = []
+    for image in images:
+        buffer = SpooledBuffer(max_memory_size=0)
+        buffer.write(image)
+        buffers.append(buffer)
+
+    results = [
+        ("base64 (legacy)", measure(lambda: build_legacy(images))),
+        ("raw bytes", measure(lambda: build_raw(images))),
+        ("spooled file", measure(lambda: build_spooled(buffers))),
+    ]
+    for buffer in buffers:
+        buffer.close()
+
+    print(f"image size: {size / 1024 / 1024:.1f} MB x {args.images}")
+    for name, (peak, content) in results:
+        assert bytes(content.parts[1].inline_data.data[:16]) == images[0][:16]
+        per_image = peak / args.images
+        print(
+            f"{name:16s} peak={peak / 1024 / 1024:8.2f} MB "
+            f"per_image={per_image / 1024 / 1024:6.2f} MB "
+            f"({per_image / size:.2f}x image size)"
+        )
+
+
+if __name__ == "__main__":
+    main()
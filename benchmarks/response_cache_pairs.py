@@ -0,0 +1,108 @@
+"""応答キャッシュの近似一致の判定確認
+
+質問の組ごとに、一方をキャッシュに保存してもう一方を検索し、応答を再利用するかどうかが
+期待どおりかを確認します。言い回しだけが異なる組は再利用し、食材・数量・意味が異なる組は
+再利用しないことを、正規化や近似一致の設定を変更した際にオフラインで確認できます。
+
+使い方:
+    python -m benchmarks.response_cache_pairs
+    python -m benchmarks.response_cache_pairs --similarity 0.6 --json
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+from services.agent_service.constants import RESPONSE_CACHE_SIMILARITY
+from services.agent_service.response_cache import ResponseCache, jaccard
+
+# (キャッシュに保存する質問, 検索する質問, 応答を再利用すべきか)
+PAIRS: List[Tuple[str, str, bool]] = [
+    # 言い回しだけが異なる質問
+    ("カレーのレシピ教えて", "カレーの作り方は？", True),
+    ("カレーのレシピが知りたい", "カレーの作り方を教えてください", True),
+    ("鶏むね肉の簡単レシピ", "鶏むね肉の簡単なレシピ", True),
+    ("鶏むね肉を使った簡単な夕飯のおかず", "鶏むね肉を使った簡単夕飯のおかず", True),
+    # 意味を尋ねる質問とレシピの質問
+    ("カレーのレシピ教えて", "カレーって何", False),
+    ("カレーのレシピ教えて", "カレーは？", False),
+    # 味・条件が異なる質問
+    ("甘口のカレーの作り方", "辛口のカレーの作り方", False),
+    ("卵なしのオムライスの作り方", "卵のオムライスの作り方", False),
+    ("卵を使ったお菓子のレシピ", "卵なしのお菓子のレシピ", False),
+    # 数量が異なる質問
+    ("3人分の肉じゃが", "4人分の肉じゃが", False),
+    ("10分でできる鶏肉料理", "30分でできる鶏肉料理", False),
+    # 共通部分が長く、食材だけが異なる質問
+    (
+        "じゃがいもと玉ねぎと人参を使った簡単な料理のレシピ",
+        "じゃがいもと玉ねぎと鶏肉を使った簡単な料理のレシピ",
+        False,
+    ),
+    ("鶏肉とキャベツを使った簡単な夕飯のレシピ", "豚肉とキャベツを使った簡単な夕飯のレシピ", False),
+    ("じゃがいもを使った簡単なおかずのレシピ", "さつまいもを使った簡単なおかずのレシピ", False),
+    ("なすとピーマンの炒め物の作り方", "なすとパプリカの炒め物の作り方", False),
+]
+
+
+def check_pairs(similarity: float) -> List[Dict]:
+    """すべての組について応答を再利用するかを確認
+
+    Args:
+        similarity: 近似一致とみなすJaccard係数の下限
+
+    Returns:
+        組ごとの結果
+    """
+    results = []
+    for cached, lookup, expected in PAIRS:
+        # 組ごとに空のキャッシュで判定し、他の組の影響を受けないようにする
+        cache = ResponseCache(similarity=similarity)
+        cached_query = cache.prepare(cached)
+        lookup_query = cache.prepare(lookup)
+        if cached_query is not None:
+            cache.put(cached_query, cached)
+        hit = lookup_query is not None and cache.get(lookup_query) is not None
+        score = (
+            jaccard(cached_query.shingles, lookup_query.shingles)
+            if cached_query is not None and lookup_query is not None
+            else None
+        )
+        results.append({
+            "cached": cached,
+            "lookup": lookup,
+            "expected_hit": expected,
+            "hit": hit,
+            "similarity": score,
+            "ok": hit == expected,
+        })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--similarity", type=float, default=RESPONSE_CACHE_SIMILARITY,
+                        help="近似一致とみなすJaccard係数の下限")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args()
+
+    results = check_pairs(args.similarity)
+    failures = [result for result in results if not result["ok"]]
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for result in results:
+            score = "-" if result["similarity"] is None else f"{result['similarity']:.2f}"
+            mark = "ok" if result["ok"] else "NG"
+            print(f"[{mark}] hit={result['hit']!s:5} expected={result['expected_hit']!s:5} "
+                  f"sim={score}  {result['cached']} / {result['lookup']}")
+        print(f"{len(results) - len(failures)}/{len(results)} pairs as expected")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""記録したWebhookトラフィックの再生による負荷試験
+
+WEBHOOK_RECORD_PATH で記録したJSON Linesファイル（services/line_service/webhook_recorder.py）を読み込み、
+チャンネルシークレットで計算した X-Line-Signature を付けて /callback に送信します。
+送信間隔は、元の受信間隔を --speed 倍速で再現するか、--rate で一定のレートにします。
+返信トークン・webhookEventId・タイムスタンプは送信ごとに発行し直すため、
+冪等性ストアで重複として破棄されることはありません（--keep-event-ids で再送を再現できます）。
+
+LINEのAPIを呼び出さないよう、アプリは benchmarks/fake_line_api.py に向けて起動してください。
+
+    python -m benchmarks.fake_line_api --port 8081 &
+    LINE_API_ENDPOINT=http://127.0.0.1:8081 LINE_API_DATA_ENDPOINT=http://127.0.0.1:8081 \\
+        LLM_BACKEND=fake uvicorn main:app --port 8080 &
+    python -m benchmarks.webhook_replay webhooks.jsonl --speed 10 --line-api http://127.0.0.1:8081
+
+使い方:
+    python -m benchmarks.webhook_replay FILE [--rate 50 | --speed 2.0] [--loops 3]
+"""
+
+import argparse
+import asyncio
+import base64
+import copy
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from utils.metrics import LatencyRecorder
+
+
+def load_records(path: str) -> List[Dict[str, Any]]:
+    """記録ファイルを読み込む
+
+    Args:
+        path: JSON Linesファイルのパス
+
+    Returns:
+        受信時刻順に並べた記録のリスト
+    """
+    records = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                records.append(json.loads(line))
+    records.sort(key=lambda record: record["received_at"])
+    return records
+
+
+def sign(body: bytes, channel_secret: str) -> str:
+    """X-Line-Signatureを計算
+
+    Args:
+        body: リクエストボディ
+        channel_secret: チャンネルシークレット
+
+    Returns:
+        Base64エンコードしたHMAC-SHA256署名
+    """
+    digest = hmac.new(channel_secret.encode("utf-8"), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("utf-8")
+
+
+def refresh_body(body: Dict[str, Any], keep_event_ids: bool = False) -> bytes:
+    """再生用にトークン・ID・タイムスタンプを発行し直したボディを作成
+
+    Args:
+        body: 記録したWebhookボディ
+        keep_event_ids: webhookEventIdを記録時のまま送るかどうか（再送の再現）
+
+    Returns:
+        送信するリクエストボディ
+    """
+    body = copy.deepcopy(body)
+    now_ms = int(time.time() * 1000)
+    for event in body.get("events", []):
+        event["timestamp"] = now_ms
+        if event.get("type") in ("message", "follow", "join", "postback", "beacon"):
+            event["replyToken"] = uuid.uuid4().hex
+        if not keep_event_ids or "webhookEventId" not in event:
+            event["webhookEventId"] = uuid.uuid4().hex.upper()[:26]
+        if keep_event_ids:
+            event.setdefault("deliveryContext", {})["isRedelivery"] = True
+    return json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+
+async def replay(args: argparse.Namespace) -> Dict[str, Any]:
+    """記録を再生して結果を集計
+
+    Args:
+        args: コマンドライン引数
+
+    Returns:
+        再生結果
+    """
+    records = load_records(args.file)
+    if not records:
+        raise SystemExit(f"no records in {args.file}")
+
+    recorder = LatencyRecorder(window_size=len(records) * args.loops)
+    statuses: Counter = Counter()
+    semaphore = asyncio.Semaphore(args.max_in_flight)
+    tasks: List[asyncio.Task] = []
+
+    async def send(session: aiohttp.ClientSession, record: Dict[str, Any]) -> None:
+        body = refresh_body(record["body"], args.keep_event_ids)
+        headers = {
+            "Content-Type": "application/json",
+            "X-Line-Signature": sign(body, args.channel_secret),
+        }
+        async with semaphore:
+            started_at = time.perf_counter()
+            try:
+                async with session.post(args.url, data=body, headers=headers) as response:
+                    await response.read()
+                    statuses[str(response.status)] += 1
+            except aiohttp.ClientError as e:
+                statuses[type(e).__name__] += 1
+            finally:
+                recorder.record(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        offset = 0.0
+        for _ in range(args.loops):
+            first_received_at = records[0]["received_at"]
+            for index, record in enumerate(records):
+                if args.rate:
+                    target = offset + index / args.rate
+                else:
+                    target = offset + (record["received_at"] - first_received_at) / args.speed
+                delay = target - (time.perf_counter() - started_at)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(send(session, record)))
+            offset = time.perf_counter() - started_at
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started_at
+
+    result: Dict[str, Any] = {
+        "requests": len(tasks),
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(tasks) / elapsed if elapsed else 0.0,
+        "statuses": dict(statuses),
+        "latency_seconds": recorder.snapshot(),
+    }
+
+    if args.line_api:
+        # アプリの処理完了を待ってからフェイクLINE APIの記録を取得
+        await asyncio.sleep(args.drain_seconds)
+        result["line_api"] = await fetch_json(f"{args.line_api}/stats")
+    if args.app_stats:
+        result["app_stats"] = await fetch_json(args.url.rsplit("/", 1)[0] + "/stats")
+    return result
+
+
+async def fetch_json(url: str) -> Optional[Dict[str, Any]]:
+    """JSONを取得（失敗した場合はNone）"""
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as response:
+                return await response.json()
+    except aiohttp.ClientError:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help="記録ファイル（JSON Lines）")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/callback", help="送信先の /callback のURL")
+    parser.add_argument("--channel-secret", default=os.environ.get("LINE_CHANNEL_SECRET", ""),
+                        help="署名に使うチャンネルシークレット（既定: LINE_CHANNEL_SECRET）")
+    pace = parser.add_mutually_exclusive_group()
+    pace.add_argument("--rate", type=float, help="一定のレート（リクエスト/秒）で送信する")
+    pace.add_argument("--speed", type=float, default=1.0, help="元の受信間隔を何倍速で再現するか")
+    parser.add_argument("--loops", type=int, default=1, help="記録を繰り返す回数")
+    parser.add_argument("--max-in-flight", type=int, default=100, help="同時に送信中にするリクエスト数の上限")
+    parser.add_argument("--keep-event-ids", action="store_true", help="webhookEventIdを変えずに再送として送る")
+    parser.add_argument("--line-api", help="フェイクLINE APIのURL（指定時は終了後に記録を取得）")
+    parser.add_argument("--drain-seconds", type=float, default=5.0, help="フェイクLINE APIの記録を取得するまでの待ち時間")
+    parser.add_argument("--app-stats", action="store_true", help="終了後にアプリの /stats も取得する")
+    args = parser.parse_args()
+
+    if not args.channel_secret:
+        parser.error("--channel-secret or LINE_CHANNEL_SECRET is required")
+
+    result = asyncio.run(replay(args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,16 @@
 import logging
 import asyncio
 import os
-from fastapi import FastAPI, Request
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
 import uvicorn
 from dotenv import load_dotenv
 
 # 環境変数の読み込み
 load_dotenv()
 from linebot.v3 import WebhookParser
+from linebot.v3.exceptions import InvalidSignatureError
 from linebot.v3.messaging import (
     ApiClient,
     Configuration,
@@ -23,43 +26,123 @@ from google.adk.runners import Runner
 from google.adk.tools import load_memory
 from google.cloud import logging as cloud_logging
 from google.genai.types import Content, Part
+from services.agent_service import AgentService
+from services.agent_service_impl import cleanup_resources
+from services.line_service.async_client import AsyncLineClient
+from services.line_service.constants import WEBHOOK_DEADLINE_SECONDS, WEBHOOK_RECORD_PATH
 from services.line_service.client import LineClient
+from services.line_service.dispatcher import EventDispatcher
 from services.line_service.handler import LineEventHandler
+from services.line_service.webhook_recorder import WebhookRecorder
+from services.line_service.work_queue import WebhookWorkQueue
+from utils.deadline import new_deadline
 from utils.logging import setup_cloud_logging
+from utils.metrics import collect_stats, register_stats_provider
+from utils.prometheus_metrics import WEBHOOK_REQUEST_SECONDS, render_metrics
 
 # ロガーを設定
 logger = setup_cloud_logging("main")
 
-# FastAPIの設定
-app = FastAPI()
-
 # LINEクライアントの準備
 line_client = LineClient()
-line_handler = LineEventHandler(line_client)
+async_line_client = AsyncLineClient(line_client.configuration)
+line_handler = LineEventHandler(async_line_client)
 
-async def process_message_and_reply(body: str, signature: str):
+# ユーザー単位で順序を保つイベントディスパッチャー
+# （画像のまとめ解析も同じレーンで実行し、同じユーザーのメッセージと順番に処理）
+event_dispatcher = EventDispatcher(line_handler.handle_event, line_handler.event_lanes)
+register_stats_provider("event_lanes", event_dispatcher.stats)
+register_stats_provider("idempotency", line_handler.idempotency_store.stats)
+register_stats_provider("sessions", AgentService().session_manager.stats)
+register_stats_provider("session_compaction", AgentService().session_compactor.stats)
+register_stats_provider("agent_admission", AgentService().admission.stats)
+register_stats_provider("image_cache", AgentService().image_cache.stats)
+register_stats_provider("response_cache", AgentService().response_cache.stats)
+register_stats_provider("agent_single_flight", AgentService().single_flight.stats)
+register_stats_provider("intent_router", AgentService().intent_router.stats)
+register_stats_provider("agent_executor", AgentService().executor_stats)
+register_stats_provider("outbound", line_handler.outbound.stats)
+register_stats_provider("outbound_scheduler", line_handler.outbound.scheduler.stats)
+register_stats_provider("image_preprocess", line_handler.image_preprocessor.stats)
+register_stats_provider("image_bursts", line_handler.image_aggregator.stats)
+
+async def process_message_and_reply(events: list):
     try:
-        # イベントのパース
-        events = line_client.parse_webhook_events(body, signature)
-        
-        # 各イベントを処理
-        for event in events:
-            if isinstance(event, MessageEvent):
-                await line_handler.handle_event(event)
+        # ユーザー間は並行、同一ユーザー内は順番に処理
+        message_events = [event for event in events if isinstance(event, MessageEvent)]
+        await event_dispatcher.dispatch(message_events)
 
     except Exception as e:
         logging.error(f"Error in process_events: {e}")
 
+# バックグラウンド処理用のワークキュー
+work_queue = WebhookWorkQueue(process_message_and_reply)
+register_stats_provider("webhook_queue", work_queue.stats)
+
+# 負荷試験用のWebhook記録（WEBHOOK_RECORD_PATH指定時のみ）
+webhook_recorder = WebhookRecorder(WEBHOOK_RECORD_PATH) if WEBHOOK_RECORD_PATH else None
+if webhook_recorder:
+    register_stats_provider("webhook_recorder", webhook_recorder.stats)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await work_queue.start()
+    yield
+    await work_queue.stop()
+    if webhook_recorder:
+        webhook_recorder.close()
+    await line_handler.image_aggregator.close()
+    # 残りの画像の解析が終わってから、エージェントのリソース（DB接続プール等）を解放
+    await cleanup_resources()
+    await line_handler.outbound.close()
+    await line_handler.outbound.scheduler.close()
+    await async_line_client.close()
+    line_client.close()
+    line_handler.image_preprocessor.close()
+
+# FastAPIの設定
+app = FastAPI(lifespan=lifespan)
+
 @app.post("/callback")
 async def callback(request: Request):
-    # リクエストボディとシグネチャの取得
-    body = await request.body()
-    body_text = body.decode("utf-8")
-    signature = request.headers.get("X-Line-Signature", "")
-    
-    # 非同期でメッセージ処理
-    await process_message_and_reply(body_text, signature)
-    return "OK"
+    # 受信時点から処理期限を計測
+    deadline = new_deadline(WEBHOOK_DEADLINE_SECONDS)
+    started_at = time.monotonic()
+    status = "500"
+    try:
+        # リクエストボディとシグネチャの取得
+        body = await request.body()
+        body_text = body.decode("utf-8")
+        signature = request.headers.get("X-Line-Signature", "")
+
+        # 署名を検証してイベントをパース
+        try:
+            events = line_client.parse_webhook_events(body_text, signature)
+        except InvalidSignatureError:
+            status = "400"
+            raise HTTPException(status_code=400, detail="Invalid signature")
+
+        # 負荷試験での再生用に匿名化して記録
+        if events and webhook_recorder:
+            webhook_recorder.record(body_text)
+
+        # 処理期限を付けてキューに積み、即座に応答（満杯の場合はLINEの再送に任せる）
+        if events and not work_queue.enqueue(events, deadline=deadline):
+            status = "503"
+            return Response(status_code=503)
+        status = "200"
+        return "OK"
+    finally:
+        WEBHOOK_REQUEST_SECONDS.labels(status=status).observe(time.monotonic() - started_at)
+
+@app.get("/stats")
+async def stats():
+    return collect_stats()
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8080))
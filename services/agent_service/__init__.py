@@ -2,6 +2,18 @@
 エージェントサービスモジュールのパッケージ定義
 """
 
-from ..agent_service_impl import call_agent_async, AgentService, call_agent_with_image_async
+from ..agent_service_impl import (
+    call_agent_async,
+    AgentService,
+    call_agent_with_image_async,
+    call_agent_with_images_async,
+)
+from .admission import AgentBusyError
 
-__all__ = ['call_agent_async', 'AgentService', 'call_agent_with_image_async']
\ No newline at end of file
+__all__ = [
+    'call_agent_async',
+    'AgentService',
+    'call_agent_with_image_async',
+    'call_agent_with_images_async',
+    'AgentBusyError',
+]
\ No newline at end of file
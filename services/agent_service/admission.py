@@ -0,0 +1,133 @@
+"""エージェント実行のアドミッション制御モジュール
+
+このモジュールは、同時に実行できるエージェント数を制限し、
+上限を超えたリクエストを待機キューに入れるか即座に拒否する機能を提供します。
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from services.agent_service.constants import (
+    AGENT_MAX_IN_FLIGHT,
+    AGENT_MAX_QUEUE,
+    AGENT_MAX_QUEUE_WAIT_SECONDS,
+)
+from utils.deadline import remaining
+from utils.logging import setup_cloud_logging
+from utils.metrics import LatencyRecorder
+
+logger = setup_cloud_logging("admission")
+
+
+class AgentBusyError(Exception):
+    """エージェントが混雑しており、リクエストを受け付けられない場合の例外"""
+
+
+class AdmissionController:
+    """アドミッション制御クラス
+
+    実行中のエージェント数に上限を設け、上限を超えた分は有界の待機キューで待たせます。
+    待機キューが満杯、または待ち時間が上限を超えた場合はAgentBusyErrorを送出します。
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = AGENT_MAX_IN_FLIGHT,
+        max_queue: int = AGENT_MAX_QUEUE,
+        max_wait_seconds: float = AGENT_MAX_QUEUE_WAIT_SECONDS,
+    ):
+        """初期化
+
+        Args:
+            max_in_flight: 同時に実行できるエージェント数
+            max_queue: 待機できるリクエスト数
+            max_wait_seconds: 待機できる最大秒数
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._in_flight = 0
+        self._waiting = 0
+
+        # 統計情報
+        self._admitted = 0
+        self._shed_queue_full = 0
+        self._shed_timeout = 0
+        self._wait_time = LatencyRecorder()
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """実行枠を確保
+
+        Raises:
+            AgentBusyError: 待機キューが満杯、または待ち時間が上限を超えた場合
+        """
+        if not self._semaphore.locked():
+            # 空きがあれば待機せずに実行枠を確保
+            await self._semaphore.acquire()
+            self._wait_time.record(0.0)
+        else:
+            await self._wait_for_slot()
+
+        self._in_flight += 1
+        self._admitted += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    async def _wait_for_slot(self) -> None:
+        """待機キューに入り、実行枠が空くのを待つ
+
+        Raises:
+            AgentBusyError: 待機キューが満杯、または待ち時間が上限を超えた場合
+        """
+        if self._waiting >= self.max_queue:
+            self._shed_queue_full += 1
+            logger.warning(
+                f"Agent admission rejected: in_flight={self._in_flight}, waiting={self._waiting}"
+            )
+            raise AgentBusyError("agent wait queue is full")
+
+        # リクエストの期限が先に来る場合は、期限までしか待たない
+        timeout = self.max_wait_seconds
+        time_left = remaining()
+        if time_left is not None:
+            timeout = max(0.0, min(timeout, time_left))
+
+        started_at = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._shed_timeout += 1
+            logger.warning(
+                f"Agent admission timed out after {timeout:.1f}s"
+            )
+            raise AgentBusyError("timed out waiting for an agent slot")
+        finally:
+            self._waiting -= 1
+            self._wait_time.record(time.monotonic() - started_at)
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            実行中・待機中の件数、拒否件数、待ち時間の分位点を含む辞書
+        """
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "admitted": self._admitted,
+            "shed": self._shed_queue_full + self._shed_timeout,
+            "shed_queue_full": self._shed_queue_full,
+            "shed_timeout": self._shed_timeout,
+            "wait_seconds": self._wait_time.snapshot(),
+        }
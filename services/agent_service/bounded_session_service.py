@@ -0,0 +1,387 @@
+"""メモリ使用量に上限のあるセッションサービスモジュール
+
+このモジュールは、InMemorySessionService に保持するセッションの合計の大きさに上限を設け、
+上限を超えた場合は最も長く使われていないセッションから、一定時間使われていないセッションは
+その時点で、メモリから破棄する機能を提供します。
+書き出し先のディレクトリを指定すると、破棄するセッションをファイルに書き出し、
+次に利用されたときに読み込んで復元します。
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+
+from services.agent_service.constants import (
+    SESSION_IDLE_TTL_SECONDS,
+    SESSION_MEMORY_MAX_BYTES,
+    SESSION_SPILL_DIR,
+)
+from utils.logging import setup_cloud_logging
+
+logger = setup_cloud_logging("bounded_session_service")
+
+# セッション・イベントの大きさに加算する固定のオーバーヘッド（オブジェクト・IDなどの概算）
+_SESSION_OVERHEAD_BYTES = 1024
+_EVENT_OVERHEAD_BYTES = 512
+
+# (app_name, user_id, session_id)
+SessionKey = Tuple[str, str, str]
+
+
+def event_size(event: Event) -> int:
+    """イベントがメモリに占める大きさを概算
+
+    Args:
+        event: セッションのイベント
+
+    Returns:
+        バイト数の概算（テキスト・画像・ツールの引数と応答の大きさ）
+    """
+    size = _EVENT_OVERHEAD_BYTES
+    contents = [event.content]
+    if event.actions and event.actions.compaction:
+        contents.append(event.actions.compaction.compacted_content)
+    for content in contents:
+        if not content or not content.parts:
+            continue
+        for part in content.parts:
+            if part.text:
+                size += len(part.text.encode("utf-8"))
+            if part.inline_data and part.inline_data.data:
+                size += len(part.inline_data.data)
+            if part.function_call:
+                size += len(str(part.function_call.args))
+            if part.function_response:
+                size += len(str(part.function_response.response))
+    return size
+
+
+def session_size(session: Session) -> int:
+    """セッションがメモリに占める大きさを概算
+
+    Args:
+        session: セッション
+
+    Returns:
+        バイト数の概算
+    """
+    return _SESSION_OVERHEAD_BYTES + len(str(session.state)) + sum(
+        event_size(event) for event in session.events
+    )
+
+
+class BoundedInMemorySessionService(InMemorySessionService):
+    """メモリ使用量に上限のあるセッションサービスクラス
+
+    セッションごとの大きさを記録し、最後に利用した順に並べて管理します。
+    破棄したセッションをエージェントの実行中に追加で書き込もうとした場合は、
+    書き出したファイル、または呼び出し元が持つセッションから復元するため、実行は中断しません。
+    アプリ・ユーザー単位の状態（app_state / user_state）は破棄しません。
+    list_sessions はメモリに保持しているセッションのみを返します。
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = SESSION_MEMORY_MAX_BYTES,
+        idle_ttl_seconds: float = SESSION_IDLE_TTL_SECONDS,
+        spill_dir: Optional[str] = SESSION_SPILL_DIR,
+    ):
+        """初期化
+
+        Args:
+            max_bytes: 保持するセッションの合計の大きさの上限（0で無制限）
+            idle_ttl_seconds: 利用されないセッションを保持する秒数（0で無制限）
+            spill_dir: 破棄するセッションの書き出し先（Noneの場合は書き出さずに破棄）
+        """
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+        # 最後に利用した順（先頭が最も古い）に、セッションの大きさと最終利用時刻を保持
+        self._sizes: "OrderedDict[SessionKey, int]" = OrderedDict()
+        self._last_access: Dict[SessionKey, float] = {}
+        self._bytes = 0
+        # 書き出し中のセッション（書き出しの完了前に利用された場合に使用）
+        self._spilling: Dict[SessionKey, Session] = {}
+        # 書き出さずに破棄したセッションを通知する関数
+        self._eviction_listeners: List[Callable[[str, str], None]] = []
+
+        # 統計情報
+        self._lru_evictions = 0
+        self._idle_evictions = 0
+        self._spilled = 0
+        self._restored = 0
+        self._dropped = 0
+        self._reinstated = 0
+
+    def add_eviction_listener(self, listener: Callable[[str, str], None]) -> None:
+        """書き出さずに破棄したセッションの通知先を追加
+
+        Args:
+            listener: ユーザーIDとセッションIDを受け取る関数
+        """
+        self._eviction_listeners.append(listener)
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        if session_id is not None:
+            key = (app_name, user_id, session_id)
+            # 既存のセッションのコピーを作らずに確認し、書き出し済みのセッションは復元して重複作成を防ぐ
+            if self._in_memory(key) or await self._restore(key):
+                self._touch(key)
+                raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        key = (app_name, user_id, session.id)
+        self._track(key, session_size(session))
+        await self._enforce_limits(key)
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        if not self._in_memory(key) and not await self._restore(key):
+            return None
+        self._touch(key)
+        session = await super().get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        await self._enforce_limits(key)
+        return session
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        key = (session.app_name, session.user_id, session.id)
+        if not self._in_memory(key) and not await self._restore(key):
+            # 実行中に書き出さずに破棄したセッションは、呼び出し元が持つセッションから復元
+            self._reinstate(key, session)
+
+        storage_session = self.sessions[session.app_name][session.user_id][session.id]
+        events_before = len(storage_session.events)
+        event = await super().append_event(session, event)
+        if len(storage_session.events) > events_before:
+            self._grow(key, event_size(event))
+        self._touch(key)
+        await self._enforce_limits(key)
+        return event
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        self._untrack(key)
+        if self.spill_dir:
+            await asyncio.to_thread(self._remove_file, self._spill_path(key))
+
+    def session_size(self, app_name: str, user_id: str, session_id: str) -> Optional[int]:
+        """メモリに保持しているセッションの大きさを取得
+
+        Args:
+            app_name: アプリ名
+            user_id: ユーザーID
+            session_id: セッションID
+
+        Returns:
+            バイト数の概算（メモリに保持していない場合はNone）
+        """
+        return self._sizes.get((app_name, user_id, session_id))
+
+    def _in_memory(self, key: SessionKey) -> bool:
+        """セッションをメモリに保持しているかどうか"""
+        app_name, user_id, session_id = key
+        return session_id in self.sessions.get(app_name, {}).get(user_id, {})
+
+    def _touch(self, key: SessionKey) -> None:
+        """最終利用時刻を更新し、最も新しく使ったセッションにする"""
+        if key in self._sizes:
+            self._sizes.move_to_end(key)
+            self._last_access[key] = time.monotonic()
+
+    def _track(self, key: SessionKey, size: int) -> None:
+        """セッションの大きさの記録を開始"""
+        self._untrack(key)
+        self._sizes[key] = size
+        self._last_access[key] = time.monotonic()
+        self._bytes += size
+
+    def _grow(self, key: SessionKey, size: int) -> None:
+        """セッションの大きさの記録を増やす"""
+        if key in self._sizes:
+            self._sizes[key] += size
+            self._bytes += size
+
+    def _untrack(self, key: SessionKey) -> None:
+        """セッションの大きさの記録を削除"""
+        size = self._sizes.pop(key, None)
+        if size is not None:
+            self._bytes -= size
+        self._last_access.pop(key, None)
+
+    def _store(self, key: SessionKey, session: Session) -> None:
+        """セッションをメモリに格納"""
+        app_name, user_id, session_id = key
+        self.sessions.setdefault(app_name, {}).setdefault(user_id, {})[session_id] = session
+        self._track(key, session_size(session))
+
+    def _reinstate(self, key: SessionKey, session: Session) -> None:
+        """呼び出し元が持つセッションをメモリに格納し直す"""
+        self._reinstated += 1
+        logger.info(f"Reinstating evicted session from caller: {key[2]}")
+        self._store(key, session.model_copy(deep=True))
+
+    async def _enforce_limits(self, current: SessionKey) -> None:
+        """期限切れのセッションと、上限を超えた分のセッションを破棄
+
+        Args:
+            current: 利用中のセッション（破棄しない）
+        """
+        if self.idle_ttl_seconds > 0:
+            expire_before = time.monotonic() - self.idle_ttl_seconds
+            while self._sizes:
+                key = next(iter(self._sizes))
+                if key == current or self._last_access[key] > expire_before:
+                    break
+                self._idle_evictions += 1
+                await self._evict(key)
+
+        if self.max_bytes > 0:
+            while self._bytes > self.max_bytes and self._sizes:
+                key = next(iter(self._sizes))
+                if key == current:
+                    break
+                self._lru_evictions += 1
+                await self._evict(key)
+
+    async def _evict(self, key: SessionKey) -> None:
+        """セッションをメモリから破棄（書き出し先があれば書き出す）"""
+        app_name, user_id, session_id = key
+        user_sessions = self.sessions[app_name][user_id]
+        session = user_sessions.pop(session_id)
+        if not user_sessions:
+            del self.sessions[app_name][user_id]
+        self._untrack(key)
+
+        if not self.spill_dir:
+            self._dropped += 1
+            for listener in self._eviction_listeners:
+                listener(user_id, session_id)
+            return
+
+        self._spilling[key] = session
+        try:
+            path = self._spill_path(key)
+            await asyncio.to_thread(self._write_file, path, session.model_dump_json())
+            self._spilled += 1
+            # 書き出し中に復元された場合は、古い内容のファイルを残さない
+            if self._spilling.get(key) is not session and self._in_memory(key):
+                await asyncio.to_thread(self._remove_file, path)
+        except OSError as e:
+            logger.error(f"セッションの書き出しに失敗したため破棄します: {e}")
+            self._dropped += 1
+            for listener in self._eviction_listeners:
+                listener(user_id, session_id)
+        finally:
+            if self._spilling.get(key) is session:
+                del self._spilling[key]
+
+    async def _restore(self, key: SessionKey) -> bool:
+        """書き出したセッションをメモリに復元
+
+        Args:
+            key: セッションのキー
+
+        Returns:
+            復元した（またはすでにメモリにある）場合はTrue
+        """
+        session = self._spilling.pop(key, None)
+        if session is None:
+            if not self.spill_dir:
+                return False
+            path = self._spill_path(key)
+            data = await asyncio.to_thread(self._read_file, path)
+            if data is None:
+                return False
+            # 読み込み中に他の呼び出しが復元した場合はそちらを使う
+            if self._in_memory(key):
+                return True
+            session = Session.model_validate_json(data)
+            await asyncio.to_thread(self._remove_file, path)
+        if self._in_memory(key):
+            return True
+
+        self._store(key, session)
+        self._restored += 1
+        logger.info(f"Restored spilled session: {key[2]} ({self._sizes[key]} bytes)")
+        return True
+
+    def _spill_path(self, key: SessionKey) -> str:
+        """セッションの書き出し先のパス（IDはハッシュ化してファイル名にする）"""
+        digest = hashlib.sha256("\0".join(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.json")
+
+    @staticmethod
+    def _write_file(path: str, data: str) -> None:
+        """書きかけのファイルを読まないよう、一時ファイルに書いてから置き換える"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _read_file(path: str) -> Optional[str]:
+        """ファイルを読み込む（存在しない場合はNone）"""
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        """ファイルを削除（存在しない場合は何もしない）"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            保持しているセッションの件数・合計と最大の大きさ、破棄・書き出し・復元の件数を含む辞書
+        """
+        return {
+            "sessions": len(self._sizes),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "largest_session_bytes": max(self._sizes.values(), default=0),
+            "lru_evictions": self._lru_evictions,
+            "idle_evictions": self._idle_evictions,
+            "spilled": self._spilled,
+            "restored": self._restored,
+            "dropped": self._dropped,
+            "reinstated": self._reinstated,
+        }
@@ -4,15 +4,164 @@
 ランナーを使ってエージェントを実行し、応答を処理する機能を提供します。
 """
 
-from typing import Optional
+import asyncio
+import time
+from collections import Counter
+from contextlib import aclosing
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import Runner
 from google.genai import types
 
+from services.agent_service.constants import (
+    AGENT_STREAM_MIN_INTERVAL_SECONDS,
+    DEADLINE_MESSAGE,
+    DEADLINE_PARTIAL_HEADER,
+    DEADLINE_REMAINING_MESSAGE,
+)
+from utils.deadline import remaining
 from utils.logging import setup_cloud_logging
+from utils.metrics import LatencyRecorder
+from utils.prometheus_metrics import (
+    AGENT_MODEL_TOKENS,
+    AGENT_RUN_SECONDS,
+    AGENT_STEP_SECONDS,
+    AGENT_TOOL_SECONDS,
+)
 
 logger = setup_cloud_logging("executor")
 
+# 途中経過を受け取るコールバックの型（エージェント名と応答テキストを受け取る）
+UpdateCallback = Callable[[str, str], Awaitable[None]]
+
+
+class _UpdateThrottle:
+    """途中経過の送信間隔を制限するクラス
+
+    前回の送信から一定時間が経過していない途中経過は保留し、
+    次の途中経過とまとめて送信します。
+    """
+
+    def __init__(self, on_update: UpdateCallback, min_interval: float):
+        """初期化
+
+        Args:
+            on_update: 途中経過を受け取るコールバック
+            min_interval: 送信の最小間隔（秒）
+        """
+        self.on_update = on_update
+        self.min_interval = min_interval
+        self.sent = 0
+        self._last_sent_at: Optional[float] = None
+        self._pending: List[str] = []
+
+    async def offer(self, author: str, text: str) -> None:
+        """途中経過を送信（間隔が短い場合は保留）
+
+        Args:
+            author: 応答したエージェント名
+            text: 応答テキスト
+        """
+        self._pending.append(text)
+        now = time.monotonic()
+        if self._last_sent_at is not None and now - self._last_sent_at < self.min_interval:
+            return
+
+        await self.on_update(author, self.remainder())
+        self._pending = []
+        self._last_sent_at = now
+        self.sent += 1
+
+    def remainder(self) -> str:
+        """まだ送信していない途中経過をまとめたテキスト"""
+        return "\n\n".join(self._pending)
+
+
+class _RunMetrics:
+    """1回のエージェント実行のイベントからPrometheusメトリクスを記録するクラス
+
+    ステップのレイテンシは直前のイベントからの経過時間をイベントの作成者に計上し、
+    ツールの実行時間は関数呼び出しから対応する関数応答までの時間を計上します。
+    """
+
+    # usage_metadataの項目名とメトリクスのラベル
+    TOKEN_FIELDS = (
+        ("prompt_token_count", "prompt"),
+        ("candidates_token_count", "candidates"),
+        ("cached_content_token_count", "cached"),
+        ("thoughts_token_count", "thoughts"),
+        ("total_token_count", "total"),
+    )
+
+    def __init__(self, root_agent, mode: str):
+        """初期化
+
+        Args:
+            root_agent: 実行を開始するエージェント（作成者名からモデル名を引くために使用）
+            mode: 実行モード（standard / streaming）
+        """
+        self.root_agent = root_agent
+        self.mode = mode
+        self.outcome = "ok"
+        self._started_at = time.monotonic()
+        self._last_event_at = self._started_at
+        self._tool_calls: Dict[str, Tuple[str, float]] = {}
+        self._models: Dict[str, str] = {}
+
+    def observe(self, event) -> None:
+        """イベントからメトリクスを記録
+
+        Args:
+            event: エージェントのイベント
+        """
+        # ストリーミングの部分応答は、揃った応答のイベントでまとめて計上する
+        if event.partial:
+            return
+
+        now = time.monotonic()
+        AGENT_STEP_SECONDS.labels(author=event.author).observe(now - self._last_event_at)
+        self._last_event_at = now
+
+        for call in event.get_function_calls():
+            self._tool_calls[call.id or call.name] = (call.name, now)
+        for response in event.get_function_responses():
+            started = self._tool_calls.pop(response.id or response.name, None)
+            if started is not None:
+                AGENT_TOOL_SECONDS.labels(tool=started[0]).observe(now - started[1])
+
+        usage = event.usage_metadata
+        if usage is not None:
+            model = self._model_name(event.author)
+            for field_name, kind in self.TOKEN_FIELDS:
+                value = getattr(usage, field_name, None)
+                if value:
+                    AGENT_MODEL_TOKENS.labels(model=model, kind=kind).inc(value)
+
+    def finish(self) -> None:
+        """実行全体の時間を記録"""
+        agent = getattr(self.root_agent, "name", None) or "unknown"
+        AGENT_RUN_SECONDS.labels(mode=self.mode, outcome=self.outcome, agent=agent).observe(
+            time.monotonic() - self._started_at
+        )
+
+    def _model_name(self, author: str) -> str:
+        """作成者（エージェント名）からモデル名を取得
+
+        Args:
+            author: イベントの作成者
+
+        Returns:
+            モデル名（不明な場合はunknown）
+        """
+        if author not in self._models:
+            agent = self.root_agent.find_agent(author) if self.root_agent else None
+            model = getattr(agent, "model", None)
+            if model is not None and not isinstance(model, str):
+                model = getattr(model, "model", None)
+            self._models[author] = model or "unknown"
+        return self._models[author]
+
 
 class AgentExecutor:
     """エージェント実行クラス
@@ -28,6 +177,13 @@ class AgentExecutor:
         """
         self.runner = runner
 
+        # 統計情報（最初の有用な応答までの時間と、実行全体の時間）
+        self._first_useful_time = LatencyRecorder()
+        self._total_time = LatencyRecorder()
+        self._updates_sent = 0
+        self._deadline_exceeded = 0
+        self._direct_runs: Counter = Counter()
+
     async def execute_and_get_response(
         self,
         message: str,
@@ -35,52 +191,246 @@ class AgentExecutor:
         session_id: str,
         content: types.Content,
         image_data: Optional[bytes] = None,
+        on_update: Optional[UpdateCallback] = None,
+        runner: Optional[Runner] = None,
     ) -> str:
         """エージェントを実行し応答を取得
 
+        on_updateを指定するとストリーミングモードで実行し、サブエージェントの応答を
+        揃った順にコールバックへ渡します。この場合の戻り値は、まだ渡していない応答です
+        （すべて渡し済みであれば空文字列）。
+        runnerを指定すると、ルートエージェントの代わりにそのランナーのエージェントを実行します。
+
         Args:
             message: オリジナルのメッセージ（ログ用）
             user_id: ユーザーID
             session_id: セッションID
             content: Content型のメッセージ
             image_data: 画像データ（ログ用）
+            on_update: 途中経過を受け取るコールバック（オプション）
+            runner: 実行に使うランナー（省略時はルートエージェントのランナー）
 
         Returns:
             エージェントからの最終応答
         """
+        if runner is not None and runner is not self.runner:
+            self._direct_runs[runner.agent.name] += 1
+        runner = runner or self.runner
+        if on_update is not None:
+            return await self._execute_streaming(
+                message, user_id, session_id, content, image_data, on_update, runner
+            )
+
+        started_at = time.monotonic()
+        partial_texts: List[str] = []
+        metrics = _RunMetrics(runner.agent, "standard")
         try:
             # ログ出力
             self._log_execution_start(message, image_data)
 
-            # エージェント実行
-            events_async = self.runner.run_async(
-                session_id=session_id, 
-                user_id=user_id, 
-                new_message=content,
-            )
+            # 処理期限までに終わらなければ打ち切り、ジェネレーターを確実に閉じる
+            async with asyncio.timeout(remaining()):
+                async with aclosing(
+                    runner.run_async(
+                        session_id=session_id, 
+                        user_id=user_id, 
+                        new_message=content,
+                    )
+                ) as events_async:
+                    # 応答を取得
+                    final_response = None
+                    async for event in events_async:
+                        metrics.observe(event)
+
+                        # エラーチェック
+                        if hasattr(event, 'finish_reason') and event.finish_reason == 'MALFORMED_FUNCTION_CALL':
+                            error_msg = f"申し訳ありません。エージェントが未定義の機能を呼び出そうとしました。"
+                            logger.error(f"Agent error: {event.finish_message}")
+                            metrics.outcome = "error"
+                            return error_msg
+
+                        text = self._extract_text(event)
+                        if not text:
+                            continue
+
+                        # 最終応答の処理
+                        if event.is_final_response():
+                            final_response = text
+                            logger.info(f"Received final response from agent: {final_response}")
+                            break
+                        partial_texts.append(text)
+
+            elapsed = time.monotonic() - started_at
+            self._first_useful_time.record(elapsed)
+            self._total_time.record(elapsed)
+            return final_response if final_response else "応答を取得できませんでした。"
 
-            # 応答を取得
-            final_response = None
-            async for event in events_async:
-                # エラーチェック
-                if hasattr(event, 'finish_reason') and event.finish_reason == 'MALFORMED_FUNCTION_CALL':
-                    error_msg = f"申し訳ありません。エージェントが未定義の機能を呼び出そうとしました。"
-                    logger.error(f"Agent error: {event.finish_message}")
-                    return error_msg
-
-                # 最終応答の処理
-                if event.is_final_response() and event.content and event.content.parts:
-                    final_response = event.content.parts[0].text.strip()
-                    logger.info(f"Received final response from agent: {final_response}")
-                    break
+        except TimeoutError:
+            self._total_time.record(time.monotonic() - started_at)
+            metrics.outcome = "deadline"
+            return self._deadline_fallback(partial_texts, already_sent=False)
 
-            return final_response if final_response else "応答を取得できませんでした。"
+        except Exception as e:
+            metrics.outcome = "error"
+            return self._error_response(e)
+
+        finally:
+            metrics.finish()
+
+    async def _execute_streaming(
+        self,
+        message: str,
+        user_id: str,
+        session_id: str,
+        content: types.Content,
+        image_data: Optional[bytes],
+        on_update: UpdateCallback,
+        runner: Runner,
+    ) -> str:
+        """ストリーミングモードでエージェントを実行
+
+        トークン単位の部分応答（partial）はLINEで編集できないため送らず、
+        各エージェントの応答が揃った時点で送信間隔を制限しながらコールバックに渡します。
+        処理期限を過ぎた場合は、未送信の応答と生成途中の部分応答から代替の応答を作ります。
+
+        Args:
+            message: オリジナルのメッセージ（ログ用）
+            user_id: ユーザーID
+            session_id: セッションID
+            content: Content型のメッセージ
+            image_data: 画像データ（ログ用）
+            on_update: 途中経過を受け取るコールバック
+            runner: 実行に使うランナー
+
+        Returns:
+            まだコールバックに渡していない応答（すべて渡し済みであれば空文字列）
+        """
+        throttle = _UpdateThrottle(on_update, AGENT_STREAM_MIN_INTERVAL_SECONDS)
+        started_at = time.monotonic()
+        first_useful_at: Optional[float] = None
+        in_progress: Dict[str, str] = {}
+        metrics = _RunMetrics(runner.agent, "streaming")
+        try:
+            self._log_execution_start(message, image_data)
+
+            received = False
+            async with asyncio.timeout(remaining()):
+                async with aclosing(
+                    runner.run_async(
+                        session_id=session_id,
+                        user_id=user_id,
+                        new_message=content,
+                        run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+                    )
+                ) as events_async:
+                    async for event in events_async:
+                        metrics.observe(event)
+                        if hasattr(event, 'finish_reason') and event.finish_reason == 'MALFORMED_FUNCTION_CALL':
+                            logger.error(f"Agent error: {event.finish_message}")
+                            metrics.outcome = "error"
+                            return "申し訳ありません。エージェントが未定義の機能を呼び出そうとしました。"
+
+                        text = self._extract_text(event)
+                        if event.partial:
+                            # 生成途中の部分応答は期限切れ時の代替応答用に保持
+                            if text:
+                                in_progress[event.author] = in_progress.get(event.author, "") + text
+                            continue
+                        in_progress.pop(event.author, None)
+                        if not text or not event.is_final_response():
+                            continue
+
+                        received = True
+                        logger.info(f"Received response from {event.author}: {text[:100]}")
+                        await throttle.offer(event.author, text)
+                        if first_useful_at is None and throttle.sent:
+                            first_useful_at = time.monotonic()
+
+            if not received:
+                return "応答を取得できませんでした。"
+            return throttle.remainder()
+
+        except TimeoutError:
+            metrics.outcome = "deadline"
+            partial_texts = [throttle.remainder(), *in_progress.values()]
+            return self._deadline_fallback(
+                [text for text in partial_texts if text], already_sent=throttle.sent > 0
+            )
 
         except Exception as e:
-            logger.error(f"Error during agent execution: {e}")
-            if "Timed out while waiting for response" in str(e):
-                return "申し訳ありません。処理に時間がかかりすぎています。\n\n考えられる原因：\n- サーバーの負荷が高い\n- 外部APIの応答が遅い\n- 処理するデータ量が多い\n\nしばらく時間をおいてから再試行してください。"
-            return f"申し訳ありません。エラーが発生しました: {str(e)}"
+            metrics.outcome = "error"
+            return self._error_response(e)
+
+        finally:
+            metrics.finish()
+            finished_at = time.monotonic()
+            self._first_useful_time.record((first_useful_at or finished_at) - started_at)
+            self._total_time.record(finished_at - started_at)
+            self._updates_sent += throttle.sent
+
+    def _deadline_fallback(self, partial_texts: List[str], already_sent: bool) -> str:
+        """処理期限を過ぎた場合の代替応答を作成
+
+        Args:
+            partial_texts: それまでに得られた部分的な応答
+            already_sent: 途中経過をすでに送信しているかどうか
+
+        Returns:
+            代替応答
+        """
+        self._deadline_exceeded += 1
+        logger.warning(
+            f"Agent run exceeded the request deadline: partial_results={len(partial_texts)}"
+        )
+        if partial_texts:
+            return f"{DEADLINE_PARTIAL_HEADER}\n\n" + "\n\n".join(partial_texts)
+        if already_sent:
+            return DEADLINE_REMAINING_MESSAGE
+        return DEADLINE_MESSAGE
+
+    @staticmethod
+    def _extract_text(event) -> str:
+        """イベントからテキストパートを連結して取得
+
+        Args:
+            event: エージェントのイベント
+
+        Returns:
+            テキスト（テキストパートがない場合は空文字列）
+        """
+        if not event.content or not event.content.parts:
+            return ""
+        return "".join(part.text for part in event.content.parts if part.text).strip()
+
+    @staticmethod
+    def _error_response(error: Exception) -> str:
+        """エージェント実行中の例外からユーザー向けのエラーメッセージを作成
+
+        Args:
+            error: 発生した例外
+
+        Returns:
+            エラーメッセージ
+        """
+        logger.error(f"Error during agent execution: {error}")
+        if "Timed out while waiting for response" in str(error):
+            return "申し訳ありません。処理に時間がかかりすぎています。\n\n考えられる原因：\n- サーバーの負荷が高い\n- 外部APIの応答が遅い\n- 処理するデータ量が多い\n\nしばらく時間をおいてから再試行してください。"
+        return f"申し訳ありません。エラーが発生しました: {str(error)}"
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            最初の有用な応答までの時間と実行時間の分位点、途中経過の送信数、期限切れ件数、
+            ルートエージェントを介さずに実行した件数（エージェント名ごと）を含む辞書
+        """
+        return {
+            "time_to_first_useful_message_seconds": self._first_useful_time.snapshot(),
+            "run_seconds": self._total_time.snapshot(),
+            "updates_sent": self._updates_sent,
+            "deadline_exceeded": self._deadline_exceeded,
+            "direct_runs": dict(self._direct_runs),
+        }
 
     def _log_execution_start(
         self, message: str, image_data: Optional[bytes]
@@ -0,0 +1,342 @@
+"""画像解析結果キャッシュモジュール
+
+このモジュールは、同じ画像（または見た目がほぼ同じ画像）に対する解析結果を
+キャッシュし、エージェントを再実行せずに応答を返す機能を提供します。
+完全一致はSHA-256、再圧縮・転送された画像などの近似一致は差分ハッシュ（dHash）の
+ハミング距離で判定します。
+"""
+
+import hashlib
+import io
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from PIL import Image, ImageOps
+
+from services.agent_service.constants import (
+    IMAGE_CACHE_HASH_SIZE,
+    IMAGE_CACHE_MAX_DISTANCE,
+    IMAGE_CACHE_MAX_ENTRIES,
+    IMAGE_CACHE_TTL_SECONDS,
+)
+from utils.logging import setup_cloud_logging
+from utils.metrics import LatencyRecorder
+
+logger = setup_cloud_logging("image_cache")
+
+
+@dataclass(frozen=True)
+class ImageFingerprint:
+    """画像の指紋（完全一致用と近似一致用のハッシュ）"""
+
+    sha256: str
+    dhash: Optional[int]
+
+
+@dataclass
+class _CacheEntry:
+    """キャッシュエントリ"""
+
+    key: str
+    dhash: Optional[int]
+    result: str
+    expires_at: float
+
+
+def compute_dhash(image_data: Union[bytes, memoryview], hash_size: int) -> int:
+    """差分ハッシュ（dHash）を計算
+
+    画像をグレースケールで (hash_size + 1) x hash_size に縮小し、
+    横に隣り合う画素の明暗を1ビットずつ並べた値を返します。
+
+    Args:
+        image_data: 画像データ
+        hash_size: ハッシュの一辺のサイズ（ビット数は hash_size の2乗）
+
+    Returns:
+        差分ハッシュ
+    """
+    with Image.open(io.BytesIO(image_data)) as image:
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("L").resize(
+            (hash_size + 1, hash_size), Image.Resampling.BILINEAR
+        )
+        pixels = image.tobytes()
+
+    value = 0
+    width = hash_size + 1
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * width + col]
+            right = pixels[row * width + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def fingerprint_image(
+    image_data: Union[bytes, memoryview], hash_size: int = IMAGE_CACHE_HASH_SIZE
+) -> ImageFingerprint:
+    """画像の指紋を計算
+
+    画像として読み込めない場合、近似一致用のハッシュはNoneになります。
+
+    Args:
+        image_data: 画像データ
+        hash_size: 差分ハッシュの一辺のサイズ
+
+    Returns:
+        ImageFingerprint: 画像の指紋
+    """
+    sha256 = hashlib.sha256(image_data).hexdigest()
+    try:
+        dhash = compute_dhash(image_data, hash_size)
+    except Exception as e:
+        logger.warning(f"Failed to compute perceptual hash: {e}")
+        dhash = None
+    return ImageFingerprint(sha256=sha256, dhash=dhash)
+
+
+class ImageResultCache:
+    """画像解析結果キャッシュクラス
+
+    近似一致はマルチインデックスハッシングで検索します。ハッシュを
+    (最大距離 + 1) 個のバンドに分割すると、距離が最大距離以下の2つのハッシュは
+    少なくとも1つのバンドが完全に一致するため、候補をバンドの索引から絞り込めます。
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = IMAGE_CACHE_TTL_SECONDS,
+        max_entries: int = IMAGE_CACHE_MAX_ENTRIES,
+        max_distance: int = IMAGE_CACHE_MAX_DISTANCE,
+        hash_size: int = IMAGE_CACHE_HASH_SIZE,
+    ):
+        """初期化
+
+        Args:
+            ttl_seconds: 結果を保持する秒数
+            max_entries: 保持する最大件数（超過分は古いものから破棄）
+            max_distance: 近似一致とみなす最大ハミング距離（0で近似一致を無効化）
+            hash_size: 差分ハッシュの一辺のサイズ
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._band_ranges = self._split_bands(hash_size * hash_size, max_distance + 1)
+        self._bands: List[Dict[int, Set[str]]] = [{} for _ in self._band_ranges]
+
+        # 統計情報
+        self._exact_hits = 0
+        self._near_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lookup_time = LatencyRecorder()
+
+    def fingerprint(self, image_data: Union[bytes, memoryview]) -> ImageFingerprint:
+        """画像の指紋を計算
+
+        Args:
+            image_data: 画像データ
+
+        Returns:
+            ImageFingerprint: 画像の指紋
+        """
+        return fingerprint_image(image_data, self.hash_size)
+
+    def get(self, fingerprint: ImageFingerprint, message: str) -> Optional[str]:
+        """キャッシュされた解析結果を取得
+
+        Args:
+            fingerprint: 画像の指紋
+            message: 画像と一緒に送る指示文
+
+        Returns:
+            解析結果。キャッシュにない場合はNone
+        """
+        started_at = time.monotonic()
+        try:
+            now = time.time()
+            key = self._make_key(fingerprint.sha256, message)
+
+            entry = self._get_live(key, now)
+            if entry is not None:
+                self._exact_hits += 1
+                return entry.result
+
+            if fingerprint.dhash is not None and self.max_distance > 0:
+                match = self._find_near(fingerprint.dhash, message, now)
+                if match is not None:
+                    distance, entry = match
+                    self._near_hits += 1
+                    logger.info(f"Near-duplicate image cache hit: distance={distance}")
+                    return entry.result
+
+            self._misses += 1
+            return None
+        finally:
+            self._lookup_time.record(time.monotonic() - started_at)
+
+    def put(self, fingerprint: ImageFingerprint, message: str, result: str) -> None:
+        """解析結果をキャッシュに保存
+
+        Args:
+            fingerprint: 画像の指紋
+            message: 画像と一緒に送った指示文
+            result: 解析結果
+        """
+        key = self._make_key(fingerprint.sha256, message)
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = _CacheEntry(
+            key=key,
+            dhash=fingerprint.dhash,
+            result=result,
+            expires_at=time.time() + self.ttl_seconds,
+        )
+        if fingerprint.dhash is not None:
+            for index, band in enumerate(self._band_values(fingerprint.dhash)):
+                self._bands[index].setdefault(band, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self._evictions += 1
+
+    def _get_live(self, key: str, now: float) -> Optional[_CacheEntry]:
+        """有効期限内のエントリを取得し、LRU順を更新
+
+        Args:
+            key: キャッシュキー
+            now: 現在時刻
+
+        Returns:
+            エントリ。存在しないか期限切れの場合はNone
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _find_near(
+        self, dhash: int, message: str, now: float
+    ) -> Optional[Tuple[int, _CacheEntry]]:
+        """ハミング距離が最大距離以下のエントリのうち最も近いものを検索
+
+        Args:
+            dhash: 差分ハッシュ
+            message: 画像と一緒に送る指示文
+            now: 現在時刻
+
+        Returns:
+            距離とエントリの組。見つからない場合はNone
+        """
+        suffix = self._make_key("", message)
+        candidates: Set[str] = set()
+        for index, band in enumerate(self._band_values(dhash)):
+            candidates.update(self._bands[index].get(band, ()))
+
+        best: Optional[Tuple[int, str]] = None
+        for key in candidates:
+            if not key.endswith(suffix):
+                continue
+            entry = self._entries.get(key)
+            if entry is None or entry.dhash is None:
+                continue
+            distance = (entry.dhash ^ dhash).bit_count()
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, key)
+
+        if best is None:
+            return None
+        entry = self._get_live(best[1], now)
+        return (best[0], entry) if entry is not None else None
+
+    def _remove(self, key: str) -> None:
+        """エントリと索引を削除
+
+        Args:
+            key: キャッシュキー
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None or entry.dhash is None:
+            return
+        for index, band in enumerate(self._band_values(entry.dhash)):
+            keys = self._bands[index].get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[index][band]
+
+    def _band_values(self, dhash: int) -> List[int]:
+        """ハッシュをバンドごとの値に分割
+
+        Args:
+            dhash: 差分ハッシュ
+
+        Returns:
+            バンドごとの値のリスト
+        """
+        return [(dhash >> start) & ((1 << width) - 1) for start, width in self._band_ranges]
+
+    @staticmethod
+    def _split_bands(bits: int, count: int) -> List[Tuple[int, int]]:
+        """ハッシュのビット列をほぼ均等なバンドに分割
+
+        Args:
+            bits: ハッシュのビット数
+            count: バンド数
+
+        Returns:
+            各バンドの開始位置と幅のリスト
+        """
+        count = max(1, min(count, bits))
+        ranges = []
+        start = 0
+        for index in range(count):
+            width = bits // count + (1 if index < bits % count else 0)
+            ranges.append((start, width))
+            start += width
+        return ranges
+
+    @staticmethod
+    def _make_key(sha256: str, message: str) -> str:
+        """画像ハッシュと指示文からキャッシュキーを作成
+
+        Args:
+            sha256: 画像のSHA-256
+            message: 画像と一緒に送る指示文
+
+        Returns:
+            キャッシュキー
+        """
+        message_hash = hashlib.sha256(message.encode("utf-8")).hexdigest()[:16]
+        return f"{sha256}:{message_hash}"
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            ヒット率・件数・検索時間を含む辞書
+        """
+        hits = self._exact_hits + self._near_hits
+        lookups = hits + self._misses
+        return {
+            "size": len(self._entries),
+            "exact_hits": self._exact_hits,
+            "near_hits": self._near_hits,
+            "misses": self._misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self._evictions,
+            "lookup_seconds": self._lookup_time.snapshot(),
+        }
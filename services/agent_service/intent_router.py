@@ -0,0 +1,264 @@
+"""意図ルーターモジュール
+
+このモジュールは、ルートエージェントを実行する前にテキストメッセージの意図を
+キーワード・正規表現で判定し、振り分ける機能を提供します。
+挨拶・お礼・使い方の質問には定型文で応答し、明確なレシピ検索はルートエージェントを介さずに
+サブエージェントを直接実行します。どの意図にも当てはまらない曖昧なメッセージのみ、
+ルートエージェント（LLM）に判断を任せます。
+振り分けのルールは prompts/config.yaml の intent_router で定義します。
+"""
+
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Pattern, Sequence
+
+from agents.config import AGENT_CONFIG
+from agents.prompt_manager import PromptManager
+from services.agent_service.text_normalizer import fold_text, is_session_dependent
+from utils.logging import setup_cloud_logging
+from utils.metrics import LatencyRecorder
+from utils.prometheus_metrics import INTENT_ROUTER_DECISIONS
+
+logger = setup_cloud_logging("intent_router")
+
+# 振り分け先
+ACTION_TEMPLATE = "template"  # 定型文で応答
+ACTION_AGENT = "agent"  # サブエージェントを直接実行
+ACTION_LLM = "llm"  # ルートエージェントに任せる
+
+# どの意図にも当てはまらない場合の意図名
+FALLBACK_INTENT = "fallback"
+
+# 直前の応答が質問で終わっているとみなす末尾の文字
+_QUESTION_MARKS = ("?", "？")
+
+
+@dataclass(frozen=True)
+class RoutingDecision:
+    """振り分けの結果"""
+
+    intent: str
+    action: str
+    response: Optional[str] = None  # action=template の場合の応答
+    agent: Optional[str] = None  # action=agent の場合に実行するエージェント名
+
+
+@dataclass(frozen=True)
+class IntentRule:
+    """意図の判定ルール"""
+
+    name: str
+    action: str
+    patterns: Sequence[Pattern]
+    exclude_patterns: Sequence[Pattern] = ()
+    responses: Sequence[str] = ()
+    agent: Optional[str] = None
+    max_chars: Optional[int] = None
+    unless_question_pending: bool = False
+    exclude_session_dependent: bool = False
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "IntentRule":
+        """設定から判定ルールを作成
+
+        Args:
+            config: prompts/config.yaml の intent_router.intents の要素
+
+        Returns:
+            判定ルール
+
+        Raises:
+            ValueError: 設定が不正な場合
+        """
+        name = config.get("name")
+        action = config.get("action")
+        if not name or action not in (ACTION_TEMPLATE, ACTION_AGENT):
+            raise ValueError(f"invalid intent rule: name={name} action={action}")
+        if not config.get("patterns"):
+            raise ValueError(f"intent '{name}' has no patterns")
+
+        responses = list(config.get("responses") or [])
+        if action == ACTION_TEMPLATE and not responses:
+            raise ValueError(f"template intent '{name}' has no responses")
+
+        agent = None
+        if action == ACTION_AGENT:
+            agent_key = config.get("agent")
+            if agent_key not in AGENT_CONFIG:
+                raise ValueError(f"intent '{name}' refers to unknown agent: {agent_key}")
+            agent = AGENT_CONFIG[agent_key]["name"]
+
+        return cls(
+            name=name,
+            action=action,
+            patterns=[re.compile(pattern) for pattern in config["patterns"]],
+            exclude_patterns=[re.compile(pattern) for pattern in config.get("exclude_patterns") or []],
+            responses=responses,
+            agent=agent,
+            max_chars=config.get("max_chars"),
+            unless_question_pending=bool(config.get("unless_question_pending", False)),
+            exclude_session_dependent=bool(config.get("exclude_session_dependent", False)),
+        )
+
+    def matches(self, message: str, folded: str) -> bool:
+        """メッセージがこの意図に当てはまるかどうか
+
+        Args:
+            message: 元のメッセージ
+            folded: 照合用にそろえたメッセージ
+
+        Returns:
+            当てはまる場合はTrue
+        """
+        if self.max_chars is not None and len(folded) > self.max_chars:
+            return False
+        if not any(pattern.search(folded) for pattern in self.patterns):
+            return False
+        if any(pattern.search(folded) for pattern in self.exclude_patterns):
+            return False
+        if self.exclude_session_dependent and is_session_dependent(message):
+            return False
+        return True
+
+
+class IntentRouter:
+    """キーワード・正規表現による意図の振り分けクラス
+
+    ルールは上から順に照合し、最初に当てはまった意図で振り分けます。
+    照合はルール数×パターン数の正規表現検索のみで、LLMの呼び出しに比べて無視できるほど軽量です。
+    """
+
+    def __init__(self, rules: Sequence[IntentRule], enabled: bool = True):
+        """初期化
+
+        Args:
+            rules: 判定ルール（照合する順）
+            enabled: Falseの場合はすべてルートエージェントに任せる
+        """
+        self.rules = list(rules)
+        self.enabled = enabled
+
+        # 統計情報
+        self._decisions: Counter = Counter()
+        self._actions: Counter = Counter()
+        self._question_pending = 0
+        self._route_time = LatencyRecorder()
+
+    @classmethod
+    def from_prompt_config(cls, enabled: bool = True) -> "IntentRouter":
+        """prompts/config.yaml の intent_router からルーターを作成
+
+        Args:
+            enabled: Falseの場合は設定にかかわらず無効にする
+
+        Returns:
+            意図ルーター（設定がない場合は無効）
+        """
+        config = (PromptManager().config or {}).get("intent_router") or {}
+        rules = [IntentRule.from_config(rule) for rule in config.get("intents") or []]
+        enabled = enabled and bool(config.get("enabled", True)) and bool(rules)
+        logger.info(f"Intent router loaded: enabled={enabled} intents={[rule.name for rule in rules]}")
+        return cls(rules, enabled=enabled)
+
+    async def route(
+        self,
+        message: str,
+        question_pending: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> RoutingDecision:
+        """メッセージの振り分け先を判定
+
+        Args:
+            message: ユーザーのメッセージ
+            question_pending: 直前の応答がユーザーへの質問で終わっているかを返す関数
+                （unless_question_pending のルールに当てはまった場合のみ呼び出す）
+
+        Returns:
+            振り分けの結果
+        """
+        decision = RoutingDecision(intent=FALLBACK_INTENT, action=ACTION_LLM)
+        if self.enabled:
+            started_at = time.monotonic()
+            rule = self._match(message)
+            self._route_time.record(time.monotonic() - started_at)
+            if rule is not None:
+                decision = await self._decide(rule, question_pending)
+
+        self._decisions[decision.intent] += 1
+        self._actions[decision.action] += 1
+        INTENT_ROUTER_DECISIONS.labels(intent=decision.intent, action=decision.action).inc()
+        if decision.action != ACTION_LLM:
+            logger.info(f"Intent routed: intent={decision.intent} action={decision.action} agent={decision.agent}")
+        return decision
+
+    def _match(self, message: str) -> Optional[IntentRule]:
+        """最初に当てはまるルールを検索
+
+        Args:
+            message: ユーザーのメッセージ
+
+        Returns:
+            当てはまったルール（ない場合はNone）
+        """
+        folded = fold_text(message)
+        if not folded:
+            return None
+        for rule in self.rules:
+            if rule.matches(message, folded):
+                return rule
+        return None
+
+    async def _decide(
+        self,
+        rule: IntentRule,
+        question_pending: Optional[Callable[[], Awaitable[bool]]],
+    ) -> RoutingDecision:
+        """当てはまったルールから振り分けの結果を作成
+
+        Args:
+            rule: 当てはまったルール
+            question_pending: 直前の応答がユーザーへの質問で終わっているかを返す関数
+
+        Returns:
+            振り分けの結果
+        """
+        if rule.unless_question_pending and question_pending is not None and await question_pending():
+            # 「はい」などが直前の質問への回答になる場合は、文脈を踏まえてルートエージェントが応答
+            self._question_pending += 1
+            return RoutingDecision(intent=rule.name, action=ACTION_LLM)
+        if rule.action == ACTION_TEMPLATE:
+            return RoutingDecision(intent=rule.name, action=ACTION_TEMPLATE, response=random.choice(rule.responses))
+        return RoutingDecision(intent=rule.name, action=ACTION_AGENT, agent=rule.agent)
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            意図・振り分け先ごとの件数と、ルートエージェントを省略した割合を含む辞書
+        """
+        total = sum(self._actions.values())
+        bypassed = total - self._actions[ACTION_LLM]
+        return {
+            "enabled": self.enabled,
+            "total": total,
+            "intents": dict(self._decisions),
+            "actions": dict(self._actions),
+            "bypass_rate": bypassed / total if total else 0.0,
+            "template_rate": self._actions[ACTION_TEMPLATE] / total if total else 0.0,
+            "question_pending": self._question_pending,
+            "route_seconds": self._route_time.snapshot(),
+        }
+
+
+def ends_with_question(text: Optional[str]) -> bool:
+    """応答がユーザーへの質問で終わっているかどうか
+
+    Args:
+        text: 応答テキスト
+
+    Returns:
+        末尾が疑問符の場合はTrue
+    """
+    return bool(text) and text.rstrip().endswith(_QUESTION_MARKS)
@@ -4,15 +4,18 @@
 Content形式に変換する機能を提供します。
 """
 
-import base64
-from typing import Optional
+from typing import Optional, Sequence, Tuple, Union
 
 from google.genai import types
 
 from utils.logging import setup_cloud_logging
+from utils.spooled_buffer import SpooledBuffer
 
 logger = setup_cloud_logging("message_handler")
 
+# 画像データとして受け付ける型
+ImageSource = Union[bytes, memoryview, SpooledBuffer]
+
 
 class MessageHandler:
     """メッセージ処理クラス
@@ -24,15 +27,17 @@ class MessageHandler:
     @staticmethod
     def create_message_content(
         message: str,
-        image_data: Optional[bytes] = None,
+        image_data: Optional[ImageSource] = None,
         image_mime_type: Optional[str] = None,
+        images: Optional[Sequence[Tuple[ImageSource, str]]] = None,
     ) -> types.Content:
         """メッセージをContent型に変換
 
         Args:
             message: ユーザーのメッセージ文字列
-            image_data: 画像バイナリデータ（オプション）
+            image_data: 画像バイナリデータまたはそのビュー（オプション）
             image_mime_type: 画像MIMEタイプ（オプション）
+            images: 画像データとMIMEタイプの組のリスト（複数画像を送る場合）
 
         Returns:
             Content型のメッセージ
@@ -41,21 +46,53 @@ class MessageHandler:
         parts = [types.Part(text=message)]
 
         # 画像がある場合はそれを追加
+        image_sources = list(images or [])
         if image_data and image_mime_type:
-            logger.info(
-                f"Adding image data to message (MIME type: {image_mime_type})"
-            )
-
-            # 画像データをbase64エンコード
-            image_base64 = base64.b64encode(image_data).decode("utf-8")
+            image_sources.insert(0, (image_data, image_mime_type))
 
-            # 画像パートを追加
-            image_part = types.Part(
-                inline_data=types.Blob(
-                    mime_type=image_mime_type, data=image_base64
-                )
-            )
-            parts.append(image_part)
+        for data, mime_type in image_sources:
+            logger.info(f"Adding image data to message (MIME type: {mime_type})")
+            parts.append(MessageHandler.create_image_part(data, mime_type))
 
         # Content型にまとめる
-        return types.Content(role="user", parts=parts)
\ No newline at end of file
+        return types.Content(role="user", parts=parts)
+
+    @staticmethod
+    def create_image_part(data: ImageSource, mime_type: str) -> types.Part:
+        """画像データから画像パートを作成
+
+        base64文字列を経由せず、生のバイト列をそのままBlobに渡します
+        （base64への変換はSDKが送信時に1回だけ行います）。
+
+        Args:
+            data: 画像データ（bytes、memoryview、またはSpooledBuffer）
+            mime_type: 画像MIMEタイプ
+
+        Returns:
+            画像パート
+        """
+        return types.Part(
+            inline_data=types.Blob(mime_type=mime_type, data=MessageHandler._as_bytes(data))
+        )
+
+    @staticmethod
+    def _as_bytes(data: ImageSource) -> bytes:
+        """画像データをBlobが受け付けるbytesに変換
+
+        Blobのdataはbytes型のみを受け付けるため、bytesはそのまま使い、
+        bytes全体を指すビューは元のオブジェクトを取り出します。
+        それ以外（バッファやmmapのビュー、一時ファイル）は1回だけbytesを作成します。
+
+        Args:
+            data: 画像データ
+
+        Returns:
+            画像データのbytes
+        """
+        if isinstance(data, bytes):
+            return data
+        if isinstance(data, SpooledBuffer):
+            return data.getvalue()
+        if isinstance(data.obj, bytes) and data.nbytes == len(data.obj):
+            return data.obj
+        return data.tobytes()
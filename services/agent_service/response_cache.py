@@ -0,0 +1,395 @@
+"""応答キャッシュモジュール
+
+このモジュールは、言い回しだけが異なる同じ質問（「カレーのレシピ教えて」
+「カレーの作り方は？」など）に対するエージェントの応答をキャッシュし、
+エージェントを再実行せずに応答を返す機能を提供します。
+質問文を正規化した上で、完全一致は正規化後の文字列、近似一致は文字n-gramの
+MinHashとLSH（Locality Sensitive Hashing）の索引で判定します。
+人数・時間などの数量や、食材名などの内容語（漢字・カタカナの語）が異なる質問は、
+文字列が似ていても近似一致とみなしません。
+"""
+
+import random
+import re
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from services.agent_service.constants import (
+    RESPONSE_CACHE_BANDS,
+    RESPONSE_CACHE_MAX_DIFF_SHINGLES,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_QUERY_CHARS,
+    RESPONSE_CACHE_NGRAM,
+    RESPONSE_CACHE_NUM_PERM,
+    RESPONSE_CACHE_SIMILARITY,
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+from services.agent_service.text_normalizer import (
+    content_words,
+    is_session_dependent,
+    normalize_query,
+)
+from utils.logging import setup_cloud_logging
+from utils.metrics import LatencyRecorder
+
+logger = setup_cloud_logging("response_cache")
+
+# MinHashのハッシュ関数 (a * x + b) mod p に使うメルセンヌ素数と出力の上限
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# エントリの大きさに加算する固定のオーバーヘッド（辞書・索引・オブジェクトの概算）
+_ENTRY_OVERHEAD_BYTES = 512
+
+# 数量を表す数字（「3人分」「10分」など。近似一致では完全に一致する必要がある）
+_NUMBER_PATTERN = re.compile(r"[0-9一二三四五六七八九十百千]+")
+
+
+@dataclass(frozen=True)
+class CacheQuery:
+    """キャッシュ検索用に前処理した質問"""
+
+    normalized: str
+    shingles: FrozenSet[str]
+    signature: Tuple[int, ...]
+    numbers: Tuple[str, ...] = ()
+    content: FrozenSet[str] = frozenset()
+
+
+@dataclass
+class _CacheEntry:
+    """キャッシュエントリ"""
+
+    key: str
+    shingles: FrozenSet[str]
+    numbers: Tuple[str, ...]
+    content: FrozenSet[str]
+    band_keys: Tuple[int, ...]
+    response: str
+    size: int
+    expires_at: float
+
+
+def char_shingles(text: str, n: int) -> FrozenSet[str]:
+    """文字n-gramの集合を作成
+
+    Args:
+        text: 対象の文字列
+        n: n-gramの文字数
+
+    Returns:
+        n-gramの集合（n文字未満の場合は文字列全体のみ）
+    """
+    if len(text) <= n:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """2つの集合のJaccard係数を計算"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class ResponseCache:
+    """近似一致に対応した応答キャッシュクラス
+
+    MinHashの署名を行数の等しいバンドに分け、いずれかのバンドが一致するエントリを
+    候補として取り出します。候補はn-gram集合のJaccard係数で検証し、
+    閾値以上で最も類似度の高いエントリを返します。ただし、数量・内容語が異なるものや、
+    一方にしかないn-gramが助詞・送り仮名の違いを超えて多いものは除きます
+    （「豚肉と…」と「鶏肉と…」のように、長い共通部分の中で食材だけが異なる質問を区別するため）。
+    エントリは件数とバイト数の両方の上限を超えないよう、最も古く使われたものから破棄します。
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+        max_query_chars: int = RESPONSE_CACHE_MAX_QUERY_CHARS,
+        ngram: int = RESPONSE_CACHE_NGRAM,
+        num_perm: int = RESPONSE_CACHE_NUM_PERM,
+        bands: int = RESPONSE_CACHE_BANDS,
+        max_diff_shingles: int = RESPONSE_CACHE_MAX_DIFF_SHINGLES,
+        seed: int = 1,
+    ):
+        """初期化
+
+        Args:
+            ttl_seconds: 応答を保持する秒数
+            max_entries: 保持する最大件数
+            max_bytes: 保持する応答の合計バイト数の上限
+            similarity: 近似一致とみなすJaccard係数の下限（1.0で近似一致を無効化）
+            max_query_chars: キャッシュ対象とする質問の最大文字数（長い質問は個別性が高いため対象外）
+            ngram: n-gramの文字数
+            num_perm: MinHashの署名長
+            bands: LSHのバンド数（num_permを割り切れる数）
+            max_diff_shingles: 近似一致で許す、一方にしかないn-gramの数
+            seed: MinHashのハッシュ関数を決める乱数のシード
+        """
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.similarity = similarity
+        self.max_query_chars = max_query_chars
+        self.ngram = ngram
+        self.max_diff_shingles = max_diff_shingles
+        self.rows = num_perm // bands
+
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._bands: List[Dict[int, Set[str]]] = [{} for _ in range(bands)]
+        self._bytes = 0
+
+        # 統計情報
+        self._exact_hits = 0
+        self._near_hits = 0
+        self._misses = 0
+        self._bypassed = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._lookup_time = LatencyRecorder()
+
+    def prepare(self, message: str) -> Optional[CacheQuery]:
+        """質問文をキャッシュ検索用に前処理
+
+        Args:
+            message: 質問文
+
+        Returns:
+            CacheQuery。セッションの文脈に依存する質問など、キャッシュ対象外の場合はNone
+        """
+        if len(message) > self.max_query_chars or is_session_dependent(message):
+            self._bypassed += 1
+            return None
+        normalized = normalize_query(message)
+        if not normalized:
+            self._bypassed += 1
+            return None
+        shingles = char_shingles(normalized, self.ngram)
+        return CacheQuery(
+            normalized=normalized,
+            shingles=shingles,
+            signature=self._minhash(shingles),
+            numbers=tuple(_NUMBER_PATTERN.findall(normalized)),
+            content=content_words(message),
+        )
+
+    def get(self, query: CacheQuery) -> Optional[str]:
+        """キャッシュされた応答を取得
+
+        Args:
+            query: 前処理した質問
+
+        Returns:
+            応答。キャッシュにない場合はNone
+        """
+        started_at = time.monotonic()
+        try:
+            now = time.time()
+            entry = self._get_live(query.normalized, now)
+            if entry is not None:
+                self._exact_hits += 1
+                return entry.response
+
+            if self.similarity < 1.0:
+                match = self._find_near(query, now)
+                if match is not None:
+                    score, entry = match
+                    self._near_hits += 1
+                    logger.info(
+                        f"Near-duplicate response cache hit: similarity={score:.2f} "
+                        f"query={query.normalized[:30]} cached={entry.key[:30]}"
+                    )
+                    return entry.response
+
+            self._misses += 1
+            return None
+        finally:
+            self._lookup_time.record(time.monotonic() - started_at)
+
+    def put(self, query: CacheQuery, response: str) -> None:
+        """応答をキャッシュに保存
+
+        Args:
+            query: 前処理した質問
+            response: エージェントの応答
+        """
+        size = (
+            len(response.encode("utf-8"))
+            + len(query.normalized.encode("utf-8"))
+            + _ENTRY_OVERHEAD_BYTES
+        )
+        if size > self.max_bytes:
+            logger.info(f"Response too large to cache: {size} bytes")
+            return
+
+        key = query.normalized
+        if key in self._entries:
+            self._remove(key)
+
+        band_keys = self._band_keys(query.signature)
+        self._entries[key] = _CacheEntry(
+            key=key,
+            shingles=query.shingles,
+            numbers=query.numbers,
+            content=query.content,
+            band_keys=band_keys,
+            response=response,
+            size=size,
+            expires_at=time.time() + self.ttl_seconds,
+        )
+        self._bytes += size
+        for index, band_key in enumerate(band_keys):
+            self._bands[index].setdefault(band_key, set()).add(key)
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self._evictions += 1
+
+    def _get_live(self, key: str, now: float) -> Optional[_CacheEntry]:
+        """有効期限内のエントリを取得し、LRU順を更新
+
+        Args:
+            key: 正規化した質問
+            now: 現在時刻
+
+        Returns:
+            エントリ。存在しないか期限切れの場合はNone
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._remove(key)
+            self._expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _find_near(self, query: CacheQuery, now: float) -> Optional[Tuple[float, _CacheEntry]]:
+        """類似度が閾値以上のエントリのうち最も類似したものを検索（同じ内容を尋ねるもののみ）
+
+        Args:
+            query: 前処理した質問
+            now: 現在時刻
+
+        Returns:
+            類似度とエントリの組。見つからない場合はNone
+        """
+        candidates: Set[str] = set()
+        for index, band_key in enumerate(self._band_keys(query.signature)):
+            candidates.update(self._bands[index].get(band_key, ()))
+
+        best: Optional[Tuple[float, str]] = None
+        for key in candidates:
+            entry = self._entries.get(key)
+            if entry is None or not self._same_subject(query, entry):
+                continue
+            score = jaccard(query.shingles, entry.shingles)
+            if score >= self.similarity and (best is None or score > best[0]):
+                best = (score, key)
+
+        if best is None:
+            return None
+        entry = self._get_live(best[1], now)
+        return (best[0], entry) if entry is not None else None
+
+    def _same_subject(self, query: CacheQuery, entry: _CacheEntry) -> bool:
+        """言い回しの違いを除いて同じ内容を尋ねているかどうか
+
+        Args:
+            query: 前処理した質問
+            entry: 近似一致の候補
+
+        Returns:
+            数量・内容語が一致し、異なるn-gramが助詞・送り仮名程度の数であればTrue
+        """
+        # 人数や時間、食材名などが異なる質問の応答は使わない
+        if entry.numbers != query.numbers or entry.content != query.content:
+            return False
+        # ひらがなで書かれた食材名などの違いは、異なるn-gramの数で区別する
+        return len(query.shingles ^ entry.shingles) <= self.max_diff_shingles
+
+    def _remove(self, key: str) -> None:
+        """エントリと索引を削除
+
+        Args:
+            key: 正規化した質問
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for index, band_key in enumerate(entry.band_keys):
+            keys = self._bands[index].get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[index][band_key]
+
+    def _minhash(self, shingles: FrozenSet[str]) -> Tuple[int, ...]:
+        """n-gram集合のMinHash署名を計算
+
+        Args:
+            shingles: n-gramの集合
+
+        Returns:
+            ハッシュ関数ごとの最小値の組
+        """
+        hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles]
+        return tuple(
+            min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes)
+            for a, b in self._permutations
+        )
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> Tuple[int, ...]:
+        """署名をバンドごとのキーに変換
+
+        Args:
+            signature: MinHash署名
+
+        Returns:
+            バンドごとのキーの組
+        """
+        return tuple(
+            hash(signature[start:start + self.rows])
+            for start in range(0, len(signature), self.rows)
+        )
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            ヒット率・件数・バイト数・検索時間を含む辞書
+        """
+        hits = self._exact_hits + self._near_hits
+        lookups = hits + self._misses
+        return {
+            "size": len(self._entries),
+            "bytes": self._bytes,
+            "exact_hits": self._exact_hits,
+            "near_hits": self._near_hits,
+            "misses": self._misses,
+            "bypassed": self._bypassed,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+            "lookup_seconds": self._lookup_time.snapshot(),
+        }
@@ -0,0 +1,162 @@
+"""セッションの保存先モジュール
+
+このモジュールは、SESSION_BACKEND の設定に応じたセッションサービスを作成します。
+memory はプロセス内に保持し（再起動・スケールアウトで会話が失われる。メモリ使用量には上限を設定可能）、
+database は SQLAlchemy 経由でデータベースに保存します（ローカルは SQLite、本番は Cloud SQL の PostgreSQL）。
+データベースへの接続は、プールの大きさ・接続の死活確認・ステートメントのタイムアウトを設定して共有します。
+"""
+
+from typing import Dict, Optional
+
+from google.adk.sessions import BaseSessionService, DatabaseSessionService, InMemorySessionService
+from sqlalchemy import event
+from sqlalchemy.engine import URL, make_url
+
+from services.agent_service.bounded_session_service import BoundedInMemorySessionService
+from services.agent_service.constants import (
+    DB_INSTANCE_CONNECTION_NAME,
+    DB_NAME,
+    DB_PASS,
+    DB_USER,
+    SESSION_BACKEND,
+    SESSION_DB_MAX_OVERFLOW,
+    SESSION_DB_POOL_RECYCLE_SECONDS,
+    SESSION_DB_POOL_SIZE,
+    SESSION_DB_POOL_TIMEOUT_SECONDS,
+    SESSION_DB_STATEMENT_TIMEOUT_MS,
+    SESSION_DB_URL,
+    SESSION_IDLE_TTL_SECONDS,
+    SESSION_MEMORY_MAX_BYTES,
+)
+from utils.logging import setup_cloud_logging
+
+logger = setup_cloud_logging("session_backend")
+
+
+def build_database_url() -> Optional[URL]:
+    """セッションを保存するデータベースの接続URLを作成
+
+    SESSION_DB_URL が設定されていればそれを使い、なければ DB_* の設定から
+    Cloud SQL の Unix ソケットに asyncpg で接続するURLを作成します。
+
+    Returns:
+        接続URL（設定がない場合はNone）
+    """
+    if SESSION_DB_URL:
+        return make_url(SESSION_DB_URL)
+    if DB_PASS and DB_INSTANCE_CONNECTION_NAME:
+        return URL.create(
+            drivername="postgresql+asyncpg",
+            username=DB_USER,
+            password=DB_PASS,
+            database=DB_NAME,
+            query={"host": f"/cloudsql/{DB_INSTANCE_CONNECTION_NAME}"},
+        )
+    return None
+
+
+def engine_options(url: URL) -> Dict:
+    """データベースに合わせたエンジンの設定を作成
+
+    Args:
+        url: 接続URL
+
+    Returns:
+        create_async_engine に渡すキーワード引数
+    """
+    timeout_seconds = SESSION_DB_STATEMENT_TIMEOUT_MS / 1000
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        # SQLiteはファイルロックの待ち時間をタイムアウトとして設定（プールはSQLAlchemyの既定を使用）
+        if url.database in (None, "", ":memory:"):
+            return {}
+        return {"connect_args": {"timeout": timeout_seconds}}
+
+    options: Dict = {
+        "pool_size": SESSION_DB_POOL_SIZE,
+        "max_overflow": SESSION_DB_MAX_OVERFLOW,
+        "pool_timeout": SESSION_DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": SESSION_DB_POOL_RECYCLE_SECONDS,
+        # Cloud SQLのアイドル切断後も、切れた接続を使わないよう借りる前に確認
+        "pool_pre_ping": True,
+    }
+    driver = url.get_driver_name()
+    if backend == "postgresql" and driver == "asyncpg":
+        options["connect_args"] = {
+            "server_settings": {"statement_timeout": str(SESSION_DB_STATEMENT_TIMEOUT_MS)},
+            # サーバーが応答しない場合に備え、クライアント側でも少し長めに打ち切る
+            "command_timeout": timeout_seconds + 1,
+        }
+    elif backend == "postgresql" and driver == "psycopg":
+        options["connect_args"] = {"options": f"-c statement_timeout={SESSION_DB_STATEMENT_TIMEOUT_MS}"}
+    elif backend == "mysql":
+        options["connect_args"] = {"init_command": f"SET SESSION max_execution_time={SESSION_DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def _set_sqlite_wal(dbapi_connection, connection_record) -> None:
+    """SQLiteを読み取りと書き込みが同時に行えるWALモードにする"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def create_session_service(backend: str = SESSION_BACKEND) -> BaseSessionService:
+    """設定に応じたセッションサービスを作成
+
+    Args:
+        backend: memory または database
+
+    Returns:
+        セッションサービス
+
+    Raises:
+        ValueError: 保存先の指定や接続先の設定が不正な場合
+    """
+    if backend == "memory":
+        if SESSION_MEMORY_MAX_BYTES > 0 or SESSION_IDLE_TTL_SECONDS > 0:
+            return BoundedInMemorySessionService()
+        return InMemorySessionService()
+    if backend != "database":
+        raise ValueError(f"unknown SESSION_BACKEND: {backend}")
+
+    url = build_database_url()
+    if url is None:
+        raise ValueError("SESSION_BACKEND=database requires SESSION_DB_URL or DB_PASS and DB_INSTANCE_CONNECTION_NAME")
+
+    service = DatabaseSessionService(
+        db_url=url.render_as_string(hide_password=False), **engine_options(url)
+    )
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        event.listen(service.db_engine.sync_engine, "connect", _set_sqlite_wal)
+    logger.info(f"Session backend: database ({url.render_as_string(hide_password=True)})")
+    return service
+
+
+def backend_stats(session_service: BaseSessionService) -> dict:
+    """セッションサービスの接続プールの状態を取得
+
+    Args:
+        session_service: セッションサービス
+
+    Returns:
+        保存先と、メモリの場合は保持しているセッションの大きさ、
+        データベースの場合は接続プールの使用状況を含む辞書
+    """
+    if isinstance(session_service, BoundedInMemorySessionService):
+        return {"backend": "memory", **session_service.stats()}
+    if not isinstance(session_service, DatabaseSessionService):
+        return {"backend": "memory"}
+
+    pool = session_service.db_engine.pool
+    stats = {"backend": "database", "dialect": session_service.db_engine.dialect.name}
+    for key, method in (
+        ("pool_size", "size"),
+        ("checked_out", "checkedout"),
+        ("checked_in", "checkedin"),
+        ("overflow", "overflow"),
+    ):
+        if hasattr(pool, method):
+            stats[key] = getattr(pool, method)()
+    return stats
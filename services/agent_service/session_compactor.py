@@ -0,0 +1,422 @@
+"""セッション履歴の圧縮モジュール
+
+このモジュールは、セッションの履歴が長くなった場合に古い会話を1つの要約に置き換え、
+ターンごとにモデルへ送る履歴の大きさを抑える機能を提供します。
+要約はADKの圧縮イベント（EventActions.compaction）として追加するため、保存済みのイベントは
+そのまま残り、モデルへのリクエストを組み立てる際に範囲内のイベントが要約に置き換わります。
+直近の数ターンは要約せずにそのまま送ります。
+毎ターンの判定は直近のイベントだけで行い、全履歴は圧縮が必要な場合のみ読み込みます。
+"""
+
+import asyncio
+import time
+from typing import List, Optional, Tuple
+
+from google.adk.apps.base_events_summarizer import BaseEventsSummarizer
+from google.adk.apps.llm_event_summarizer import LlmEventSummarizer
+from google.adk.events import Event
+from google.adk.events.event_actions import EventActions, EventCompaction
+from google.adk.models.registry import LLMRegistry
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.genai import types
+
+from agents.config import SEARCH_MODEL
+from services.agent_service.constants import (
+    APP_NAME,
+    SESSION_COMPACTION_KEEP_TURNS,
+    SESSION_COMPACTION_MAX_EVENTS,
+    SESSION_COMPACTION_MAX_TOKENS,
+    SESSION_COMPACTION_SUMMARIZER,
+    SESSION_COMPACTION_SUMMARY_MAX_CHARS,
+)
+from utils.logging import setup_cloud_logging
+from utils.metrics import LatencyRecorder
+from utils.prometheus_metrics import SESSION_COMPACTIONS, SESSION_TOKENS_SAVED
+
+logger = setup_cloud_logging("session_compactor")
+
+# 画像1枚あたりのトークン数（Geminiの画像入力の目安）
+_IMAGE_TOKENS = 258
+
+# SEARCH_MODELが未設定の場合に要約に使うモデル
+_DEFAULT_SUMMARY_MODEL = "gemini-2.0-flash"
+
+# 要約の作成にかける最大秒数（超えた場合は今回は圧縮しない）
+_SUMMARIZE_TIMEOUT_SECONDS = 10
+
+# 抽出型の要約の見出しと、発言ごとに残す文字数・行数
+_SUMMARY_HEADER = "（これまでの会話の要約）"
+_USER_LINE_CHARS = 80
+_RESPONSE_LINE_CHARS = 120
+_RESPONSE_HEADLINES = 3
+
+# 前回の要約を要約の入力に含めるときの作成者名
+_SUMMARY_AUTHOR = "summary"
+
+# 圧縮イベントに記録する、要約に置き換えたイベントのトークン数（概算）のキー
+_COVERED_TOKENS_KEY = "covered_tokens"
+
+
+def estimate_text_tokens(text: str) -> int:
+    """テキストのトークン数を概算
+
+    英数字は約4文字で1トークン、日本語などの非ASCII文字は約1文字で1トークンとして数えます。
+
+    Args:
+        text: 対象のテキスト
+
+    Returns:
+        トークン数の概算
+    """
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (len(text) - ascii_chars) + ascii_chars // 4
+
+
+def estimate_event_tokens(event: Event) -> int:
+    """イベントがモデルへのリクエストに占めるトークン数を概算
+
+    Args:
+        event: セッションのイベント（圧縮イベントの場合は要約の大きさ）
+
+    Returns:
+        トークン数の概算
+    """
+    content = event.content
+    if event.actions and event.actions.compaction:
+        content = event.actions.compaction.compacted_content
+    if not content or not content.parts:
+        return 0
+
+    tokens = 0
+    for part in content.parts:
+        if part.text:
+            tokens += estimate_text_tokens(part.text)
+        if part.inline_data:
+            tokens += _IMAGE_TOKENS
+        if part.function_call:
+            tokens += estimate_text_tokens(f"{part.function_call.name}{part.function_call.args}")
+        if part.function_response:
+            tokens += estimate_text_tokens(str(part.function_response.response))
+    return tokens
+
+
+def _is_compaction(event: Event) -> bool:
+    """圧縮イベントかどうか"""
+    return bool(event.actions and event.actions.compaction)
+
+
+def _covered_tokens(summary: Optional[Event]) -> int:
+    """圧縮イベントが置き換えたイベントのトークン数（記録がない場合は0）"""
+    if summary is None or not summary.custom_metadata:
+        return 0
+    return int(summary.custom_metadata.get(_COVERED_TOKENS_KEY, 0))
+
+
+def _event_text(event: Event) -> str:
+    """イベントのテキスト（思考過程を除く）を取得"""
+    if not event.content or not event.content.parts:
+        return ""
+    return "".join(part.text for part in event.content.parts if part.text and not part.thought)
+
+
+def _clip(text: str, limit: int) -> str:
+    """指定の文字数を超える部分を省略"""
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def visible_history(events: List[Event]) -> Tuple[Optional[Event], List[Event]]:
+    """モデルへのリクエストに含まれる履歴を取得
+
+    Args:
+        events: セッションのイベント
+
+    Returns:
+        最新の圧縮イベント（ない場合はNone）と、その範囲外のイベントの組
+    """
+    summary = next((event for event in reversed(events) if _is_compaction(event)), None)
+    if summary is None:
+        return None, list(events)
+    compaction = summary.actions.compaction
+    return summary, [
+        event
+        for event in events
+        if not _is_compaction(event)
+        and not compaction.start_timestamp <= event.timestamp <= compaction.end_timestamp
+    ]
+
+
+class ExtractiveSummarizer(BaseEventsSummarizer):
+    """モデルを使わずに会話の要点を抜き出す要約クラス
+
+    ユーザーの発言は先頭行、エージェントの応答は先頭行と見出し（【】で始まる行）を残し、
+    要約全体が上限の文字数を超える場合は古い行から削ります。
+    """
+
+    def __init__(self, max_chars: int = SESSION_COMPACTION_SUMMARY_MAX_CHARS):
+        """初期化
+
+        Args:
+            max_chars: 要約の最大文字数
+        """
+        self.max_chars = max_chars
+
+    async def maybe_summarize_events(self, *, events: List[Event]) -> Optional[Event]:
+        """イベントを1つの圧縮イベントにまとめる
+
+        Args:
+            events: 要約するイベント（先頭は前回の要約の場合あり）
+
+        Returns:
+            圧縮イベント（要約する発言がない場合はNone）
+        """
+        lines: List[str] = []
+        for event in events:
+            text = _event_text(event).strip()
+            if not text:
+                continue
+            if event.author == _SUMMARY_AUTHOR:
+                lines.extend(line for line in text.splitlines() if line and line != _SUMMARY_HEADER)
+            elif event.author == "user":
+                lines.append(f"- ユーザー: {_clip(text.splitlines()[0], _USER_LINE_CHARS)}")
+            else:
+                lines.append(f"  - {event.author}: {self._headline(text)}")
+        if not lines:
+            return None
+
+        # 上限を超える場合は古い行から削る
+        total = len(_SUMMARY_HEADER) + sum(len(line) + 1 for line in lines)
+        while len(lines) > 1 and total > self.max_chars:
+            total -= len(lines.pop(0)) + 1
+        summary = "\n".join([_SUMMARY_HEADER, *lines])
+
+        return Event(
+            author="user",
+            invocation_id=Event.new_id(),
+            actions=EventActions(
+                compaction=EventCompaction(
+                    start_timestamp=events[0].timestamp,
+                    end_timestamp=events[-1].timestamp,
+                    compacted_content=types.Content(role="model", parts=[types.Part(text=summary)]),
+                )
+            ),
+        )
+
+    @staticmethod
+    def _headline(text: str) -> str:
+        """応答の先頭行と見出し行をつなげる"""
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        headlines = lines[:1] + [line for line in lines[1:] if line.startswith("【")]
+        return _clip(" / ".join(headlines[:_RESPONSE_HEADLINES]), _RESPONSE_LINE_CHARS)
+
+
+def create_summarizer(name: str = SESSION_COMPACTION_SUMMARIZER) -> BaseEventsSummarizer:
+    """設定に応じた要約クラスを作成
+
+    Args:
+        name: extractive または llm
+
+    Returns:
+        要約クラスのインスタンス
+
+    Raises:
+        ValueError: 要約の作成方法の指定が不正な場合
+    """
+    if name == "extractive":
+        return ExtractiveSummarizer()
+    if name == "llm":
+        return LlmEventSummarizer(llm=LLMRegistry.new_llm(SEARCH_MODEL or _DEFAULT_SUMMARY_MODEL))
+    raise ValueError(f"unknown SESSION_COMPACTION_SUMMARIZER: {name}")
+
+
+class SessionCompactor:
+    """セッション履歴の圧縮クラス
+
+    モデルに送る履歴（前回の要約とその後のイベント）がイベント数またはトークン数の上限を超えた場合に、
+    直近のターンを除くイベントを前回の要約と合わせて新しい要約にまとめます。
+    ターンごとに、圧縮によって送らずに済んだトークン数を記録します。
+    """
+
+    def __init__(
+        self,
+        session_service: BaseSessionService,
+        summarizer: Optional[BaseEventsSummarizer] = None,
+        max_events: int = SESSION_COMPACTION_MAX_EVENTS,
+        max_tokens: int = SESSION_COMPACTION_MAX_TOKENS,
+        keep_turns: int = SESSION_COMPACTION_KEEP_TURNS,
+    ):
+        """初期化
+
+        Args:
+            session_service: セッションサービスのインスタンス
+            summarizer: 要約クラス（省略時はSESSION_COMPACTION_SUMMARIZERの設定に従う）
+            max_events: 要約せずに送るイベント数の上限
+            max_tokens: 送る履歴のトークン数（概算）の上限
+            keep_turns: 要約せずにそのまま残す直近のターン数
+        """
+        self.session_service = session_service
+        self.summarizer = summarizer or create_summarizer()
+        self.summarizer_name = type(self.summarizer).__name__
+        self.max_events = max_events
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+
+        # 統計情報
+        self._compactions = 0
+        self._failures = 0
+        self._tokens_saved = LatencyRecorder()
+        self._history_tokens = LatencyRecorder()
+        self._summarize_time = LatencyRecorder()
+
+    async def maybe_compact(self, user_id: str, session_id: str) -> int:
+        """履歴が上限を超えていれば圧縮し、圧縮によって送らずに済むトークン数を返す
+
+        圧縮に失敗した場合もエラーにはせず、圧縮せずに続行します。
+
+        Args:
+            user_id: ユーザーID
+            session_id: セッションID
+
+        Returns:
+            今回のターンで送らずに済むトークン数（概算）
+        """
+        # 上限を1件超える分だけ読み込めば、送る履歴が上限を超えているかを判定できる
+        recent = await self._recent_events(user_id, session_id, self.max_events + 1)
+        if recent is None:
+            return 0
+        summary, events = visible_history(recent)
+        # 読み込んだ範囲より前にも要約されていないイベントがある場合は、全履歴で判定する
+        truncated = len(recent) > self.max_events and bool(events) and events[0] is recent[0]
+
+        if truncated or self._over_limit(summary, events):
+            session = await self.session_service.get_session(
+                app_name=APP_NAME, user_id=user_id, session_id=session_id
+            )
+            if session is None:
+                return 0
+            summary, events = visible_history(session.events)
+            if self._over_limit(summary, events):
+                sent_tokens = self._history_size(summary, events)
+                compaction_event = await self._summarize(summary, events)
+                if compaction_event is not None:
+                    await self.session_service.append_event(session, compaction_event)
+                    summary, events = visible_history(session.events)
+                    logger.info(
+                        f"Compacted session {session_id}: tokens {sent_tokens} -> "
+                        f"{self._history_size(summary, events)}, events kept {len(events)}"
+                    )
+
+        sent_tokens = self._history_size(summary, events)
+        saved = max(_covered_tokens(summary) - (estimate_event_tokens(summary) if summary else 0), 0)
+        SESSION_TOKENS_SAVED.observe(saved)
+        self._tokens_saved.record(saved)
+        self._history_tokens.record(sent_tokens)
+        return saved
+
+    async def _recent_events(self, user_id: str, session_id: str, count: int) -> Optional[List[Event]]:
+        """セッションの直近のイベントを取得
+
+        メモリ上のセッションは、全履歴をコピーせずに保存済みのイベントを参照します（読み取りのみ）。
+
+        Args:
+            user_id: ユーザーID
+            session_id: セッションID
+            count: 取得するイベント数
+
+        Returns:
+            直近のイベントのリスト（セッションがない場合はNone）
+        """
+        if isinstance(self.session_service, InMemorySessionService):
+            stored: Optional[Session] = (
+                self.session_service.sessions.get(APP_NAME, {}).get(user_id, {}).get(session_id)
+            )
+            if stored is not None:
+                return stored.events[-count:]
+
+        session = await self.session_service.get_session(
+            app_name=APP_NAME,
+            user_id=user_id,
+            session_id=session_id,
+            config=GetSessionConfig(num_recent_events=count),
+        )
+        return session.events if session is not None else None
+
+    def _over_limit(self, summary: Optional[Event], events: List[Event]) -> bool:
+        """送る履歴がイベント数またはトークン数の上限を超えているかどうか"""
+        return len(events) > self.max_events or self._history_size(summary, events) > self.max_tokens
+
+    @staticmethod
+    def _history_size(summary: Optional[Event], events: List[Event]) -> int:
+        """要約とイベントのトークン数の合計を概算"""
+        tokens = estimate_event_tokens(summary) if summary is not None else 0
+        return tokens + sum(estimate_event_tokens(event) for event in events)
+
+    async def _summarize(self, summary: Optional[Event], events: List[Event]) -> Optional[Event]:
+        """直近のターンを除くイベントを、前回の要約と合わせて要約
+
+        Args:
+            summary: 前回の圧縮イベント
+            events: 前回の要約の範囲外のイベント
+
+        Returns:
+            新しい圧縮イベント（要約できるイベントがない場合や失敗した場合はNone）
+        """
+        # ターンの途中（ツールの呼び出しと応答の間）で切らないよう、ユーザーの発言の位置で区切る
+        turn_starts = [
+            index for index, event in enumerate(events) if event.author == "user" and _event_text(event)
+        ]
+        if len(turn_starts) <= self.keep_turns:
+            return None
+        split = turn_starts[-self.keep_turns] if self.keep_turns > 0 else len(events)
+        to_summarize = events[:split]
+        if summary is not None:
+            compaction = summary.actions.compaction
+            to_summarize.insert(
+                0,
+                Event(
+                    author=_SUMMARY_AUTHOR,
+                    timestamp=compaction.start_timestamp,
+                    content=compaction.compacted_content,
+                ),
+            )
+
+        started_at = time.monotonic()
+        try:
+            async with asyncio.timeout(_SUMMARIZE_TIMEOUT_SECONDS):
+                compaction_event = await self.summarizer.maybe_summarize_events(events=to_summarize)
+        except Exception as e:
+            self._failures += 1
+            SESSION_COMPACTIONS.labels(summarizer=self.summarizer_name, outcome="error").inc()
+            logger.warning(f"セッション履歴の要約に失敗したため、圧縮せずに続行します: {e}")
+            return None
+        finally:
+            self._summarize_time.record(time.monotonic() - started_at)
+
+        if compaction_event is None:
+            return None
+        # 送らずに済むトークン数を全履歴を読み込まずに求められるよう、置き換えた分を記録
+        covered_tokens = _covered_tokens(summary) + sum(
+            estimate_event_tokens(event) for event in events[:split]
+        )
+        compaction_event.custom_metadata = {
+            **(compaction_event.custom_metadata or {}),
+            _COVERED_TOKENS_KEY: covered_tokens,
+        }
+        self._compactions += 1
+        SESSION_COMPACTIONS.labels(summarizer=self.summarizer_name, outcome="ok").inc()
+        return compaction_event
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            圧縮の回数と、ターンごとの送らずに済んだトークン数・送った履歴のトークン数を含む辞書
+        """
+        return {
+            "summarizer": self.summarizer_name,
+            "compactions": self._compactions,
+            "failures": self._failures,
+            "tokens_saved_per_turn": self._tokens_saved.snapshot(),
+            "history_tokens_per_turn": self._history_tokens.snapshot(),
+            "summarize_seconds": self._summarize_time.snapshot(),
+        }
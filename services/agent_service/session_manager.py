@@ -4,29 +4,59 @@
 セッションの作成、取得、更新などの機能を提供します。
 """
 
-from typing import Optional
-
-from google.adk.sessions import InMemorySessionService, Session
-
-from services.agent_service.constants import APP_NAME
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.genai import types
+
+from services.agent_service.bounded_session_service import BoundedInMemorySessionService
+from services.agent_service.constants import APP_NAME, SESSION_EXISTS_CACHE_SIZE
+from services.agent_service.session_backend import backend_stats
 from utils.logging import setup_cloud_logging
+from utils.metrics import LatencyRecorder
 
 logger = setup_cloud_logging("session_manager")
 
+# 直近の応答を探すときに読み込むイベント数（ツール呼び出しなどのイベントを含む）
+_LAST_RESPONSE_LOOKBACK_EVENTS = 10
+
 
 class SessionManager:
     """セッション管理クラス
 
     ユーザーセッションの作成と管理を担当します。
+    存在を確認済みのセッションを覚えておき、2回目以降はセッションサービスへの確認を省略します。
     """
 
-    def __init__(self, session_service: InMemorySessionService):
+    def __init__(
+        self,
+        session_service: BaseSessionService,
+        exists_cache_size: int = SESSION_EXISTS_CACHE_SIZE,
+    ):
         """初期化
 
         Args:
             session_service: セッションサービスのインスタンス
+            exists_cache_size: 存在を確認済みのセッションを覚えておく件数
         """
         self.session_service = session_service
+        self.exists_cache_size = exists_cache_size
+        self._known_sessions: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        # メモリから破棄されたセッションは、存在の記録からも消す
+        if isinstance(session_service, BoundedInMemorySessionService):
+            session_service.add_eviction_listener(self.forget)
+
+        # 統計情報
+        self._known_hits = 0
+        self._created = 0
+        self._existing = 0
+        self._lookup_time = LatencyRecorder()
 
     async def get_or_create_session(
         self, user_id: str, session_id: Optional[str] = None
@@ -34,6 +64,8 @@ class SessionManager:
         """セッションを取得または作成
 
         既存のセッションがある場合はそれを返し、なければ新規作成します。
+        取得してから作成する代わりに作成を試み、既に存在する場合はそのセッションを使うため、
+        セッションサービスへの問い合わせは1回で済みます（イベントの読み込みも行いません）。
 
         Args:
             user_id: ユーザーID
@@ -46,24 +78,123 @@ class SessionManager:
         if session_id is None:
             session_id = f"session_{user_id}"
 
-        # 既存セッションを取得
-        session = await self._get_session(user_id, session_id)
+        key = (user_id, session_id)
+        if key in self._known_sessions:
+            self._known_sessions.move_to_end(key)
+            self._known_hits += 1
+            return session_id
 
-        # セッションがなfい場合は新規作成
-        if not session:
+        started_at = time.monotonic()
+        try:
             session = await self._create_session(user_id, session_id)
-            logger.info(f"Created new session: {session.id}")
-        else:
-            logger.info(f"Using existing session: {session.id}")
+            session_id = session.id
+            self._created += 1
+            logger.info(f"Created new session: {session_id}")
+        except AlreadyExistsError:
+            self._existing += 1
+            logger.info(f"Using existing session: {session_id}")
+        finally:
+            self._lookup_time.record(time.monotonic() - started_at)
+
+        self._remember(key)
+        return session_id
+
+    def _remember(self, key: Tuple[str, str]) -> None:
+        """存在を確認したセッションを覚えておく（上限を超えた分は古いものから忘れる）"""
+        self._known_sessions[key] = None
+        self._known_sessions.move_to_end(key)
+        while len(self._known_sessions) > self.exists_cache_size:
+            self._known_sessions.popitem(last=False)
+
+    def forget(self, user_id: str, session_id: str) -> None:
+        """セッションの存在の記録を消す（セッションが破棄された場合に呼び出す）
+
+        Args:
+            user_id: ユーザーID
+            session_id: セッションID
+        """
+        self._known_sessions.pop((user_id, session_id), None)
+
+    async def append_turn(
+        self,
+        user_id: str,
+        session_id: str,
+        message: str,
+        response: str,
+        author: str,
+    ) -> None:
+        """エージェントを実行せずに得た応答を1往復の会話として履歴に追加
+
+        キャッシュから応答した場合でも、後続の会話で文脈を参照できるようにします。
+
+        Args:
+            user_id: ユーザーID
+            session_id: セッションID
+            message: ユーザーのメッセージ
+            response: 応答テキスト
+            author: 応答したエージェント名
+        """
+        # 追加するだけなので、これまでのイベントは読み込まない
+        session = await self._get_session(
+            user_id, session_id, GetSessionConfig(num_recent_events=0)
+        )
+        if session is None:
+            return
+
+        invocation_id = f"e-{uuid.uuid4()}"
+        await self.session_service.append_event(
+            session,
+            Event(
+                invocation_id=invocation_id,
+                author="user",
+                content=types.Content(role="user", parts=[types.Part(text=message)]),
+            ),
+        )
+        await self.session_service.append_event(
+            session,
+            Event(
+                invocation_id=invocation_id,
+                author=author,
+                content=types.Content(role="model", parts=[types.Part(text=response)]),
+            ),
+        )
+
+    async def get_last_response(self, user_id: str, session_id: str) -> Optional[str]:
+        """セッションの直近のエージェントの応答テキストを取得
 
-        return session.id
+        Args:
+            user_id: ユーザーID
+            session_id: セッションID
 
-    async def _get_session(self, user_id: str, session_id: str) -> Optional[Session]:
+        Returns:
+            応答テキスト（セッションや応答がない場合はNone）
+        """
+        session = await self._get_session(
+            user_id, session_id, GetSessionConfig(num_recent_events=_LAST_RESPONSE_LOOKBACK_EVENTS)
+        )
+        if session is None:
+            return None
+        for event in reversed(session.events):
+            if event.author == "user":
+                return None
+            if event.content and event.content.parts:
+                text = "".join(part.text for part in event.content.parts if part.text)
+                if text:
+                    return text
+        return None
+
+    async def _get_session(
+        self,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
         """既存のセッションを取得
 
         Args:
             user_id: ユーザーID
             session_id: セッションID
+            config: 読み込むイベントの範囲（省略時はすべて）
 
         Returns:
             セッションオブジェクト（存在しない場合はNone）
@@ -73,6 +204,7 @@ class SessionManager:
             app_name=APP_NAME,
             user_id=user_id,
             session_id=session_id,
+            config=config,
         )
 
     async def _create_session(self, user_id: str, session_id: str) -> Session:
@@ -91,4 +223,19 @@ class SessionManager:
             app_name=APP_NAME,
             user_id=user_id,
             session_id=session_id,
-        )
\ No newline at end of file
+        )
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            セッションの作成・確認の件数と時間、保存先の接続プールの状態を含む辞書
+        """
+        return {
+            "known_sessions": len(self._known_sessions),
+            "known_hits": self._known_hits,
+            "created": self._created,
+            "existing": self._existing,
+            "lookup_seconds": self._lookup_time.snapshot(),
+            **backend_stats(self.session_service),
+        }
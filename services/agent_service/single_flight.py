@@ -0,0 +1,98 @@
+"""同一リクエストの共有実行（シングルフライト）モジュール
+
+このモジュールは、同じキーの処理が実行中であれば新たに実行せず、
+実行中の処理の結果を待って共有する機能を提供します。
+多くのユーザーが同時に同じ質問を送った場合に、エージェントの実行を1回にまとめます。
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Generic, Tuple, TypeVar
+
+from utils.logging import setup_cloud_logging
+
+logger = setup_cloud_logging("single_flight")
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Call(Generic[T]):
+    """実行中の処理"""
+
+    task: "asyncio.Task[T]"
+    waiters: int = 0
+
+
+class SingleFlight:
+    """同じキーの同時実行を1回にまとめるクラス
+
+    最初の呼び出し元の処理を独立したタスクとして実行し、同じキーの呼び出し元は
+    そのタスクの完了を待ちます。一部の呼び出し元がキャンセルされても他の呼び出し元には
+    影響せず、待っている呼び出し元がいなくなった場合のみ処理をキャンセルします。
+    タスクは最初の呼び出し元のコンテキスト（処理期限など）を引き継ぎます。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+
+        # 統計情報
+        self._runs = 0
+        self._collapsed = 0
+        self._max_waiters = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """同じキーの処理が実行中でなければ実行し、実行中であればその結果を待つ
+
+        Args:
+            key: 処理を識別するキー
+            fn: 処理を実行するコルーチン関数
+
+        Returns:
+            処理の結果と、他の呼び出し元が開始した処理の結果を共有したかどうかの組
+
+        Raises:
+            Exception: 処理が送出した例外（待っているすべての呼び出し元に送出）
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _Call(task=asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self._runs += 1
+        else:
+            self._collapsed += 1
+            logger.info(f"Joined in-flight request: key={key[:50]} waiters={call.waiters + 1}")
+
+        call.waiters += 1
+        self._max_waiters = max(self._max_waiters, call.waiters)
+        try:
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            # 最後の呼び出し元がキャンセルされた場合のみ処理を止める
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _Call) -> None:
+        """完了した処理を実行中の一覧から削除"""
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            実行回数・共有された回数・実行中の件数を含む辞書
+        """
+        requests = self._runs + self._collapsed
+        return {
+            "in_flight": len(self._calls),
+            "runs": self._runs,
+            "collapsed": self._collapsed,
+            "collapse_rate": self._collapsed / requests if requests else 0.0,
+            "max_waiters": self._max_waiters,
+        }
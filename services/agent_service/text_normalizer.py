@@ -0,0 +1,131 @@
+"""質問文の正規化モジュール
+
+このモジュールは、言い回しだけが異なる同じ質問を同じ文字列にそろえるための
+正規化と、セッションの文脈に依存する質問の判定を提供します。
+応答キャッシュや同一リクエストの共有でのキーの作成と、意図ルーターの照合に使用します。
+"""
+
+import re
+import unicodedata
+from typing import FrozenSet, Iterable, List
+
+from services.agent_service.constants import (
+    QUERY_STOP_SUFFIXES,
+    SESSION_DEPENDENT_KEYWORDS,
+)
+
+# カタカナ（ァ〜ヶ）とひらがなのコードポイントの差
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+# 内容語とみなす漢字1文字・カタカナの連続（「簡単な夕飯」「簡単夕飯」を区別しないよう漢字は1文字ずつ）
+_CONTENT_WORD_PATTERN = re.compile(r"[\u4e00-\u9fff々〆ヵヶ]|[ァ-ヺー]+")
+
+
+def _strip_symbols(text: str) -> str:
+    """空白・句読点・記号を取り除く（長音記号は語の一部として残す）
+
+    Args:
+        text: 対象の文字列
+
+    Returns:
+        空白・句読点・記号を除いた文字列
+    """
+    return "".join(
+        char
+        for char in text
+        if char == "ー" or unicodedata.category(char)[0] not in ("Z", "P", "S", "C")
+    )
+
+
+def fold_text(text: str) -> str:
+    """全角・半角と大文字・小文字をそろえ、記号を取り除く
+
+    Args:
+        text: 対象の文字列
+
+    Returns:
+        そろえた文字列
+    """
+    return _strip_symbols(unicodedata.normalize("NFKC", text).lower())
+
+
+def _prepare_phrases(phrases: Iterable[str]) -> List[str]:
+    """照合用に定型表現を正規化し（ひらがな表記も追加）、長いものから順に並べる"""
+    folded = {fold_text(phrase) for phrase in phrases}
+    folded |= {phrase.translate(_KATAKANA_TO_HIRAGANA) for phrase in folded}
+    return sorted((phrase for phrase in folded if phrase), key=len, reverse=True)
+
+
+_STOP_SUFFIXES = _prepare_phrases(QUERY_STOP_SUFFIXES)
+_SESSION_KEYWORDS = _prepare_phrases(SESSION_DEPENDENT_KEYWORDS)
+
+
+def normalize_query(text: str) -> str:
+    """質問文を正規化
+
+    1. NFKCで全角・半角をそろえ、小文字にする
+    2. 空白・句読点・記号を取り除く
+    3. 末尾の定型表現（「教えて」「のレシピ」など）を繰り返し取り除く
+    4. カタカナをひらがなにそろえる
+
+    例: 「カレーのレシピ教えて！」「カレーの作り方は？」→「かれー」
+
+    Args:
+        text: 質問文
+
+    Returns:
+        正規化した文字列（定型表現しかない場合は空文字）
+    """
+    folded = _strip_stop_suffixes(fold_text(text))
+    if folded in _STOP_SUFFIXES:
+        return ""
+    return folded.translate(_KATAKANA_TO_HIRAGANA)
+
+
+def content_words(text: str) -> FrozenSet[str]:
+    """質問文の内容語（末尾の定型表現を除いた部分の漢字・カタカナ）を取得
+
+    かなの統一前に取り出すため、カタカナの食材名なども1語として扱います。
+
+    例: 「豚肉とキャベツを使った簡単な夕飯のレシピ」→ {"豚", "肉", "キャベツ", "使", "簡", "単", "夕", "飯"}
+
+    Args:
+        text: 質問文
+
+    Returns:
+        内容語の集合
+    """
+    return frozenset(_CONTENT_WORD_PATTERN.findall(_strip_stop_suffixes(fold_text(text))))
+
+
+def _strip_stop_suffixes(folded: str) -> str:
+    """末尾の定型表現を繰り返し取り除く
+
+    Args:
+        folded: fold_text でそろえた文字列
+
+    Returns:
+        定型表現を除いた文字列
+    """
+    stripped = True
+    while folded and stripped:
+        stripped = False
+        for suffix in _STOP_SUFFIXES:
+            if folded.endswith(suffix) and len(folded) > len(suffix):
+                folded = folded[: -len(suffix)]
+                stripped = True
+                break
+    return folded
+
+
+def is_session_dependent(text: str) -> bool:
+    """セッションの文脈（これまでの会話や登録済みの情報）に依存する質問かどうか
+
+    Args:
+        text: 質問文
+
+    Returns:
+        文脈に依存する表現を含む場合はTrue
+    """
+    folded = fold_text(text).translate(_KATAKANA_TO_HIRAGANA)
+    return any(keyword in folded for keyword in _SESSION_KEYWORDS)
@@ -1,16 +1,38 @@
 """シンプルなエージェントサービスモジュール"""
-import sqlalchemy
+import asyncio
 import os
-from typing import Optional
-from sqlalchemy.orm import Session
+import hashlib
+from typing import Awaitable, Dict, List, Optional, Sequence, Tuple, Union
 from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService, DatabaseSessionService
 from dotenv import load_dotenv
+from services.agent_service.session_backend import create_session_service
+from services.agent_service.session_compactor import SessionCompactor
 from services.agent_service.session_manager import SessionManager
 from services.agent_service.message_handler import MessageHandler
-from services.agent_service.executor import AgentExecutor
-from services.agent_service.constants import APP_NAME
+from services.agent_service.executor import AgentExecutor, UpdateCallback
+from services.agent_service.admission import AdmissionController
+from services.agent_service.image_cache import ImageResultCache
+from services.agent_service.intent_router import (
+    ACTION_AGENT,
+    ACTION_TEMPLATE,
+    IntentRouter,
+    ends_with_question,
+)
+from services.agent_service.response_cache import ResponseCache
+from services.agent_service.single_flight import SingleFlight
+from services.agent_service.constants import (
+    AGENT_STREAMING_ENABLED,
+    APP_NAME,
+    ERROR_INDICATORS,
+    IMAGE_DIRECT_DISPATCH_ENABLED,
+    INTENT_ROUTER_ENABLED,
+    RESPONSE_CACHE_ENABLED,
+    SESSION_COMPACTION_ENABLED,
+    SINGLE_FLIGHT_ENABLED,
+)
+from agents.agent_manager import ModelFactory
+from agents.config import AGENT_CONFIG
 from agents.root_agent import create_agent
 from utils.logging import setup_cloud_logging
 
@@ -33,47 +55,40 @@ class AgentService:
 
     def __init__(self):
         if not self._initialized:
-            # Cloud SQL接続を行う場合の設定
-            # 環境変数からDB接続情報を取得
-            
-            # db_user = os.environ.get("DB_USER", "postgres")
-            # db_pass = os.environ.get("DB_PASS")
-            # db_name = os.environ.get("DB_NAME", "recipe_db")
-            # instance_connection_name = os.environ.get("DB_INSTANCE_CONNECTION_NAME")
-            
-            # if not all([db_pass, instance_connection_name]):
-            #     logger.warning("一部のDB接続情報が環境変数に設定されていません")
-            # db_url = sqlalchemy.engine.URL.create(
-            #     drivername="postgresql+psycopg2",
-            #     username=db_user,
-            #     password=db_pass,
-            #     database=db_name,
-            #     query={
-            #         "host": f"/cloudsql/{instance_connection_name}"
-            #     }
-            # )
-            
-            self.session_service = InMemorySessionService()
+            # セッションの保存先（SESSION_BACKENDに応じてメモリまたはデータベース）
+            self.session_service = create_session_service()
             logger.info(f"session_service: {self.session_service}")
 
             self.artifacts_service = InMemoryArtifactService()
             # コンポーネントの初期化
             self.session_manager = SessionManager(self.session_service)
+            self.session_compactor = SessionCompactor(self.session_service)
             self.message_handler = MessageHandler()
+            self.admission = AdmissionController()
+            self.image_cache = ImageResultCache()
+            self.response_cache = ResponseCache()
+            self.single_flight = SingleFlight()
+            self.intent_router = IntentRouter.from_prompt_config(INTENT_ROUTER_ENABLED)
+            # 画像付きメッセージを直接処理するエージェント（Noneの場合はルートエージェントが委譲先を判断）
+            self.image_agent_name = (
+                AGENT_CONFIG["image_analysis_manager"]["name"] if IMAGE_DIRECT_DISPATCH_ENABLED else None
+            )
 
             # エージェント関連
             self.root_agent = None
             self.exit_stack = None
             self.runner = None
             self.executor = None
+            # サブエージェントを直接実行するランナー（エージェント名ごと）
+            self.sub_runners: Dict[str, Runner] = {}
 
             # 初期化完了
             self._initialized = True
 
-    async def init_agent(self) -> None:
+    async def init_agent(self, model_factory: Optional[ModelFactory] = None) -> None:
         if self.root_agent is None:
             try:
-                self.root_agent, self.exit_stack = await create_agent()
+                self.root_agent, self.exit_stack = await create_agent(model_factory)
                 self.runner = Runner(
                     app_name=APP_NAME,
                     agent=self.root_agent,
@@ -87,34 +102,215 @@ class AgentService:
                 logger.error(f"エージェントの初期化に失敗しました: {e}")
                 raise
 
+    def _runner_for(self, agent_name: Optional[str]) -> Optional[Runner]:
+        """サブエージェントを直接実行するランナーを取得
+
+        ルートエージェントのランナーとセッションサービスを共有するため、
+        直接実行した会話もルートエージェントから参照できます。
+
+        Args:
+            agent_name: エージェント名（Noneの場合はルートエージェント）
+
+        Returns:
+            ランナー（ルートエージェントの場合や、エージェントが見つからない場合はNone）
+        """
+        if agent_name is None or agent_name == self.root_agent.name:
+            return None
+        runner = self.sub_runners.get(agent_name)
+        if runner is None:
+            agent = self.root_agent.find_agent(agent_name)
+            if agent is None:
+                logger.warning(f"エージェントが見つからないため、ルートエージェントで実行します: {agent_name}")
+                return None
+            runner = Runner(
+                app_name=APP_NAME,
+                agent=agent,
+                artifact_service=self.artifacts_service,
+                session_service=self.session_service,
+            )
+            self.sub_runners[agent_name] = runner
+        return runner
+
     async def call_agent_text(
-        self, message: str, user_id: str, session_id: Optional[str] = None
+        self,
+        message: str,
+        user_id: str,
+        session_id: Optional[str] = None,
+        on_update: Optional[UpdateCallback] = None,
     ) -> str:
+        """テキストメッセージを送信して応答を取得
+
+        on_updateを指定し、ストリーミングが有効な場合は、サブエージェントの応答を
+        揃った順にon_updateへ渡し、まだ渡していない応答のみを返します。
+        まず意図ルーターで振り分け、挨拶などは定型文で応答し、明確なレシピ検索は
+        ルートエージェントを介さずにサブエージェントを直接実行します。
+        言い回しだけが異なる同じ質問の応答がキャッシュにあれば、エージェントを実行せずに
+        その応答を返します。同じ質問を他のユーザーが実行中であれば、その結果を共有します
+        （いずれもセッションの文脈に依存する質問は対象外）。
+        """
         logger.info(f"テキストメッセージの処理を開始: user_id={user_id}, message={message[:100]}...")
-        return await self._call_agent_internal(
-            message=message,
-            user_id=user_id,
-            session_id=session_id,
-            image_data=None,
-            image_mime_type=None,
-        )
+
+        async def question_pending() -> bool:
+            await self.init_agent()
+            pending_session_id = await self.session_manager.get_or_create_session(user_id, session_id)
+            return ends_with_question(
+                await self.session_manager.get_last_response(user_id, pending_session_id)
+            )
+
+        decision = await self.intent_router.route(message, question_pending)
+        if decision.action == ACTION_TEMPLATE:
+            await self._record_reused_turn(message, decision.response, user_id, session_id)
+            return decision.response
+        agent_name = decision.agent if decision.action == ACTION_AGENT else None
+
+        query = self.response_cache.prepare(message)
+        if query is not None and RESPONSE_CACHE_ENABLED:
+            cached_response = self.response_cache.get(query)
+            if cached_response is not None:
+                logger.info(f"応答キャッシュを使用: user_id={user_id}")
+                await self._record_reused_turn(message, cached_response, user_id, session_id)
+                return cached_response
+
+        async def run_agent() -> Tuple[List[str], str]:
+            # ストリーミングで先に送った応答も含めて共有・キャッシュするために記録
+            sent_updates: List[str] = []
+            forward = on_update if AGENT_STREAMING_ENABLED else None
+            if forward is not None:
+                async def record_and_forward(author: str, text: str) -> None:
+                    sent_updates.append(text)
+                    await on_update(author, text)
+
+                forward = record_and_forward
+
+            response = await self._call_agent_internal(
+                message=message,
+                user_id=user_id,
+                session_id=session_id,
+                image_data=None,
+                image_mime_type=None,
+                on_update=forward,
+                agent_name=agent_name,
+            )
+            return sent_updates, response
+
+        if query is None:
+            _, response = await run_agent()
+            return response
+
+        if SINGLE_FLIGHT_ENABLED:
+            (sent_updates, response), shared = await self.single_flight.do(
+                f"text:{query.normalized}", run_agent
+            )
+        else:
+            (sent_updates, response), shared = await run_agent(), False
+        full_response = "\n\n".join(text for text in (*sent_updates, response) if text)
+
+        if shared:
+            # 他のユーザーの実行結果を共有した場合は、応答の全文を返す
+            logger.info(f"実行中の同じ質問の結果を共有: user_id={user_id}")
+            await self._record_reused_turn(message, full_response, user_id, session_id)
+            return full_response
+
+        # エラー応答・途中結果はキャッシュしない
+        if RESPONSE_CACHE_ENABLED and full_response and not any(
+            indicator in full_response for indicator in ERROR_INDICATORS
+        ):
+            self.response_cache.put(query, full_response)
+        return response
 
     async def call_agent_with_image(
         self,
         message: str,
-        image_data: bytes,
+        image_data: Union[bytes, memoryview],
         image_mime_type: str,
         user_id: str,
         session_id: Optional[str] = None,
     ) -> str:
-        """画像付きメッセージを送信して応答を取得"""
+        """画像付きメッセージを送信して応答を取得
+
+        同じ画像（または見た目がほぼ同じ画像）の解析結果がキャッシュにあれば、
+        エージェントを実行せずにその結果を返します。
+        同じ画像と指示文の解析を他のユーザーが実行中であれば、その結果を共有します。
+        画像解析エージェントはルートエージェントを介さずに直接実行します。
+        """
         logger.info(f"画像付きメッセージの処理を開始: user_id={user_id}, message={message[:100]}...")
+        fingerprint = await asyncio.to_thread(self.image_cache.fingerprint, image_data)
+        cached_response = self.image_cache.get(fingerprint, message)
+        if cached_response is not None:
+            logger.info(f"画像解析結果のキャッシュを使用: user_id={user_id}")
+            await self._record_reused_turn(message, cached_response, user_id, session_id)
+            return cached_response
+
+        def run_agent() -> Awaitable[str]:
+            return self._call_agent_internal(
+                message=message,
+                user_id=user_id,
+                session_id=session_id,
+                image_data=image_data,
+                image_mime_type=image_mime_type,
+                agent_name=self.image_agent_name,
+            )
+
+        if SINGLE_FLIGHT_ENABLED:
+            message_hash = hashlib.sha256(message.encode("utf-8")).hexdigest()[:16]
+            response, shared = await self.single_flight.do(
+                f"image:{fingerprint.sha256}:{message_hash}", run_agent
+            )
+        else:
+            response, shared = await run_agent(), False
+
+        if shared:
+            logger.info(f"実行中の同じ画像の解析結果を共有: user_id={user_id}")
+            await self._record_reused_turn(message, response, user_id, session_id)
+            return response
+
+        # エラー応答はキャッシュしない
+        if not any(indicator in response for indicator in ERROR_INDICATORS):
+            self.image_cache.put(fingerprint, message, response)
+        return response
+
+    async def _record_reused_turn(
+        self,
+        message: str,
+        response: str,
+        user_id: str,
+        session_id: Optional[str] = None,
+    ) -> None:
+        """エージェントを実行せずに返す応答を、ユーザーのセッションに会話として記録
+
+        キャッシュや他のユーザーの実行結果を返した場合でも、後続の会話で文脈を参照できるようにします。
+        """
+        await self.init_agent()
+        session_id = await self.session_manager.get_or_create_session(user_id, session_id)
+        await self.session_manager.append_turn(
+            user_id, session_id, message, response, self.root_agent.name
+        )
+
+    async def call_agent_with_images(
+        self,
+        message: str,
+        images: Sequence[Tuple[Union[bytes, memoryview], str]],
+        user_id: str,
+        session_id: Optional[str] = None,
+    ) -> str:
+        """複数の画像をまとめて1回のメッセージで送信して応答を取得
+
+        画像が1枚の場合は、キャッシュを利用するcall_agent_with_imageに委譲します。
+        画像解析エージェントはルートエージェントを介さずに直接実行します。
+        """
+        if len(images) == 1:
+            image_data, image_mime_type = images[0]
+            return await self.call_agent_with_image(
+                message, image_data, image_mime_type, user_id, session_id
+            )
+
+        logger.info(f"複数画像付きメッセージの処理を開始: user_id={user_id}, images={len(images)}")
         return await self._call_agent_internal(
             message=message,
             user_id=user_id,
             session_id=session_id,
-            image_data=image_data,
-            image_mime_type=image_mime_type,
+            images=images,
+            agent_name=self.image_agent_name,
         )
 
     async def _call_agent_internal(
@@ -122,24 +318,38 @@ class AgentService:
         message: str,
         user_id: str,
         session_id: Optional[str] = None,
-        image_data: Optional[bytes] = None,
+        image_data: Optional[Union[bytes, memoryview]] = None,
         image_mime_type: Optional[str] = None,
+        images: Optional[Sequence[Tuple[Union[bytes, memoryview], str]]] = None,
+        on_update: Optional[UpdateCallback] = None,
+        agent_name: Optional[str] = None,
     ) -> str:
         await self.init_agent()
-        # セッションを管理
-        session_id = await self.session_manager.get_or_create_session(
-            user_id, session_id
-        )
-        # メッセージをContent型に変換
-        content = self.message_handler.create_message_content(
-            message, image_data, image_mime_type
-        )
+        # 同時実行数を制限（混雑時はAgentBusyErrorを送出）
+        async with self.admission.admit():
+            # セッションを管理
+            session_id = await self.session_manager.get_or_create_session(
+                user_id, session_id
+            )
+            # 履歴が長くなっていれば、古い会話を要約に置き換えてから実行
+            if SESSION_COMPACTION_ENABLED:
+                await self.session_compactor.maybe_compact(user_id, session_id)
+            # メッセージをContent型に変換
+            content = self.message_handler.create_message_content(
+                message, image_data, image_mime_type, images=images
+            )
 
-        # エージェントを実行して応答を取得
-        logger.info(f"エージェントを実行して応答を取得: message={message[:100]}...")
-        return await self.executor.execute_and_get_response(
-            message, user_id, session_id, content, image_data
-        )
+            # エージェントを実行して応答を取得
+            logger.info(f"エージェントを実行して応答を取得: message={message[:100]}...")
+            return await self.executor.execute_and_get_response(
+                message, user_id, session_id, content, image_data or images,
+                on_update=on_update,
+                runner=self._runner_for(agent_name),
+            )
+
+    def executor_stats(self) -> dict:
+        """エージェント実行の統計情報を取得（未初期化の場合は空）"""
+        return self.executor.stats() if self.executor else {}
 
     async def cleanup_resources(self) -> None:
         if self.exit_stack:
@@ -147,6 +357,13 @@ class AgentService:
                 await self.exit_stack.aclose()
             except Exception as e:
                 logger.error(f"リソースのクリーンアップ中にエラーが発生: {e}")
+        # データベースの接続プールを閉じる
+        close = getattr(self.session_service, "close", None)
+        if close is not None:
+            try:
+                await close()
+            except Exception as e:
+                logger.error(f"セッションサービスのクローズ中にエラーが発生: {e}")
 
 # シングルトンインスタンスをエクスポート
 _agent_service = AgentService()
@@ -157,13 +374,16 @@ async def init_agent():
     return _agent_service.root_agent
 
 async def call_agent_async(
-    message: str, user_id: str, session_id: Optional[str] = None
+    message: str,
+    user_id: str,
+    session_id: Optional[str] = None,
+    on_update: Optional[UpdateCallback] = None,
 ) -> str:
-    return await _agent_service.call_agent_text(message, user_id, session_id)
+    return await _agent_service.call_agent_text(message, user_id, session_id, on_update)
 
 async def call_agent_with_image_async(
     message: str,
-    image_data: bytes,
+    image_data: Union[bytes, memoryview],
     image_mime_type: str,
     user_id: str,
     session_id: Optional[str] = None,
@@ -173,5 +393,16 @@ async def call_agent_with_image_async(
         message, image_data, image_mime_type, user_id, session_id
     )
 
+async def call_agent_with_images_async(
+    message: str,
+    images: List[Tuple[Union[bytes, memoryview], str]],
+    user_id: str,
+    session_id: Optional[str] = None,
+) -> str:
+    """複数の画像をまとめてエージェントに送信し、応答を返す"""
+    return await _agent_service.call_agent_with_images(
+        message, images, user_id, session_id
+    )
+
 async def cleanup_resources():
     await _agent_service.cleanup_resources()
\ No newline at end of file
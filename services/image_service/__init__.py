@@ -0,0 +1,7 @@
+"""
+画像サービスモジュールのパッケージ定義
+"""
+
+from .preprocessor import ImagePreprocessor, PreprocessedImage, sniff_mime_type
+
+__all__ = ['ImagePreprocessor', 'PreprocessedImage', 'sniff_mime_type']
@@ -0,0 +1,30 @@
+"""画像サービスのための定数と設定
+
+このモジュールは、画像の前処理で使用される定数と設定値を定義します。
+"""
+
+import os
+
+# 前処理設定（レシート・食材の認識に十分な解像度と画質）
+IMAGE_MAX_EDGE_PIXELS = int(os.environ.get("IMAGE_MAX_EDGE_PIXELS", "1536"))
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_PREPROCESS_WORKERS = int(os.environ.get("IMAGE_PREPROCESS_WORKERS", "2"))
+
+# 前処理後の画像形式
+OUTPUT_MIME_TYPE = "image/jpeg"
+
+# 判定できなかった場合のMIMEタイプ
+DEFAULT_MIME_TYPE = "image/jpeg"
+
+# マジックバイトとMIMEタイプの対応（先頭からのオフセット、バイト列、MIMEタイプ）
+MAGIC_SIGNATURES = (
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (8, b"WEBP", "image/webp"),
+    (4, b"ftypheic", "image/heic"),
+    (4, b"ftypheix", "image/heic"),
+    (4, b"ftypmif1", "image/heif"),
+    (4, b"ftypmsf1", "image/heif"),
+)
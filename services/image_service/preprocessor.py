@@ -0,0 +1,238 @@
+"""画像前処理モジュール
+
+このモジュールは、エージェントに送る前の画像を前処理する機能を提供します。
+マジックバイトから実際の形式を判定し、認識に十分な解像度まで縮小してJPEGで再圧縮します。
+CPU負荷の高い縮小・再圧縮はプロセスプールで実行し、イベントループをブロックしません。
+一時ファイルに退避した画像は、メモリに読み込まずにパスを渡してワーカーで読み込みます。
+"""
+
+import asyncio
+import io
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+
+from PIL import Image, ImageOps
+
+from services.image_service.constants import (
+    DEFAULT_MIME_TYPE,
+    IMAGE_JPEG_QUALITY,
+    IMAGE_MAX_EDGE_PIXELS,
+    IMAGE_PREPROCESS_WORKERS,
+    MAGIC_SIGNATURES,
+    OUTPUT_MIME_TYPE,
+)
+from utils.logging import setup_cloud_logging
+from utils.metrics import LatencyRecorder
+from utils.spooled_buffer import SpooledBuffer
+
+logger = setup_cloud_logging("image_preprocessor")
+
+# 前処理する画像（SpooledBufferの場合は一時ファイルのままワーカーに渡す）
+ImageSource = Union[bytes, memoryview, SpooledBuffer]
+
+
+@dataclass
+class PreprocessedImage:
+    """前処理済みの画像"""
+
+    data: bytes
+    mime_type: str
+    original_size: int
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+    @property
+    def size(self) -> int:
+        """前処理後のバイト数"""
+        return len(self.data)
+
+
+def sniff_mime_type(data: Union[bytes, memoryview]) -> Optional[str]:
+    """マジックバイトから画像のMIMEタイプを判定
+
+    Args:
+        data: 画像データ
+
+    Returns:
+        MIMEタイプ。判定できない場合はNone
+    """
+    header = bytes(data[:16])
+    for offset, signature, mime_type in MAGIC_SIGNATURES:
+        if header[offset:offset + len(signature)] == signature:
+            return mime_type
+    return None
+
+
+def _resize_and_compress(
+    source: Union[bytes, str], max_edge: int, quality: int
+) -> Tuple[bytes, int, int]:
+    """画像を縮小してJPEGで再圧縮（プロセスプールで実行）
+
+    Args:
+        source: 画像データ、または画像ファイルのパス
+        max_edge: 長辺の最大ピクセル数
+        quality: JPEGの画質（1〜95）
+
+    Returns:
+        再圧縮した画像データと幅・高さ
+    """
+    with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as image:
+        # JPEGはデコード前に縮小して読み込む（向きの補正はデコードを伴うため、その前に指定する）
+        # 縮小率は出力の両辺が指定サイズ以上になる範囲で選ばれるため、長辺をmax_edgeとした
+        # 縦横比どおりのサイズを指定する（正方形を指定すると短辺が足りず縮小されない）
+        width, height = image.size
+        if width >= height:
+            image.draft("RGB", (max_edge, max(1, max_edge * height // width)))
+        else:
+            image.draft("RGB", (max(1, max_edge * width // height), max_edge))
+        # スマートフォンの写真は向きがEXIFに記録されているため、画素に反映する
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+        return output.getvalue(), image.width, image.height
+
+
+class ImagePreprocessor:
+    """画像前処理クラス
+
+    形式の判定と縮小・再圧縮を行い、削減したバイト数と各段階の処理時間を記録します。
+    縮小・再圧縮に失敗した場合や、かえってサイズが大きくなる場合は元の画像を使います。
+    """
+
+    def __init__(
+        self,
+        max_edge: int = IMAGE_MAX_EDGE_PIXELS,
+        quality: int = IMAGE_JPEG_QUALITY,
+        max_workers: int = IMAGE_PREPROCESS_WORKERS,
+    ):
+        """初期化
+
+        Args:
+            max_edge: 長辺の最大ピクセル数
+            quality: JPEGの画質（1〜95）
+            max_workers: 縮小・再圧縮を実行するプロセス数
+        """
+        self.max_edge = max_edge
+        self.quality = quality
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        # 統計情報
+        self._processed = 0
+        self._fallbacks = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._sniff_time = LatencyRecorder()
+        self._resize_time = LatencyRecorder()
+        self._total_time = LatencyRecorder()
+
+    async def preprocess(self, image: ImageSource) -> PreprocessedImage:
+        """画像を前処理
+
+        Args:
+            image: 画像データ、そのビュー、またはダウンロードしたバッファ
+
+        Returns:
+            PreprocessedImage: 前処理済みの画像
+        """
+        started_at = time.monotonic()
+        if isinstance(image, SpooledBuffer):
+            original_size = image.size
+            with image.getbuffer() as view:
+                mime_type = sniff_mime_type(view)
+        else:
+            original_size = len(image)
+            mime_type = sniff_mime_type(image)
+        sniffed_at = time.monotonic()
+        self._sniff_time.record(sniffed_at - started_at)
+
+        result = None
+        try:
+            loop = asyncio.get_running_loop()
+            resized, width, height = await loop.run_in_executor(
+                self._get_executor(),
+                _resize_and_compress,
+                self._worker_source(image),
+                self.max_edge,
+                self.quality,
+            )
+            self._resize_time.record(time.monotonic() - sniffed_at)
+            if len(resized) < original_size:
+                result = PreprocessedImage(
+                    data=resized,
+                    mime_type=OUTPUT_MIME_TYPE,
+                    original_size=original_size,
+                    width=width,
+                    height=height,
+                )
+        except Exception as e:
+            self._fallbacks += 1
+            logger.warning(
+                f"Image preprocessing failed, using original ({mime_type}): {e}"
+            )
+
+        if result is None:
+            # 縮小・再圧縮できなかった場合のみ、元の画像をメモリに読み込む
+            result = PreprocessedImage(
+                data=image.getvalue() if isinstance(image, SpooledBuffer) else bytes(image),
+                mime_type=mime_type or DEFAULT_MIME_TYPE,
+                original_size=original_size,
+            )
+
+        elapsed = time.monotonic() - started_at
+        self._total_time.record(elapsed)
+        self._processed += 1
+        self._bytes_in += original_size
+        self._bytes_out += result.size
+        logger.info(
+            f"Image preprocessed: {mime_type} {original_size} -> "
+            f"{result.mime_type} {result.size} bytes in {elapsed:.3f}s"
+        )
+        return result
+
+    def close(self) -> None:
+        """プロセスプールを停止"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    @staticmethod
+    def _worker_source(image: ImageSource) -> Union[bytes, str]:
+        """ワーカーに渡す画像（一時ファイルはパス、それ以外はbytes。ビューはpickleできない）"""
+        if isinstance(image, SpooledBuffer):
+            return image.path or image.getvalue()
+        return bytes(image)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """プロセスプールを取得（初回のみ作成）"""
+        if self._executor is None:
+            # イベントループやログ送信のスレッドを抱えたままforkしないよう、spawnで起動
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            処理件数・削減バイト数・各段階の処理時間を含む辞書
+        """
+        return {
+            "processed": self._processed,
+            "fallbacks": self._fallbacks,
+            "bytes_in": self._bytes_in,
+            "bytes_out": self._bytes_out,
+            "bytes_saved": self._bytes_in - self._bytes_out,
+            "sniff_seconds": self._sniff_time.snapshot(),
+            "resize_seconds": self._resize_time.snapshot(),
+            "total_seconds": self._total_time.snapshot(),
+        }
@@ -0,0 +1,241 @@
+"""LINEメッセージングAPI非同期操作モジュール
+
+このモジュールは、LINE Messaging APIとの非同期通信を担当します。
+SDKの非同期API（aiohttpベース）を使用し、イベントループをブロックせずに
+メッセージの送信や画像データの取得を行います。
+"""
+
+from typing import List, Optional
+
+from linebot.v3.messaging import (
+    ApiException,
+    AsyncApiClient,
+    AsyncMessagingApi,
+    AsyncMessagingApiBlob,
+    Configuration,
+    PushMessageRequest,
+    ReplyMessageRequest,
+    TextMessage,
+)
+
+from services.line_service.constants import (
+    IMAGE_DOWNLOAD_CHUNK_BYTES,
+    IMAGE_MAX_BYTES,
+    IMAGE_SPOOL_THRESHOLD_BYTES,
+    LINE_API_DATA_ENDPOINT,
+    LINE_API_ENDPOINT,
+    LINE_API_POOL_MAXSIZE,
+    get_line_config,
+)
+from utils.logging import setup_cloud_logging
+from utils.prometheus_metrics import observe_line_api
+from utils.spooled_buffer import SpooledBuffer
+
+logger = setup_cloud_logging("async_line_client")
+
+
+class ContentTooLargeError(Exception):
+    """取得するコンテンツが上限サイズを超えている場合の例外"""
+
+
+class AsyncLineClient:
+    """LINE API非同期クライアントラッパークラス
+
+    LineClientと同じ操作を非同期で提供します。
+    aiohttpのセッションはイベントループ上で初回利用時に作成し、以降は使い回します。
+    """
+
+    def __init__(self, configuration: Optional[Configuration] = None):
+        """初期化
+
+        Args:
+            configuration: LINE API設定（未指定時は環境変数から作成）
+        """
+        if configuration is None:
+            channel_access_token, _ = get_line_config()
+            configuration = Configuration(access_token=channel_access_token)
+            configuration.connection_pool_maxsize = LINE_API_POOL_MAXSIZE
+        self.configuration = configuration
+
+        self._messaging_api_client: Optional[AsyncApiClient] = None
+        self._blob_api_client: Optional[AsyncApiClient] = None
+        self._messaging_api: Optional[AsyncMessagingApi] = None
+        self._blob_api: Optional[AsyncMessagingApiBlob] = None
+
+        logger.info("Async LINE client initialized")
+
+    @property
+    def messaging_api(self) -> AsyncMessagingApi:
+        """Messaging APIクライアント（初回アクセス時に作成）"""
+        if self._messaging_api is None:
+            self._messaging_api_client = AsyncApiClient(self.configuration)
+            self._messaging_api = AsyncMessagingApi(self._messaging_api_client)
+            self._messaging_api.line_base_path = LINE_API_ENDPOINT
+        return self._messaging_api
+
+    @property
+    def blob_api(self) -> AsyncMessagingApiBlob:
+        """Blob APIクライアント（初回アクセス時に作成）"""
+        if self._blob_api is None:
+            self._blob_api_client = AsyncApiClient(self.configuration)
+            self._blob_api = AsyncMessagingApiBlob(self._blob_api_client)
+        return self._blob_api
+
+    async def reply_text(self, reply_token: str, text: str) -> None:
+        """テキストメッセージで返信
+
+        Args:
+            reply_token: 返信用トークン
+            text: 送信するテキスト
+        """
+        await self.reply_messages(reply_token, [text])
+
+    async def reply_messages(self, reply_token: str, texts: List[str]) -> None:
+        """複数のテキストメッセージを1回のリクエストで返信
+
+        Args:
+            reply_token: 返信用トークン
+            texts: 送信するテキストのリスト（最大5件）
+        """
+        try:
+            with observe_line_api("reply"):
+                await self.messaging_api.reply_message(
+                    ReplyMessageRequest(
+                        reply_token=reply_token,
+                        messages=[TextMessage(text=text) for text in texts],
+                    )
+                )
+            logger.info(
+                f"Successfully sent reply with {len(texts)} messages: {texts[0][:50]}..."
+            )
+        except Exception as e:
+            logger.exception(f"Failed to reply with text: {e}")
+            raise
+
+    async def get_message_content(self, message_id: str) -> bytes:
+        """メッセージの画像コンテンツを取得
+
+        Args:
+            message_id: メッセージID
+
+        Returns:
+            bytes: 画像データ
+        """
+        try:
+            with observe_line_api("content"):
+                image_content = await self.blob_api.get_message_content(message_id)
+            logger.info(f"Successfully retrieved image content: {message_id}")
+            return image_content
+        except Exception as e:
+            logger.exception(f"Failed to retrieve image content: {e}")
+            raise
+
+    async def download_message_content(
+        self,
+        message_id: str,
+        max_bytes: int = IMAGE_MAX_BYTES,
+        spool_threshold: int = IMAGE_SPOOL_THRESHOLD_BYTES,
+    ) -> SpooledBuffer:
+        """メッセージのコンテンツをストリーミングで取得
+
+        全体を一度にメモリへ読み込まず、チャンクごとにバッファへ書き込みます。
+        閾値を超えた分は一時ファイルに退避されるため、メモリ使用量が抑えられます。
+        戻り値のバッファは呼び出し側で close() してください。
+
+        Args:
+            message_id: メッセージID
+            max_bytes: 取得を許可する最大バイト数
+            spool_threshold: メモリ上に保持する最大バイト数
+
+        Returns:
+            SpooledBuffer: コンテンツを保持するバッファ
+
+        Raises:
+            ContentTooLargeError: コンテンツが上限サイズを超えている場合
+            ApiException: LINE APIがエラーを返した場合
+        """
+        # Blob APIクライアントのaiohttpセッションを共有して接続を再利用
+        session = self.blob_api.api_client.rest_client.pool_manager
+        url = f"{LINE_API_DATA_ENDPOINT}/v2/bot/message/{message_id}/content"
+        headers = {"Authorization": f"Bearer {self.configuration.access_token}"}
+
+        with observe_line_api("content"):
+            async with session.get(url, headers=headers) as response:
+                if response.status != 200:
+                    raise ApiException(status=response.status, reason=response.reason)
+                if response.content_length and response.content_length > max_bytes:
+                    raise ContentTooLargeError(
+                        f"content size {response.content_length} exceeds limit {max_bytes}"
+                    )
+
+                buffer = SpooledBuffer(spool_threshold)
+                try:
+                    async for chunk in response.content.iter_chunked(IMAGE_DOWNLOAD_CHUNK_BYTES):
+                        if buffer.size + len(chunk) > max_bytes:
+                            raise ContentTooLargeError(
+                                f"content size exceeds limit {max_bytes}"
+                            )
+                        buffer.write(chunk)
+                except BaseException:
+                    buffer.close()
+                    raise
+
+        logger.info(
+            f"Successfully downloaded content: {message_id} "
+            f"({buffer.size} bytes, spooled={buffer.rolled_over})"
+        )
+        return buffer
+
+    async def push_text(self, user_id: str, text: str) -> None:
+        """ユーザーにテキストメッセージをプッシュ送信
+
+        Args:
+            user_id: 送信先のユーザーID
+            text: 送信するテキスト
+        """
+        await self.push_messages(user_id, [text])
+
+    async def push_messages(
+        self, user_id: str, texts: List[str], retry_key: Optional[str] = None
+    ) -> None:
+        """複数のテキストメッセージを1回のリクエストでプッシュ送信
+
+        Args:
+            user_id: 送信先のユーザーID
+            texts: 送信するテキストのリスト（最大5件）
+            retry_key: 再試行キー（X-Line-Retry-Key、同じキーの再送は配信されない）
+        """
+        try:
+            with observe_line_api("push"):
+                await self.messaging_api.push_message(
+                    PushMessageRequest(
+                        to=user_id,
+                        messages=[TextMessage(text=text) for text in texts],
+                    ),
+                    x_line_retry_key=retry_key,
+                )
+            logger.info(
+                f"Successfully pushed {len(texts)} messages to {user_id}: {texts[0][:50]}..."
+            )
+        except Exception as e:
+            logger.exception(f"Failed to push message: {e}")
+            raise
+
+    async def close(self) -> None:
+        """保持しているaiohttpセッションを閉じる"""
+        for api_client in (self._messaging_api_client, self._blob_api_client):
+            if api_client is None:
+                continue
+            try:
+                await api_client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close async LINE API client: {e}")
+        self._messaging_api_client = self._blob_api_client = None
+        self._messaging_api = self._blob_api = None
+        logger.info("Async LINE client closed")
+
+    async def __aenter__(self) -> "AsyncLineClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
@@ -4,6 +4,7 @@
 メッセージの送信や受信、画像データの取得などの機能を提供します。
 """
 
+import socket
 from typing import TYPE_CHECKING, List
 
 from linebot.v3 import WebhookParser
@@ -17,8 +18,15 @@ from linebot.v3.messaging import (
     TextMessage,
 )
 from linebot.v3.webhooks import MessageEvent
-
-from services.line_service.constants import get_line_config
+from urllib3.connection import HTTPConnection
+
+from services.line_service.constants import (
+    LINE_API_ENDPOINT,
+    LINE_API_KEEPALIVE_IDLE_SECONDS,
+    LINE_API_KEEPALIVE_INTERVAL_SECONDS,
+    LINE_API_POOL_MAXSIZE,
+    get_line_config,
+)
 from utils.logging import setup_cloud_logging
 
 if TYPE_CHECKING:
@@ -27,21 +35,56 @@ if TYPE_CHECKING:
 logger = setup_cloud_logging("line_client")
 
 
+def build_keepalive_socket_options() -> list:
+    """TCPキープアライブを有効にするソケットオプションを作成
+
+    Returns:
+        urllib3に渡すソケットオプションのリスト
+    """
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    # プラットフォームによっては未定義のため存在する場合のみ設定
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append(
+            (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, LINE_API_KEEPALIVE_IDLE_SECONDS)
+        )
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        options.append(
+            (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, LINE_API_KEEPALIVE_INTERVAL_SECONDS)
+        )
+    return options
+
+
 class LineClient:
     """LINE APIクライアントラッパークラス
 
     LINE Messaging APIへのアクセスを簡略化するためのラッパークラス。
     設定の読み込みやエラー処理を集約しています。
+    Messaging APIとBlob APIのクライアントは接続プールごと使い回します。
     """
 
-    def __init__(self):
-        """LINE APIクライアントの初期化"""
+    def __init__(self, pool_maxsize: int = LINE_API_POOL_MAXSIZE):
+        """LINE APIクライアントの初期化
+
+        Args:
+            pool_maxsize: ホストごとに保持する接続数の上限
+        """
         # LINE API設定を取得
         channel_access_token, channel_secret = get_line_config()
 
         # 設定を作成
         self.configuration = Configuration(access_token=channel_access_token)
+        self.configuration.connection_pool_maxsize = pool_maxsize
+        self.configuration.socket_options = build_keepalive_socket_options()
         self.parser = WebhookParser(channel_secret)
+        self._event_dispatcher = None
+
+        # 長寿命のAPIクライアント（urllib3の接続プールはスレッドセーフ）
+        self._messaging_api_client = ApiClient(self.configuration)
+        self._blob_api_client = ApiClient(self.configuration)
+        self.messaging_api = MessagingApi(self._messaging_api_client)
+        self.messaging_api.line_base_path = LINE_API_ENDPOINT
+        self.blob_api = MessagingApiBlob(self._blob_api_client)
 
         logger.info("LINE client initialized")
 
@@ -68,11 +111,23 @@ class LineClient:
     def create_api_client(self) -> ApiClient:
         """APIクライアントを作成
 
+        共有プールを使わない独立したクライアントが必要な場合に使用します。
+
         Returns:
             ApiClient: LINE Messaging API クライアント
         """
         return ApiClient(self.configuration)
 
+    def close(self) -> None:
+        """保持している接続プールを閉じる"""
+        for api_client in (self._messaging_api_client, self._blob_api_client):
+            try:
+                api_client.close()
+                api_client.rest_client.pool_manager.clear()
+            except Exception as e:
+                logger.warning(f"Failed to close LINE API client: {e}")
+        logger.info("LINE client closed")
+
     def reply_text(self, reply_token: str, text: str) -> None:
         """テキストメッセージで返信
 
@@ -81,14 +136,12 @@ class LineClient:
             text: 送信するテキスト
         """
         try:
-            with self.create_api_client() as api_client:
-                line_api = MessagingApi(api_client)
-                line_api.reply_message(
-                    ReplyMessageRequest(
-                        reply_token=reply_token,
-                        messages=[TextMessage(text=text)],
-                    )
+            self.messaging_api.reply_message(
+                ReplyMessageRequest(
+                    reply_token=reply_token,
+                    messages=[TextMessage(text=text)],
                 )
+            )
             logger.info(f"Successfully sent reply with text: {text[:50]}...")
         except Exception as e:
             logger.exception(f"Failed to reply with text: {e}")
@@ -102,13 +155,11 @@ class LineClient:
             bytes: 画像データ
         """
         try:
-            with self.create_api_client() as blob_api_client:
-                blob_api = MessagingApiBlob(blob_api_client)
-                image_content = blob_api.get_message_content(message_id)
-                logger.info(
-                    f"Successfully retrieved image content: {message_id}"
-                )
-                return image_content
+            image_content = self.blob_api.get_message_content(message_id)
+            logger.info(
+                f"Successfully retrieved image content: {message_id}"
+            )
+            return image_content
         except Exception as e:
             logger.exception(f"Failed to retrieve image content: {e}")
             raise
@@ -121,14 +172,12 @@ class LineClient:
             text: 送信するテキスト
         """
         try:
-            with self.create_api_client() as api_client:
-                line_api = MessagingApi(api_client)
-                line_api.push_message(
-                    PushMessageRequest(
-                        to=user_id,
-                        messages=[TextMessage(text=text)],
-                    )
+            self.messaging_api.push_message(
+                PushMessageRequest(
+                    to=user_id,
+                    messages=[TextMessage(text=text)],
                 )
+            )
             logger.info(f"Successfully pushed message to {user_id}: {text[:50]}...")
         except Exception as e:
             logger.exception(f"Failed to push message: {e}")
@@ -140,11 +189,21 @@ class LineClient:
         Args:
             events: 処理するイベントのリスト
         """
+        from services.line_service.async_client import AsyncLineClient
+        from services.line_service.dispatcher import EventDispatcher
         from services.line_service.handler import LineEventHandler
 
-        handler = LineEventHandler(self)
+        # 重複排除と順序保証の状態を呼び出し間で共有するため再利用
+        if self._event_dispatcher is None:
+            handler = LineEventHandler(AsyncLineClient(self.configuration))
+            self._event_dispatcher = EventDispatcher(handler.handle_event, handler.event_lanes)
+
+        message_events = []
         for event in events:
             if isinstance(event, MessageEvent):
-                await handler.handle_event(event)
+                message_events.append(event)
             else:
-                logger.info(f"Unsupported event type: {type(event)}")
\ No newline at end of file
+                logger.info(f"Unsupported event type: {type(event)}")
+
+        # ユーザー間は並行、同一ユーザー内は順番に処理
+        await self._event_dispatcher.dispatch(message_events)
\ No newline at end of file
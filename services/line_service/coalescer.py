@@ -0,0 +1,241 @@
+"""送信メッセージ集約モジュール
+
+このモジュールは、短時間に同じユーザーへ送られるメッセージをまとめて
+1回のreply/pushリクエストで送信する機能を提供します。
+LINEは1リクエストで最大5件のメッセージを送れるため、リクエスト数とプッシュ通数を削減できます。
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Coroutine, Dict, List, Optional, Set, Tuple
+
+from services.line_service.constants import (
+    LINE_MAX_MESSAGES_PER_REQUEST,
+    OUTBOUND_COALESCE_WINDOW_SECONDS,
+)
+from services.line_service.scheduler import OutboundScheduler, Priority
+from utils.logging import setup_cloud_logging
+
+logger = setup_cloud_logging("outbound_coalescer")
+
+
+@dataclass
+class _UserBuffer:
+    """ユーザーごとの送信待ちバッファ"""
+
+    messages: List[Tuple[str, asyncio.Future]] = field(default_factory=list)
+    reply_token: Optional[str] = None
+    priority: Priority = Priority.PROGRESS
+    timer: Optional[asyncio.Task] = None
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class OutboundCoalescer:
+    """送信メッセージ集約クラス
+
+    ユーザーごとにメッセージをバッファし、一定時間経過するか上限件数に達した時点で
+    まとめて送信します。返信トークンがあれば返信で、なければプッシュで送信し、
+    同じユーザー宛のメッセージは投入順に届けます。
+    実際の送信は送信スケジューラを経由し、レート制限と再試行の対象になります。
+    """
+
+    def __init__(
+        self,
+        scheduler: OutboundScheduler,
+        window_seconds: float = OUTBOUND_COALESCE_WINDOW_SECONDS,
+        max_messages: int = LINE_MAX_MESSAGES_PER_REQUEST,
+    ):
+        """初期化
+
+        Args:
+            scheduler: 送信スケジューラ
+            window_seconds: メッセージを集約する待ち時間（秒）
+            max_messages: 1リクエストで送る最大メッセージ数
+        """
+        self.scheduler = scheduler
+        self.window_seconds = window_seconds
+        self.max_messages = max_messages
+        self._buffers: Dict[str, _UserBuffer] = {}
+        # 送信・タイマーのタスク（完了前にガベージコレクトされないよう参照を保持）
+        self._tasks: Set[asyncio.Task] = set()
+
+        # 統計情報
+        self._messages_sent = 0
+        self._replies_sent = 0
+        self._pushes_sent = 0
+        self._failures = 0
+
+    def send(
+        self,
+        user_id: str,
+        text: str,
+        reply_token: Optional[str] = None,
+        flush: bool = False,
+        priority: Priority = Priority.PROGRESS,
+    ) -> asyncio.Future:
+        """メッセージを送信キューに追加
+
+        戻り値のFutureをawaitすると送信完了（または失敗）まで待機できます。
+        awaitしない場合でも送信失敗はログに記録されます。
+
+        Args:
+            user_id: 送信先のユーザーID
+            text: 送信するテキスト
+            reply_token: 返信用トークン（あれば返信で送信）
+            flush: Trueの場合は待ち時間を待たずに即座に送信
+            priority: プッシュで送信する場合の優先度
+
+        Returns:
+            送信完了を通知するFuture
+        """
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(self._log_failure)
+
+        buffer = self._buffers.setdefault(user_id, _UserBuffer())
+        buffer.messages.append((text, future))
+        if reply_token and buffer.reply_token is None:
+            buffer.reply_token = reply_token
+        buffer.priority = min(buffer.priority, priority)
+
+        if flush or len(buffer.messages) >= self.max_messages:
+            self._cancel_timer(buffer)
+            self._spawn(self.flush(user_id))
+        elif buffer.timer is None:
+            buffer.timer = self._spawn(self._flush_later(user_id))
+
+        return future
+
+    async def flush(self, user_id: str) -> None:
+        """ユーザーのバッファに溜まったメッセージを送信
+
+        Args:
+            user_id: 送信先のユーザーID
+        """
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            return
+
+        # 同じユーザーへの送信は1つずつ順番に行う
+        async with buffer.lock:
+            messages, reply_token, priority = (
+                buffer.messages, buffer.reply_token, buffer.priority
+            )
+            buffer.messages, buffer.reply_token, buffer.priority = [], None, Priority.PROGRESS
+            self._cancel_timer(buffer)
+
+            for start in range(0, len(messages), self.max_messages):
+                chunk = messages[start:start + self.max_messages]
+                await self._send_chunk(user_id, chunk, reply_token, priority)
+                # 返信トークンは1回しか使えないため、以降はプッシュで送信
+                reply_token = None
+
+            # 送信中に追加されたメッセージがなければバッファを破棄
+            if not buffer.messages and self._buffers.get(user_id) is buffer:
+                del self._buffers[user_id]
+
+    async def close(self) -> None:
+        """すべてのバッファを送信し、実行中の送信の完了まで待機"""
+        await asyncio.gather(
+            *(self.flush(user_id) for user_id in list(self._buffers)),
+            return_exceptions=True,
+        )
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def _spawn(self, coro: Coroutine) -> asyncio.Task:
+        """タスクを作成し、完了まで参照を保持
+
+        Args:
+            coro: 実行するコルーチン
+
+        Returns:
+            作成したタスク
+        """
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_later(self, user_id: str) -> None:
+        """待ち時間の経過後にバッファを送信
+
+        Args:
+            user_id: 送信先のユーザーID
+        """
+        await asyncio.sleep(self.window_seconds)
+        buffer = self._buffers.get(user_id)
+        if buffer is not None:
+            buffer.timer = None
+        await self.flush(user_id)
+
+    async def _send_chunk(
+        self,
+        user_id: str,
+        chunk: List[Tuple[str, asyncio.Future]],
+        reply_token: Optional[str],
+        priority: Priority,
+    ) -> None:
+        """メッセージの塊を1リクエストで送信
+
+        Args:
+            user_id: 送信先のユーザーID
+            chunk: 送信するメッセージとFutureの組のリスト
+            reply_token: 返信用トークン（Noneの場合はプッシュで送信）
+            priority: プッシュで送信する場合の優先度
+        """
+        texts = [text for text, _ in chunk]
+        try:
+            if reply_token:
+                await self.scheduler.reply_messages(reply_token, texts)
+                self._replies_sent += 1
+            else:
+                await self.scheduler.push_messages(user_id, texts, priority)
+                self._pushes_sent += 1
+            self._messages_sent += len(texts)
+        except Exception as e:
+            self._failures += 1
+            for _, future in chunk:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for _, future in chunk:
+            if not future.done():
+                future.set_result(None)
+
+    @staticmethod
+    def _cancel_timer(buffer: _UserBuffer) -> None:
+        """バッファの送信タイマーを取り消す
+
+        Args:
+            buffer: ユーザーごとの送信待ちバッファ
+        """
+        if buffer.timer is not None and buffer.timer is not asyncio.current_task():
+            buffer.timer.cancel()
+        buffer.timer = None
+
+    @staticmethod
+    def _log_failure(future: asyncio.Future) -> None:
+        """送信失敗をログに記録（awaitされないFutureの例外を回収）
+
+        Args:
+            future: 送信完了を通知するFuture
+        """
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Failed to send outbound message: {future.exception()}")
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            送信メッセージ数とリクエスト数、集約で削減したリクエスト数を含む辞書
+        """
+        requests = self._replies_sent + self._pushes_sent
+        return {
+            "pending_users": len(self._buffers),
+            "messages_sent": self._messages_sent,
+            "replies_sent": self._replies_sent,
+            "pushes_sent": self._pushes_sent,
+            "requests_saved": self._messages_sent - requests,
+            "failures": self._failures,
+        }
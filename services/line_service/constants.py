@@ -9,12 +9,71 @@ import os
 DEFAULT_THREAD_POOL_SIZE = 5
 DEFAULT_THREAD_NAME_PREFIX = "LineEvent"
 
+# Webhookワークキュー設定
+WEBHOOK_WORKER_COUNT = int(os.environ.get("WEBHOOK_WORKER_COUNT", "8"))
+WEBHOOK_QUEUE_MAXSIZE = int(os.environ.get("WEBHOOK_QUEUE_MAXSIZE", "100"))
+
+# Webhook受信から応答送信までの処理期限（返信トークンの有効期間内に収める）
+WEBHOOK_DEADLINE_SECONDS = float(os.environ.get("WEBHOOK_DEADLINE_SECONDS", "50"))
+
+# LINE APIクライアントの接続プール設定
+LINE_API_POOL_MAXSIZE = int(os.environ.get("LINE_API_POOL_MAXSIZE", "10"))
+LINE_API_KEEPALIVE_IDLE_SECONDS = int(os.environ.get("LINE_API_KEEPALIVE_IDLE_SECONDS", "60"))
+LINE_API_KEEPALIVE_INTERVAL_SECONDS = int(os.environ.get("LINE_API_KEEPALIVE_INTERVAL_SECONDS", "20"))
+
+# LINE Messaging APIのエンドポイント（負荷試験ではローカルのフェイクサーバーを指定）
+LINE_API_ENDPOINT = os.environ.get("LINE_API_ENDPOINT", "https://api.line.me")
+
+# Webhook記録設定（指定したファイルに匿名化したリクエストボディを追記し、負荷試験で再生する）
+WEBHOOK_RECORD_PATH = os.environ.get("WEBHOOK_RECORD_PATH")
+WEBHOOK_RECORD_SALT = os.environ.get("WEBHOOK_RECORD_SALT", "")
+WEBHOOK_RECORD_REDACT_TEXT = os.environ.get("WEBHOOK_RECORD_REDACT_TEXT", "false").lower() == "true"
+
+# 画像ダウンロード設定（上限サイズを超える画像は拒否し、大きい画像は一時ファイルに退避）
+LINE_API_DATA_ENDPOINT = os.environ.get("LINE_API_DATA_ENDPOINT", "https://api-data.line.me")
+IMAGE_MAX_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+IMAGE_SPOOL_THRESHOLD_BYTES = int(os.environ.get("IMAGE_SPOOL_THRESHOLD_BYTES", str(1024 * 1024)))
+IMAGE_DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+# 複数画像の集約設定（画像セットや続けて届いた画像を1回のエージェント実行にまとめる）
+IMAGE_BURST_WINDOW_SECONDS = float(os.environ.get("IMAGE_BURST_WINDOW_SECONDS", "3"))
+IMAGE_BURST_MAX_IMAGES = int(os.environ.get("IMAGE_BURST_MAX_IMAGES", "10"))
+
+# 送信メッセージの集約設定
+LINE_MAX_MESSAGES_PER_REQUEST = 5  # reply/pushの1リクエストで送れる最大メッセージ数
+OUTBOUND_COALESCE_WINDOW_SECONDS = float(os.environ.get("OUTBOUND_COALESCE_WINDOW_SECONDS", "0.5"))
+
+# 送信スケジューラ設定（レート制限と再試行）
+LINE_API_RATE_PER_SECOND = float(os.environ.get("LINE_API_RATE_PER_SECOND", "100"))
+LINE_API_BURST = int(os.environ.get("LINE_API_BURST", "20"))
+OUTBOUND_MAX_RETRIES = int(os.environ.get("OUTBOUND_MAX_RETRIES", "5"))
+OUTBOUND_RETRY_BASE_SECONDS = float(os.environ.get("OUTBOUND_RETRY_BASE_SECONDS", "0.5"))
+OUTBOUND_RETRY_MAX_SECONDS = float(os.environ.get("OUTBOUND_RETRY_MAX_SECONDS", "30"))
+
+# 冪等性ストア設定（再送イベントの重複処理防止）
+IDEMPOTENCY_BACKEND = os.environ.get("IDEMPOTENCY_BACKEND", "memory")  # memory / sqlite
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+IDEMPOTENCY_SQLITE_PATH = os.environ.get("IDEMPOTENCY_SQLITE_PATH", "/tmp/line_idempotency.db")
+
 # エラーメッセージ
 ERROR_MESSAGE = (
     "申し訳ございません。処理中にエラーが発生しました。"
     "しばらく時間をおいてから再試行してください。"
 )
 
+# 画像サイズが上限を超えた場合のメッセージ
+IMAGE_TOO_LARGE_MESSAGE = (
+    "😓 画像のサイズが大きすぎるため処理できませんでした。"
+    "サイズを小さくしてから、もう一度送信してください。"
+)
+
+# 混雑時のメッセージ（エージェントを実行せずに返す）
+BUSY_MESSAGE = (
+    "🙏 ただいま大変混み合っています。"
+    "少し時間をおいてから、もう一度送信してください。"
+)
+
 
 # 設定読み込み用関数
 def get_line_config() -> tuple[str, str]:
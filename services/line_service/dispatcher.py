@@ -0,0 +1,187 @@
+"""イベントディスパッチモジュール
+
+このモジュールは、Webhookイベントをユーザー単位のレーンに振り分けて処理する機能を提供します。
+異なるユーザーのイベントは並行に、同じユーザーのイベントは受信順に直列で処理します。
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+from utils.deadline import deadline_scope, get_deadline
+from utils.logging import setup_cloud_logging
+
+logger = setup_cloud_logging("event_dispatcher")
+
+
+class KeyedSerialExecutor:
+    """キー単位の直列実行クラス
+
+    同じキーに投入された処理は投入順に1つずつ実行し、
+    異なるキーの処理は並行に実行します。
+    """
+
+    def __init__(self):
+        """初期化"""
+        self._lanes: Dict[Hashable, Deque[Tuple[Callable[[], Awaitable[Any]], asyncio.Future]]] = {}
+        # 実行中のレーンのタスク（完了前にガベージコレクトされないよう参照を保持）
+        self._tasks: Set[asyncio.Task] = set()
+        self._submitted = 0
+        self._max_active_lanes = 0
+
+    def submit(
+        self, key: Hashable, func: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Future:
+        """処理をキーのレーンに投入
+
+        投入は同期的に行われるため、同じキーへの投入順がそのまま実行順になります。
+
+        Args:
+            key: レーンのキー（ユーザーIDなど）
+            func: 実行するコルーチン関数（引数なし）
+
+        Returns:
+            処理結果を受け取るFuture
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._submitted += 1
+
+        lane = self._lanes.get(key)
+        if lane is not None:
+            lane.append((func, future))
+            return future
+
+        # 新しいレーンを開始
+        self._lanes[key] = deque([(func, future)])
+        self._max_active_lanes = max(self._max_active_lanes, len(self._lanes))
+        task = asyncio.create_task(self._run_lane(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return future
+
+    async def _run_lane(self, key: Hashable) -> None:
+        """レーン内の処理を順番に実行
+
+        Args:
+            key: レーンのキー
+        """
+        lane = self._lanes[key]
+        try:
+            while lane:
+                func, future = lane.popleft()
+                try:
+                    result = await func()
+                except Exception as e:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                except BaseException:
+                    # キャンセルなどでレーンが止まる場合は、実行中の処理もキャンセル扱いにする
+                    future.cancel()
+                    raise
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+        finally:
+            # レーンが異常終了した場合も、残りの処理の待機側を解放してレーンを削除
+            del self._lanes[key]
+            for _, future in lane:
+                if not future.done():
+                    future.set_exception(RuntimeError(f"lane {key} stopped before running this task"))
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            アクティブなレーン数や待機中の処理数を含む辞書
+        """
+        return {
+            "active_lanes": len(self._lanes),
+            "max_active_lanes": self._max_active_lanes,
+            "pending": sum(len(lane) for lane in self._lanes.values()),
+            "submitted": self._submitted,
+        }
+
+
+def get_event_key(event: Any) -> Optional[str]:
+    """イベントの直列化キーを取得
+
+    Args:
+        event: LINE Webhookイベント
+
+    Returns:
+        送信元ユーザーID（取得できない場合はグループID・ルームID、いずれもなければNone）
+    """
+    source = getattr(event, "source", None)
+    for attr in ("user_id", "group_id", "room_id"):
+        value = getattr(source, attr, None)
+        if value:
+            return value
+    return None
+
+
+class EventDispatcher:
+    """イベントディスパッチクラス
+
+    Webhookイベントのバッチをユーザー単位のレーンに振り分け、
+    ユーザー間では並行、ユーザー内では順序を保って処理します。
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[None]],
+        executor: Optional[KeyedSerialExecutor] = None,
+    ):
+        """初期化
+
+        Args:
+            handler: 1件のイベントを処理するコルーチン関数
+            executor: キー単位の直列実行クラス（未指定時は新規作成）
+        """
+        self.handler = handler
+        self.executor = executor or KeyedSerialExecutor()
+
+    async def dispatch(self, events: List[Any]) -> None:
+        """イベントのバッチを処理
+
+        すべてのイベントの処理が完了するまで待機します。
+        個々のイベントの例外はログに記録し、他のイベントの処理は継続します。
+
+        Args:
+            events: 処理するイベントのリスト
+        """
+        # レーンのタスクは投入元とは別のコンテキストで動くため、期限を明示的に引き継ぐ
+        deadline = get_deadline()
+        futures = []
+        for event in events:
+            key = get_event_key(event)
+            if key is None:
+                # キーがないイベントは独立したレーンで処理
+                key = id(event)
+            futures.append(
+                self.executor.submit(
+                    key, lambda event=event: self._handle_with_deadline(event, deadline)
+                )
+            )
+
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for event, result in zip(events, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error while dispatching event {type(event).__name__}: {result}")
+
+    async def _handle_with_deadline(self, event: Any, deadline: Optional[float]) -> None:
+        """期限を設定してイベントを処理
+
+        Args:
+            event: 処理するイベント
+            deadline: 処理期限（monotonic時刻）
+        """
+        with deadline_scope(deadline):
+            await self.handler(event)
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            レーンの統計情報
+        """
+        return self.executor.stats()
@@ -4,16 +4,27 @@
 各種メッセージタイプに対する処理を担当します。
 """
 
-from typing import Optional
+from typing import List, Optional
 
 from linebot.v3.webhooks import (
     ImageMessageContent,
     MessageEvent,
     TextMessageContent,
 )
-from services.line_service.client import LineClient
-from services.line_service.constants import ERROR_MESSAGE
-from services.agent_service_impl import call_agent_async, call_agent_with_image_async
+from services.image_service import ImagePreprocessor, PreprocessedImage
+from services.line_service.async_client import AsyncLineClient, ContentTooLargeError
+from services.line_service.coalescer import OutboundCoalescer
+from services.line_service.dispatcher import KeyedSerialExecutor
+from services.line_service.image_aggregator import ImageBurstAggregator
+from services.line_service.scheduler import OutboundScheduler, Priority
+from services.line_service.constants import (
+    BUSY_MESSAGE,
+    ERROR_MESSAGE,
+    IMAGE_TOO_LARGE_MESSAGE,
+)
+from services.line_service.idempotency import IdempotencyStore, create_idempotency_store
+from services.agent_service_impl import call_agent_async, call_agent_with_images_async
+from services.agent_service.admission import AgentBusyError
 from utils.logging import setup_cloud_logging
 
 logger = setup_cloud_logging("line_handler")
@@ -26,13 +37,33 @@ class LineEventHandler:
     各種メッセージタイプに応じた処理を提供します。
     """
 
-    def __init__(self, line_client: Optional[LineClient] = None):
+    def __init__(
+        self,
+        line_client: Optional[AsyncLineClient] = None,
+        idempotency_store: Optional[IdempotencyStore] = None,
+        outbound: Optional[OutboundCoalescer] = None,
+        image_preprocessor: Optional[ImagePreprocessor] = None,
+        image_aggregator: Optional[ImageBurstAggregator] = None,
+        event_lanes: Optional[KeyedSerialExecutor] = None,
+    ):
         """初期化
 
         Args:
-            line_client: LINE APIクライアント（未指定時は新規作成）
+            line_client: LINE API非同期クライアント（未指定時は新規作成）
+            idempotency_store: 処理済みイベントの記録先（未指定時は設定から作成）
+            outbound: 送信メッセージの集約クラス（未指定時は新規作成）
+            image_preprocessor: 画像の前処理クラス（未指定時は新規作成）
+            image_aggregator: 複数画像の集約クラス（未指定時は新規作成）
+            event_lanes: ユーザー単位のレーン（イベントディスパッチャーと共有する。未指定時は新規作成）
         """
-        self.line_client = line_client or LineClient()
+        self.line_client = line_client or AsyncLineClient()
+        self.idempotency_store = idempotency_store or create_idempotency_store()
+        self.outbound = outbound or OutboundCoalescer(OutboundScheduler(self.line_client))
+        self.image_preprocessor = image_preprocessor or ImagePreprocessor()
+        self.event_lanes = event_lanes or KeyedSerialExecutor()
+        self.image_aggregator = image_aggregator or ImageBurstAggregator(
+            self.analyze_images, executor=self.event_lanes
+        )
 
     async def handle_text_message(
         self, event: MessageEvent, text_content: TextMessageContent
@@ -50,26 +81,57 @@ class LineEventHandler:
             f"Processing text message from {user_id}: {text_content.text}"
         )
 
+        # 返信トークンは1回しか使えないため、途中経過で使った後は渡さない
+        unused_reply_tokens = [reply_token]
+
+        def take_reply_token() -> Optional[str]:
+            return unused_reply_tokens.pop() if unused_reply_tokens else None
+
+        async def forward_update(author: str, text: str) -> None:
+            # サブエージェントの応答は揃った時点で送信（最初の1件は返信で送る）
+            logger.info(f"Forwarding partial response from {author} to {user_id}")
+            self.outbound.send(
+                user_id, text.rstrip("\n"), reply_token=take_reply_token(), priority=Priority.ANSWER
+            )
+
         try:
             # エージェントに問い合わせ
             reply_text = await call_agent_async(
                 text_content.text,
                 user_id=user_id,
+                on_update=forward_update,
             )
             reply_text = reply_text.rstrip("\n")
 
-            # 返信を送信
-            self.line_client.reply_text(reply_token, reply_text)
+            # 返信を送信（途中経過ですべて送信済みの場合はバッファのみ送信）
+            if reply_text:
+                await self.outbound.send(
+                    user_id,
+                    reply_text,
+                    reply_token=take_reply_token(),
+                    flush=True,
+                    priority=Priority.ANSWER,
+                )
+            else:
+                await self.outbound.flush(user_id)
+
+        except AgentBusyError:
+            # 混雑時はエージェントを実行せずに定型文を返す
+            logger.warning(f"Agent is busy, sending busy reply to {user_id}")
+            await self._handle_error_reply(user_id, take_reply_token(), BUSY_MESSAGE)
 
         except Exception as e:
             logger.exception(f"Error processing text message: {e}")
-            self._handle_error_reply(reply_token)
+            await self._handle_error_reply(user_id, take_reply_token())
             
     async def handle_image_message(
         self, event: MessageEvent, image_content: ImageMessageContent
     ) -> None:
         """画像メッセージの処理
 
+        画像を取得・前処理して集約クラスに渡します。同じ画像セットの画像や
+        続けて届いた画像はまとめて1回のエージェント実行で解析されます。
+
         Args:
             event: LINEメッセージイベント
             image_content: 画像メッセージ内容
@@ -78,37 +140,77 @@ class LineEventHandler:
         reply_token = event.reply_token
         
         message_id = image_content.id
+        image_set = image_content.image_set
 
         logger.info(f"[画像解析フロー] 処理開始: user_id={user_id}, message_id={message_id}")
         
-        # 処理開始を通知
-        self.line_client.reply_text(reply_token, "📸 画像を解析中です。しばらくお待ちください...")
+        # 処理開始と途中経過を通知（まとめて解析する画像のうち最初の1枚のみ。1回の返信にまとめて送信）
+        if not self.image_aggregator.is_pending(user_id):
+            self.outbound.send(user_id, "📸 画像を解析中です。しばらくお待ちください...", reply_token=reply_token)
+            self.outbound.send(user_id, "⚙️ 食材を抽出中... 画像内の食材を識別しています。")
         
         try:
-            # 画像データを取得
-            image_data = self.line_client.get_message_content(message_id)
-            
-            # プッシュメッセージで途中経過を通知
-            self.line_client.push_text(
-                user_id, 
-                "⚙️ 食材を抽出中... 画像内の食材を識別しています。"
+            # 画像データをストリーミングで取得（大きい画像は一時ファイルに退避）
+            with await self.line_client.download_message_content(message_id) as image:
+                # 形式を判定し、縮小・再圧縮（元の画像はここで解放）
+                processed = await self.image_preprocessor.preprocess(image)
+
+            # 続けて届く画像とまとめて解析
+            self.image_aggregator.add(
+                user_id,
+                processed,
+                set_id=image_set.id if image_set else None,
+                set_total=image_set.total if image_set else None,
             )
-            
+
+        except ContentTooLargeError as e:
+            logger.warning(f"Image too large from {user_id}: {e}")
+            await self.outbound.send(
+                user_id, IMAGE_TOO_LARGE_MESSAGE, flush=True, priority=Priority.ANSWER
+            )
+
+        except Exception as e:
+            # エラーメッセージを送信
+            error_message = f"😓 申し訳ありません。画像処理中にエラーが発生しました。\n時間を空けて再度、画像をアップロードしてください。\nエラー詳細: {str(e)[:100]}..."
+            await self.outbound.send(user_id, error_message, flush=True, priority=Priority.ANSWER)
+
+    async def analyze_images(
+        self, user_id: str, images: List[PreprocessedImage]
+    ) -> None:
+        """まとめた画像を1回のエージェント実行で解析し、結果を送信
+
+        Args:
+            user_id: 送信先のユーザーID
+            images: 前処理済みの画像のリスト
+        """
+        if len(images) == 1:
+            message = "この画像(レシート画像・食材画像）から食材を抽出して、食材をリスト形式で返してください"
+        else:
+            message = (
+                f"これらの{len(images)}枚の画像(レシート画像・食材画像）から食材を抽出して、"
+                "重複をまとめた1つの食材リスト形式で返してください"
+            )
+
+        try:
             # エージェントに問い合わせ
-            reply_text = await call_agent_with_image_async(
-                message="この画像(レシート画像・食材画像）から食材を抽出して、食材をリスト形式で返してください",
-                image_data=image_data,
-                image_mime_type="image/jpeg",
+            reply_text = await call_agent_with_images_async(
+                message=message,
+                images=[(image.data, image.mime_type) for image in images],
                 user_id=user_id,
             )
 
             # 結果を送信
-            self.line_client.push_text(user_id, reply_text)
+            await self.outbound.send(user_id, reply_text, flush=True, priority=Priority.ANSWER)
+
+        except AgentBusyError:
+            # 混雑時はエージェントを実行せずに定型文を送る
+            logger.warning(f"Agent is busy, sending busy message to {user_id}")
+            await self.outbound.send(user_id, BUSY_MESSAGE, flush=True, priority=Priority.ANSWER)
 
         except Exception as e:
             # エラーメッセージを送信
             error_message = f"😓 申し訳ありません。画像処理中にエラーが発生しました。\n時間を空けて再度、画像をアップロードしてください。\nエラー詳細: {str(e)[:100]}..."
-            self.line_client.push_text(user_id, error_message)
+            await self.outbound.send(user_id, error_message, flush=True, priority=Priority.ANSWER)
 
     async def handle_event(self, event: MessageEvent) -> None:
         """イベントハンドラのエントリーポイント
@@ -116,7 +218,15 @@ class LineEventHandler:
         Args:
             event: LINEメッセージイベント
         """
+        # 再送などで処理済みのイベントはスキップ
+        if await self._is_duplicate_event(event):
+            return
+
         try:
+            if not isinstance(event.message, ImageMessageContent):
+                # 集約中の画像があれば、このメッセージより先に解析する（同じセッションでの同時実行を防ぐ）
+                await self.image_aggregator.drain(event.source.user_id)
+
             # メッセージタイプに応じて処理を分岐
             if isinstance(event.message, TextMessageContent):
                 await self.handle_text_message(event, event.message)
@@ -124,22 +234,55 @@ class LineEventHandler:
                 await self.handle_image_message(event, event.message)
             else:
                 logger.info(f"Unsupported message type: {type(event.message)}")
-                self.line_client.reply_text(
-                    event.reply_token,
+                await self.outbound.send(
+                    event.source.user_id,
                     "申し訳ございません。このメッセージタイプには対応していません。",
+                    reply_token=event.reply_token,
+                    flush=True,
+                    priority=Priority.ANSWER,
                 )
 
         except Exception as e:
             logger.exception(f"Error in handle_event: {e}")
-            self._handle_error_reply(event.reply_token)
+            await self._handle_error_reply(event.source.user_id, event.reply_token)
+
+    async def _is_duplicate_event(self, event: MessageEvent) -> bool:
+        """処理済みのイベントかどうかを判定
 
-    def _handle_error_reply(self, reply_token: str) -> None:
+        Args:
+            event: LINEメッセージイベント
+
+        Returns:
+            処理済みであればTrue、そうでなければFalse
+        """
+        webhook_event_id = getattr(event, "webhook_event_id", None)
+        if not webhook_event_id:
+            return False
+
+        delivery_context = getattr(event, "delivery_context", None)
+        is_redelivery = bool(delivery_context and delivery_context.is_redelivery)
+
+        if await self.idempotency_store.check_and_mark(webhook_event_id, is_redelivery):
+            return False
+
+        logger.info(
+            f"Skipping duplicate event: webhook_event_id={webhook_event_id}, redelivery={is_redelivery}"
+        )
+        return True
+
+    async def _handle_error_reply(
+        self, user_id: str, reply_token: str, message: str = ERROR_MESSAGE
+    ) -> None:
         """エラー時の返信処理
 
         Args:
+            user_id: 送信先のユーザーID
             reply_token: 返信用トークン
+            message: 返信するメッセージ
         """
         try:
-            self.line_client.reply_text(reply_token, ERROR_MESSAGE)
+            await self.outbound.send(
+                user_id, message, reply_token=reply_token, flush=True, priority=Priority.ANSWER
+            )
         except Exception as e:
             logger.exception(f"Failed to send error message: {e}")
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""Webhookイベントの冪等性管理モジュール
+
+このモジュールは、処理済みのwebhookEventIdを記録し、
+LINEからの再送イベントを重複処理しないための機能を提供します。
+インメモリ（LRU）とSQLiteの2種類のバックエンドをサポートします。
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+from services.line_service.constants import (
+    IDEMPOTENCY_BACKEND,
+    IDEMPOTENCY_MAX_ENTRIES,
+    IDEMPOTENCY_SQLITE_PATH,
+    IDEMPOTENCY_TTL_SECONDS,
+)
+from utils.logging import setup_cloud_logging
+
+logger = setup_cloud_logging("idempotency")
+
+
+class IdempotencyStore(ABC):
+    """冪等性ストアの基底クラス
+
+    処理済みキーの判定と統計情報の集計を担当します。
+    バックエンド固有の処理はサブクラスで実装します。
+    """
+
+    def __init__(self, ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS):
+        """初期化
+
+        Args:
+            ttl_seconds: キーを保持する秒数
+        """
+        self.ttl_seconds = ttl_seconds
+        self._hits = 0
+        self._misses = 0
+        self._redelivery_hits = 0
+        self._lock = threading.Lock()
+
+    async def check_and_mark(self, key: str, is_redelivery: bool = False) -> bool:
+        """キーが未処理か判定し、処理済みとして記録
+
+        Args:
+            key: webhookEventId
+            is_redelivery: LINEが再送フラグを付与しているか
+
+        Returns:
+            初めて受信したキーであればTrue、処理済みであればFalse
+        """
+        is_new = await self._mark(key, time.time())
+        with self._lock:
+            if is_new:
+                self._misses += 1
+            else:
+                self._hits += 1
+                if is_redelivery:
+                    self._redelivery_hits += 1
+        return is_new
+
+    @abstractmethod
+    async def _mark(self, key: str, now: float) -> bool:
+        """キーを記録（サブクラスで実装）
+
+        Args:
+            key: webhookEventId
+            now: 現在時刻（UNIX時間）
+
+        Returns:
+            新規に記録した場合はTrue、有効なキーが既に存在する場合はFalse
+        """
+
+    @abstractmethod
+    def size(self) -> int:
+        """保持しているキー数を取得（サブクラスで実装）"""
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            ヒット数（スキップした重複イベント数）などを含む辞書
+        """
+        with self._lock:
+            hits, misses, redelivery_hits = self._hits, self._misses, self._redelivery_hits
+        total = hits + misses
+        return {
+            "backend": type(self).__name__,
+            "hits": hits,
+            "misses": misses,
+            "redelivery_hits": redelivery_hits,
+            "hit_rate": hits / total if total else 0.0,
+            "size": self.size(),
+        }
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    """インメモリの冪等性ストア
+
+    TTL付きのLRUでキーを保持します。単一インスタンスでの利用を想定しています。
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS,
+        max_entries: int = IDEMPOTENCY_MAX_ENTRIES,
+    ):
+        """初期化
+
+        Args:
+            ttl_seconds: キーを保持する秒数
+            max_entries: 保持するキー数の上限
+        """
+        super().__init__(ttl_seconds)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._entries_lock = threading.Lock()
+
+    async def _mark(self, key: str, now: float) -> bool:
+        with self._entries_lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at > now:
+                self._entries.move_to_end(key)
+                return False
+
+            self._entries[key] = now + self.ttl_seconds
+            self._entries.move_to_end(key)
+
+            # 期限切れと上限超過のキーを古い順に削除
+            while self._entries:
+                oldest_key, oldest_expires_at = next(iter(self._entries.items()))
+                if oldest_expires_at > now and len(self._entries) <= self.max_entries:
+                    break
+                del self._entries[oldest_key]
+            return True
+
+    def size(self) -> int:
+        with self._entries_lock:
+            return len(self._entries)
+
+
+class SQLiteIdempotencyStore(IdempotencyStore):
+    """SQLiteの冪等性ストア
+
+    共有ファイル上のSQLiteでキーを保持し、複数プロセス間で重複を判定します。
+    """
+
+    # 期限切れキーを掃除する間隔（記録回数）
+    PURGE_INTERVAL = 500
+
+    def __init__(
+        self,
+        path: str = IDEMPOTENCY_SQLITE_PATH,
+        ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS,
+    ):
+        """初期化
+
+        Args:
+            path: SQLiteデータベースファイルのパス
+            ttl_seconds: キーを保持する秒数
+        """
+        super().__init__(ttl_seconds)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS webhook_event_ids ("
+            "event_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+        )
+        self._conn_lock = threading.Lock()
+        self._marks_since_purge = 0
+        # 保持しているキー数（/statsや/metricsでDBに問い合わせないよう、記録・掃除のたびに更新）
+        self._size = self._conn.execute("SELECT COUNT(*) FROM webhook_event_ids").fetchone()[0]
+
+    async def _mark(self, key: str, now: float) -> bool:
+        # ロック待ち（busy_timeout）でイベントループを止めないよう、別スレッドで書き込む
+        return await asyncio.to_thread(self._mark_sync, key, now)
+
+    def _mark_sync(self, key: str, now: float) -> bool:
+        """キーを記録（別スレッドで実行）
+
+        Args:
+            key: webhookEventId
+            now: 現在時刻（UNIX時間）
+
+        Returns:
+            新規に記録した場合はTrue、有効なキーが既に存在する場合はFalse
+        """
+        with self._conn_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                expired = self._conn.execute(
+                    "DELETE FROM webhook_event_ids WHERE event_id = ? AND expires_at <= ?",
+                    (key, now),
+                ).rowcount
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO webhook_event_ids (event_id, expires_at) VALUES (?, ?)",
+                    (key, now + self.ttl_seconds),
+                )
+                is_new = cursor.rowcount == 1
+                size = self._size - expired + cursor.rowcount
+
+                self._marks_since_purge += 1
+                if self._marks_since_purge >= self.PURGE_INTERVAL:
+                    self._conn.execute(
+                        "DELETE FROM webhook_event_ids WHERE expires_at <= ?", (now,)
+                    )
+                    # 他のプロセスが記録したキーも含めて、掃除のついでに実数へ補正
+                    size = self._conn.execute(
+                        "SELECT COUNT(*) FROM webhook_event_ids"
+                    ).fetchone()[0]
+                    self._marks_since_purge = 0
+
+                self._conn.execute("COMMIT")
+                self._size = max(size, 0)
+                return is_new
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def size(self) -> int:
+        # 複数プロセスで共有している場合は、掃除の間に他のプロセスが記録した分を含まない概算値
+        return self._size
+
+    def close(self) -> None:
+        """データベース接続を閉じる"""
+        with self._conn_lock:
+            self._conn.close()
+
+
+def create_idempotency_store(backend: Optional[str] = None) -> IdempotencyStore:
+    """設定に応じた冪等性ストアを作成
+
+    Args:
+        backend: バックエンド名（"memory" または "sqlite"、未指定時は環境変数）
+
+    Returns:
+        冪等性ストアのインスタンス
+    """
+    backend = backend or IDEMPOTENCY_BACKEND
+    if backend == "sqlite":
+        logger.info(f"Using SQLite idempotency store: {IDEMPOTENCY_SQLITE_PATH}")
+        return SQLiteIdempotencyStore()
+    if backend != "memory":
+        logger.warning(f"Unknown idempotency backend '{backend}', falling back to memory")
+    return InMemoryIdempotencyStore()
@@ -0,0 +1,201 @@
+"""画像バースト集約モジュール
+
+このモジュールは、ユーザーが続けて送った複数の画像を1つのバッチにまとめる機能を提供します。
+同じ画像セット（imageSet.id）の画像、または一定時間内に届いた画像をまとめ、
+エージェントの実行を1回にします。
+まとめたバッチは、そのユーザーのイベントと同じレーンで順番に処理します。
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from services.line_service.constants import (
+    IMAGE_BURST_MAX_IMAGES,
+    IMAGE_BURST_WINDOW_SECONDS,
+)
+from services.line_service.dispatcher import KeyedSerialExecutor
+from utils.logging import setup_cloud_logging
+
+logger = setup_cloud_logging("image_aggregator")
+
+
+@dataclass
+class _PendingBatch:
+    """ユーザーごとの集約中のバッチ"""
+
+    items: List[Any] = field(default_factory=list)
+    set_id: Optional[str] = None
+    set_total: Optional[int] = None
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class ImageBurstAggregator:
+    """画像バースト集約クラス
+
+    画像が届くたびに待ち時間を延長し、待ち時間内に次の画像が届かなかった時点、
+    画像セットの全件が揃った時点、または上限枚数に達した時点でバッチを処理します。
+    バッチの処理はユーザーのレーンに投入するため、同じユーザーのイベントと同時には実行されません。
+    集約中に届いた画像以外のイベントは、drain() で先にバッチを処理してから処理してください。
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[str, List[Any]], Awaitable[None]],
+        window_seconds: float = IMAGE_BURST_WINDOW_SECONDS,
+        max_images: int = IMAGE_BURST_MAX_IMAGES,
+        executor: Optional[KeyedSerialExecutor] = None,
+    ):
+        """初期化
+
+        Args:
+            process_batch: バッチを処理するコルーチン関数（ユーザーIDと画像のリストを受け取る）
+            window_seconds: 次の画像を待つ時間（秒）
+            max_images: 1バッチにまとめる最大枚数
+            executor: ユーザー単位のレーン（イベントディスパッチャーと共有する。未指定時は新規作成）
+        """
+        self.process_batch = process_batch
+        self.window_seconds = window_seconds
+        self.max_images = max_images
+        self.executor = executor or KeyedSerialExecutor()
+        self._batches: Dict[str, _PendingBatch] = {}
+        self._tasks: Set[asyncio.Future] = set()
+
+        # 統計情報
+        self._images = 0
+        self._batches_processed = 0
+        self._max_batch_size = 0
+
+    def is_pending(self, user_id: str) -> bool:
+        """ユーザーの集約中のバッチがあるかどうか
+
+        Args:
+            user_id: ユーザーID
+
+        Returns:
+            集約中のバッチがあればTrue
+        """
+        return user_id in self._batches
+
+    def add(
+        self,
+        user_id: str,
+        item: Any,
+        set_id: Optional[str] = None,
+        set_total: Optional[int] = None,
+    ) -> None:
+        """画像をユーザーのバッチに追加
+
+        Args:
+            user_id: ユーザーID
+            item: 画像（バッチ処理関数にそのまま渡される）
+            set_id: 画像セットID（LINEで複数画像をまとめて送った場合）
+            set_total: 画像セットの総枚数
+        """
+        self._images += 1
+        batch = self._batches.get(user_id)
+
+        # 別の画像セットが届いた場合は、集約中のバッチを先に処理
+        if batch is not None and set_id and batch.set_id and batch.set_id != set_id:
+            self._flush(user_id)
+            batch = None
+
+        if batch is None:
+            batch = self._batches[user_id] = _PendingBatch()
+        batch.items.append(item)
+        if set_id:
+            batch.set_id = set_id
+            batch.set_total = set_total
+
+        set_complete = batch.set_total is not None and len(batch.items) >= batch.set_total
+        if set_complete or len(batch.items) >= self.max_images:
+            self._flush(user_id)
+            return
+
+        # 次の画像を待つ時間を延長
+        if batch.timer is not None:
+            batch.timer.cancel()
+        batch.timer = asyncio.get_running_loop().call_later(
+            self.window_seconds, self._flush, user_id
+        )
+
+    async def close(self) -> None:
+        """集約中のバッチをすべて処理し、完了まで待機"""
+        for user_id in list(self._batches):
+            self._flush(user_id)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def drain(self, user_id: str) -> None:
+        """ユーザーの集約中のバッチをその場で処理し、完了まで待機
+
+        ユーザーのレーン内から呼び出し、後に届いたイベントより先に画像を解析します。
+
+        Args:
+            user_id: ユーザーID
+        """
+        items = self._take(user_id)
+        if items is not None:
+            await self._run(user_id, items)
+
+    def _flush(self, user_id: str) -> None:
+        """ユーザーのバッチをユーザーのレーンに投入
+
+        Args:
+            user_id: ユーザーID
+        """
+        items = self._take(user_id)
+        if items is None:
+            return
+
+        future = self.executor.submit(user_id, lambda: self._run(user_id, items))
+        self._tasks.add(future)
+        future.add_done_callback(self._tasks.discard)
+
+    def _take(self, user_id: str) -> Optional[List[Any]]:
+        """ユーザーの集約中のバッチを取り出す
+
+        Args:
+            user_id: ユーザーID
+
+        Returns:
+            バッチの画像のリスト（集約中のバッチがない場合はNone）
+        """
+        batch = self._batches.pop(user_id, None)
+        if batch is None:
+            return None
+        if batch.timer is not None:
+            batch.timer.cancel()
+
+        self._batches_processed += 1
+        self._max_batch_size = max(self._max_batch_size, len(batch.items))
+        logger.info(f"Processing image batch for {user_id}: {len(batch.items)} images")
+        return batch.items
+
+    async def _run(self, user_id: str, items: List[Any]) -> None:
+        """バッチ処理関数を実行し、例外をログに記録
+
+        Args:
+            user_id: ユーザーID
+            items: 画像のリスト
+        """
+        try:
+            await self.process_batch(user_id, items)
+        except Exception as e:
+            logger.exception(f"Error processing image batch for {user_id}: {e}")
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            受け付けた画像数・処理したバッチ数・削減したエージェント実行回数を含む辞書
+        """
+        return {
+            "pending_users": len(self._batches),
+            "running": len(self._tasks),
+            "images": self._images,
+            "batches": self._batches_processed,
+            "runs_saved": self._images - self._batches_processed - sum(
+                len(batch.items) for batch in self._batches.values()
+            ),
+            "max_batch_size": self._max_batch_size,
+        }
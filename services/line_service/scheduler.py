@@ -0,0 +1,395 @@
+"""送信スケジューラモジュール
+
+このモジュールは、LINE Messaging APIへの送信をレート制限と優先度付きで行う機能を提供します。
+トークンバケットで送信レートを制御し、返信→最終回答のプッシュ→途中経過の順に優先して処理します。
+一時的なエラーはジッター付き指数バックオフで再試行し、プッシュには再試行キーを付与して
+同じメッセージが二重に配信されないようにします。
+"""
+
+import asyncio
+import itertools
+import random
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Dict, List, Optional, Set
+
+from aiohttp import ClientError
+from linebot.v3.messaging import ApiException
+
+from services.line_service.async_client import AsyncLineClient
+from services.line_service.constants import (
+    LINE_API_BURST,
+    LINE_API_POOL_MAXSIZE,
+    LINE_API_RATE_PER_SECOND,
+    OUTBOUND_MAX_RETRIES,
+    OUTBOUND_RETRY_BASE_SECONDS,
+    OUTBOUND_RETRY_MAX_SECONDS,
+)
+from utils.logging import setup_cloud_logging
+from utils.metrics import LatencyRecorder
+
+logger = setup_cloud_logging("outbound_scheduler")
+
+
+class Priority(IntEnum):
+    """送信の優先度（値が小さいほど優先）"""
+
+    REPLY = 0
+    ANSWER = 1
+    PROGRESS = 2
+
+
+class TokenBucket:
+    """トークンバケットによるレート制限クラス"""
+
+    def __init__(self, rate: float, capacity: float):
+        """初期化
+
+        Args:
+            rate: 1秒あたりに補充するトークン数
+            capacity: バケットの容量（許容するバースト数）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    async def acquire(self) -> float:
+        """トークンを1つ取得（不足時は補充されるまで待機）
+
+        Returns:
+            待機した秒数
+        """
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return waited
+
+            delay = (1 - self._tokens) / self.rate
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+@dataclass(order=True)
+class _SendJob:
+    """送信ジョブ"""
+
+    priority: int
+    sequence: int
+    kind: str = field(compare=False)  # "reply" または "push"
+    target: str = field(compare=False)  # 返信トークンまたはユーザーID
+    texts: List[str] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    retry_key: Optional[str] = field(default=None, compare=False)
+    attempt: int = field(default=0, compare=False)
+
+
+class OutboundScheduler:
+    """送信スケジューラクラス
+
+    すべてのreply/pushを優先度付きキューに集約し、トークンバケットで
+    レートを制限しながら送信します。
+    """
+
+    def __init__(
+        self,
+        line_client: AsyncLineClient,
+        rate_per_second: float = LINE_API_RATE_PER_SECOND,
+        burst: int = LINE_API_BURST,
+        max_concurrency: int = LINE_API_POOL_MAXSIZE,
+        max_retries: int = OUTBOUND_MAX_RETRIES,
+        retry_base_seconds: float = OUTBOUND_RETRY_BASE_SECONDS,
+        retry_max_seconds: float = OUTBOUND_RETRY_MAX_SECONDS,
+    ):
+        """初期化
+
+        Args:
+            line_client: LINE API非同期クライアント
+            rate_per_second: 1秒あたりの最大送信リクエスト数
+            burst: 一度に送信できる最大リクエスト数
+            max_concurrency: 同時に実行する送信リクエスト数
+            max_retries: 再試行の最大回数
+            retry_base_seconds: 再試行の基準待ち時間（秒）
+            retry_max_seconds: 再試行の最大待ち時間（秒）
+        """
+        self.line_client = line_client
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._concurrency = max_concurrency
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._sequence = itertools.count()
+        self._pending: Counter = Counter()
+        # 完了していないジョブのFuture（停止時に完了を待つ）
+        self._outstanding: Set[asyncio.Future] = set()
+        # 送信中のタスク（完了前にガベージコレクトされないよう参照を保持）
+        self._tasks: Set[asyncio.Task] = set()
+        # 再試行待ちのジョブのタイマー（シーケンス番号ごと）
+        self._retry_timers: Dict[int, asyncio.TimerHandle] = {}
+
+        # 統計情報
+        self._sent = 0
+        self._retries = 0
+        self._failures = 0
+        self._duplicates = 0
+        self._throttle_seconds = 0.0
+        self._throttle_wait = LatencyRecorder()
+
+    async def reply_messages(
+        self, reply_token: str, texts: List[str], priority: Priority = Priority.REPLY
+    ) -> None:
+        """返信を送信キューに追加し、送信完了まで待機
+
+        Args:
+            reply_token: 返信用トークン
+            texts: 送信するテキストのリスト（最大5件）
+            priority: 送信の優先度
+        """
+        await self._submit("reply", reply_token, texts, priority)
+
+    async def push_messages(
+        self, user_id: str, texts: List[str], priority: Priority = Priority.PROGRESS
+    ) -> None:
+        """プッシュを送信キューに追加し、送信完了まで待機
+
+        再試行時も同じ再試行キーを使うため、二重配信は発生しません。
+
+        Args:
+            user_id: 送信先のユーザーID
+            texts: 送信するテキストのリスト（最大5件）
+            priority: 送信の優先度
+        """
+        await self._submit("push", user_id, texts, priority, retry_key=str(uuid.uuid4()))
+
+    async def close(self, drain_timeout: float = 10.0) -> None:
+        """再試行待ちも含めてすべてのジョブの完了を待ち、ディスパッチャーを停止
+
+        待機時間内に完了しなかったジョブは失敗として通知します。
+
+        Args:
+            drain_timeout: ジョブの完了を待つ最大秒数
+        """
+        if self._dispatcher is None:
+            return
+        if self._outstanding:
+            await asyncio.wait(set(self._outstanding), timeout=drain_timeout)
+
+        # 時間内に送れなかったジョブは、再試行を取り消して失敗にする
+        for timer in self._retry_timers.values():
+            timer.cancel()
+        self._retry_timers.clear()
+        self._dispatcher.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(self._dispatcher, *self._tasks, return_exceptions=True)
+        unsent = [future for future in self._outstanding if not future.done()]
+        for future in unsent:
+            self._failures += 1
+            future.set_exception(RuntimeError("outbound scheduler closed before the message was sent"))
+        if unsent:
+            logger.error(f"Dropped {len(unsent)} unsent LINE messages on shutdown")
+        self._outstanding.clear()
+        self._dispatcher = None
+
+    def _submit(
+        self,
+        kind: str,
+        target: str,
+        texts: List[str],
+        priority: Priority,
+        retry_key: Optional[str] = None,
+    ) -> asyncio.Future:
+        """送信ジョブをキューに追加
+
+        Returns:
+            送信完了を通知するFuture
+        """
+        self._ensure_started()
+        job = _SendJob(
+            priority=int(priority),
+            sequence=next(self._sequence),
+            kind=kind,
+            target=target,
+            texts=texts,
+            future=asyncio.get_running_loop().create_future(),
+            retry_key=retry_key,
+        )
+        self._outstanding.add(job.future)
+        job.future.add_done_callback(self._outstanding.discard)
+        self._enqueue(job)
+        return job.future
+
+    def _enqueue(self, job: _SendJob) -> None:
+        """ジョブをキューに追加し、優先度ごとの件数を記録
+
+        Args:
+            job: 送信ジョブ
+        """
+        self._pending[job.priority] += 1
+        self._queue.put_nowait(job)
+
+    def _ensure_started(self) -> None:
+        """ディスパッチャーを起動（初回のみ）"""
+        if self._dispatcher is None:
+            self._queue = asyncio.PriorityQueue()
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def _dispatch_loop(self) -> None:
+        """優先度順にジョブを取り出し、レート制限しながら送信"""
+        while True:
+            # 送信枠とトークンを先に確保し、その時点で最も優先度の高いジョブを取り出す
+            await self._semaphore.acquire()
+            waited = await self._bucket.acquire()
+            self._throttle_wait.record(waited)
+            self._throttle_seconds += waited
+            job = await self._queue.get()
+            self._pending[job.priority] -= 1
+            task = asyncio.create_task(self._run_job(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_job(self, job: _SendJob) -> None:
+        """ジョブを1回送信し、結果に応じて完了・再試行・失敗を判定
+
+        Args:
+            job: 送信ジョブ
+        """
+        try:
+            if job.kind == "reply":
+                await self.line_client.reply_messages(job.target, job.texts)
+            else:
+                await self.line_client.push_messages(
+                    job.target, job.texts, retry_key=job.retry_key
+                )
+            self._sent += 1
+            self._resolve(job)
+        except ApiException as e:
+            if e.status == 409 and job.retry_key:
+                # 同じ再試行キーのリクエストが受理済み（前回の試行で配信済み）
+                self._duplicates += 1
+                self._resolve(job)
+            elif self._is_retryable(job, e.status):
+                self._schedule_retry(job, self._retry_after(e))
+            else:
+                self._fail(job, e)
+        except (ClientError, asyncio.TimeoutError) as e:
+            if self._is_retryable(job, None):
+                self._schedule_retry(job)
+            else:
+                self._fail(job, e)
+        except Exception as e:
+            self._fail(job, e)
+        finally:
+            self._semaphore.release()
+            self._queue.task_done()
+
+    def _is_retryable(self, job: _SendJob, status: Optional[int]) -> bool:
+        """再試行できるかどうかを判定
+
+        返信はLINE側で受理された可能性がある場合（5xxや通信エラー）に再試行すると
+        二重配信になるため、確実に未配信である429のみ再試行します。
+
+        Args:
+            job: 送信ジョブ
+            status: HTTPステータスコード（通信エラーの場合はNone）
+
+        Returns:
+            再試行できればTrue
+        """
+        if job.attempt >= self.max_retries:
+            return False
+        if status == 429:
+            return True
+        if job.kind == "push":
+            return status is None or status >= 500
+        return False
+
+    @staticmethod
+    def _retry_after(error: ApiException) -> Optional[float]:
+        """Retry-Afterヘッダーから待ち時間を取得
+
+        Args:
+            error: LINE APIの例外
+
+        Returns:
+            待ち時間（秒）。ヘッダーがない場合はNone
+        """
+        headers = error.headers or {}
+        value = headers.get("Retry-After")
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def _schedule_retry(self, job: _SendJob, delay: Optional[float] = None) -> None:
+        """ジッター付き指数バックオフで再試行を予約
+
+        Args:
+            job: 送信ジョブ
+            delay: 待ち時間（秒）。未指定時はバックオフで算出
+        """
+        if delay is None:
+            backoff = min(self.retry_max_seconds, self.retry_base_seconds * (2 ** job.attempt))
+            delay = random.uniform(0, backoff)
+        job.attempt += 1
+        self._retries += 1
+        logger.warning(
+            f"Retrying LINE {job.kind} in {delay:.2f}s (attempt {job.attempt}/{self.max_retries})"
+        )
+        self._retry_timers[job.sequence] = asyncio.get_running_loop().call_later(
+            delay, self._retry_due, job
+        )
+
+    def _retry_due(self, job: _SendJob) -> None:
+        """待ち時間が経過した再試行をキューに戻す
+
+        Args:
+            job: 送信ジョブ
+        """
+        self._retry_timers.pop(job.sequence, None)
+        self._enqueue(job)
+
+    def _resolve(self, job: _SendJob) -> None:
+        """ジョブを完了として通知"""
+        if not job.future.done():
+            job.future.set_result(None)
+
+    def _fail(self, job: _SendJob, error: Exception) -> None:
+        """ジョブを失敗として通知"""
+        self._failures += 1
+        logger.error(f"Failed to send LINE {job.kind} after {job.attempt} retries: {error}")
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            キュー長・スロットリング時間・再試行数などを含む辞書
+        """
+        depth = {priority.name.lower(): self._pending[int(priority)] for priority in Priority}
+        return {
+            "queue_depth": depth,
+            "waiting_retries": len(self._retry_timers),
+            "in_flight": len(self._tasks),
+            "sent": self._sent,
+            "retries": self._retries,
+            "failures": self._failures,
+            "duplicates_suppressed": self._duplicates,
+            "throttle_seconds_total": self._throttle_seconds,
+            "throttle_wait_seconds": self._throttle_wait.snapshot(),
+        }
@@ -0,0 +1,155 @@
+"""Webhookリクエストの記録モジュール
+
+このモジュールは、受信したWebhookリクエストボディを匿名化してJSON Lines形式で
+ファイルに追記します。記録したファイルは benchmarks/webhook_replay.py で再生し、
+実際のトラフィックに近い負荷試験に使用します。
+
+記録する各行の形式:
+    {"received_at": <UNIX時刻>, "body": <匿名化したWebhookボディ>}
+"""
+
+import copy
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from services.line_service.constants import (
+    WEBHOOK_RECORD_REDACT_TEXT,
+    WEBHOOK_RECORD_SALT,
+)
+from utils.logging import setup_cloud_logging
+
+logger = setup_cloud_logging("webhook_recorder")
+
+# 匿名化するソースのIDフィールドと、LINEのID形式に合わせた接頭辞
+SOURCE_ID_PREFIXES = {"userId": "U", "groupId": "C", "roomId": "R"}
+
+
+def pseudonymize(value: str, prefix: str, salt: str) -> str:
+    """IDを同じ形式の仮名に置き換える
+
+    同じIDは常に同じ仮名になるため、ユーザー単位の順序や並行性は再生時も保たれます。
+
+    Args:
+        value: 元のID
+        prefix: 仮名の接頭辞
+        salt: ハッシュのソルト
+
+    Returns:
+        接頭辞と32桁の16進数からなる仮名
+    """
+    digest = hashlib.sha256(f"{salt}:{value}".encode("utf-8")).hexdigest()
+    return prefix + digest[:32]
+
+
+def sanitize_body(body: Dict[str, Any], salt: str = "", redact_text: bool = False) -> Dict[str, Any]:
+    """Webhookボディから個人を特定できる情報を取り除く
+
+    Args:
+        body: Webhookボディ
+        salt: 仮名化のソルト
+        redact_text: テキストメッセージの本文も伏せるかどうか
+
+    Returns:
+        匿名化したWebhookボディ（引数は変更しない）
+    """
+    sanitized = copy.deepcopy(body)
+    for event in sanitized.get("events", []):
+        # 返信トークンは再生時に発行し直すため記録しない
+        event.pop("replyToken", None)
+
+        source = event.get("source") or {}
+        for field, prefix in SOURCE_ID_PREFIXES.items():
+            if source.get(field):
+                source[field] = pseudonymize(source[field], prefix, salt)
+
+        message = event.get("message") or {}
+        if redact_text and message.get("type") == "text":
+            # 長さは応答キャッシュ等の挙動に影響するため保持する
+            message["text"] = "＊" * len(message.get("text", ""))
+            message.pop("emojis", None)
+            message.pop("mention", None)
+    return sanitized
+
+
+class WebhookRecorder:
+    """Webhookリクエストボディを匿名化してファイルに追記するクラス"""
+
+    def __init__(
+        self,
+        path: str,
+        salt: str = WEBHOOK_RECORD_SALT,
+        redact_text: bool = WEBHOOK_RECORD_REDACT_TEXT,
+    ):
+        """初期化
+
+        Args:
+            path: 記録先のファイルパス
+            salt: 仮名化のソルト
+            redact_text: テキストメッセージの本文も伏せるかどうか
+        """
+        self.path = path
+        self.salt = salt
+        self.redact_text = redact_text
+        self._recorded = 0
+        self._failed = 0
+        self._lock = threading.Lock()
+        # 受信順に追記するため、書き込みは1つのスレッドで行う
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webhook-recorder")
+        logger.info(f"Recording webhook bodies to {path}")
+
+    def record(self, body_text: str, received_at: Optional[float] = None) -> None:
+        """Webhookリクエストボディを記録
+
+        匿名化とファイルへの書き込みは専用のスレッドで行い、Webhookの応答を待たせません。
+        記録に失敗してもWebhookの処理には影響させません。
+
+        Args:
+            body_text: Webhookリクエストボディ（署名検証済み）
+            received_at: 受信時刻（UNIX時刻）。省略時は現在時刻
+        """
+        try:
+            self._writer.submit(self._write, body_text, received_at or time.time())
+        except RuntimeError as e:
+            # 停止後に届いたリクエストは記録しない
+            with self._lock:
+                self._failed += 1
+            logger.warning(f"Failed to record webhook body: {e}")
+
+    def _write(self, body_text: str, received_at: float) -> None:
+        """Webhookリクエストボディを匿名化してファイルに追記（書き込み用のスレッドで実行）
+
+        Args:
+            body_text: Webhookリクエストボディ
+            received_at: 受信時刻（UNIX時刻）
+        """
+        try:
+            body = sanitize_body(json.loads(body_text), self.salt, self.redact_text)
+            line = json.dumps(
+                {"received_at": received_at, "body": body},
+                ensure_ascii=False,
+            )
+            with self._lock:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(line + "\n")
+                self._recorded += 1
+        except Exception as e:
+            with self._lock:
+                self._failed += 1
+            logger.warning(f"Failed to record webhook body: {e}")
+
+    def close(self) -> None:
+        """書き込み待ちの記録をすべて書き込んでから停止"""
+        self._writer.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            記録件数と失敗件数
+        """
+        with self._lock:
+            return {"recorded": self._recorded, "failed": self._failed}
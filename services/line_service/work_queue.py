@@ -0,0 +1,183 @@
+"""Webhookイベントのワークキューモジュール
+
+このモジュールは、Webhookで受信したイベントをバックグラウンドで処理するための
+有界キューとワーカープールを提供します。
+Webhookへの応答をエージェント処理の完了から切り離すために使用します。
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional
+
+from services.line_service.constants import (
+    WEBHOOK_QUEUE_MAXSIZE,
+    WEBHOOK_WORKER_COUNT,
+)
+from utils.deadline import deadline_scope
+from utils.logging import setup_cloud_logging
+from utils.metrics import LatencyRecorder
+from utils.prometheus_metrics import WEBHOOK_TURNAROUND_SECONDS
+
+logger = setup_cloud_logging("work_queue")
+
+
+@dataclass
+class WorkItem:
+    """キューに積まれる処理単位
+
+    Attributes:
+        events: パース済みのWebhookイベント
+        enqueued_at: キュー投入時刻（monotonic）
+        deadline: 処理期限（monotonic時刻、未設定の場合はNone）
+    """
+
+    events: list
+    enqueued_at: float = field(default_factory=time.monotonic)
+    deadline: Optional[float] = None
+
+
+class WebhookWorkQueue:
+    """Webhookイベントのワークキュークラス
+
+    有界のasyncio.Queueと固定数のワーカータスクでイベントを処理します。
+    キュー長・待ち時間・ワーカー稼働率を統計情報として提供します。
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[list], Awaitable[None]],
+        worker_count: int = WEBHOOK_WORKER_COUNT,
+        maxsize: int = WEBHOOK_QUEUE_MAXSIZE,
+    ):
+        """初期化
+
+        Args:
+            handler: イベントのリストを処理するコルーチン関数
+            worker_count: ワーカータスク数
+            maxsize: キューに保持できる最大件数
+        """
+        self.handler = handler
+        self.worker_count = worker_count
+        self.maxsize = maxsize
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._busy_workers = 0
+        self._busy_seconds = 0.0
+        self._started_at: Optional[float] = None
+
+        # 統計情報
+        self._enqueued = 0
+        self._rejected = 0
+        self._processed = 0
+        self._failed = 0
+        self._wait_time = LatencyRecorder()
+
+    async def start(self) -> None:
+        """ワーカータスクを起動"""
+        if self._workers:
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._started_at = time.monotonic()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"webhook-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        logger.info(
+            f"Webhook work queue started: workers={self.worker_count}, maxsize={self.maxsize}"
+        )
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """キューを排出してワーカータスクを停止
+
+        Args:
+            drain_timeout: キュー排出を待つ最大秒数
+        """
+        if not self._workers:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Webhook work queue did not drain in time: depth={self._queue.qsize()}"
+            )
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("Webhook work queue stopped")
+
+    def enqueue(self, events: list, deadline: Optional[float] = None) -> bool:
+        """イベントをキューに投入
+
+        Args:
+            events: パース済みのWebhookイベント
+            deadline: 処理期限（monotonic時刻）。処理中はコンテキスト変数で下流に伝わる
+
+        Returns:
+            投入できた場合はTrue、キューが満杯の場合はFalse
+        """
+        if self._queue is None:
+            raise RuntimeError("Webhook work queue is not started")
+
+        try:
+            self._queue.put_nowait(WorkItem(events=events, deadline=deadline))
+        except asyncio.QueueFull:
+            self._rejected += 1
+            logger.warning(
+                f"Webhook work queue is full, rejecting {len(events)} events"
+            )
+            return False
+
+        self._enqueued += 1
+        return True
+
+    async def _worker(self, index: int) -> None:
+        """キューからイベントを取り出して処理するワーカー
+
+        Args:
+            index: ワーカー番号（ログ用）
+        """
+        while True:
+            item = await self._queue.get()
+            started_at = time.monotonic()
+            self._wait_time.record(started_at - item.enqueued_at)
+            self._busy_workers += 1
+            try:
+                with deadline_scope(item.deadline):
+                    await self.handler(item.events)
+                self._processed += 1
+            except Exception as e:
+                self._failed += 1
+                logger.exception(f"Error in webhook worker {index}: {e}")
+            finally:
+                self._busy_workers -= 1
+                finished_at = time.monotonic()
+                self._busy_seconds += finished_at - started_at
+                WEBHOOK_TURNAROUND_SECONDS.observe(finished_at - item.enqueued_at)
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        """統計情報を取得
+
+        Returns:
+            キュー長・待ち時間・ワーカー稼働率を含む辞書
+        """
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        capacity = uptime * self.worker_count
+        return {
+            "depth": self._queue.qsize() if self._queue else 0,
+            "maxsize": self.maxsize,
+            "workers": self.worker_count,
+            "busy_workers": self._busy_workers,
+            "utilization": self._busy_seconds / capacity if capacity else 0.0,
+            "enqueued": self._enqueued,
+            "rejected": self._rejected,
+            "processed": self._processed,
+            "failed": self._failed,
+            "wait_seconds": self._wait_time.snapshot(),
+        }
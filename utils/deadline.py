@@ -0,0 +1,66 @@
+"""リクエスト期限ユーティリティ
+
+このモジュールは、Webhook受信時に決めた処理期限をコンテキスト変数で
+下流の処理（エージェント、サブエージェント、ツール呼び出し）へ伝える仕組みを提供します。
+期限はtime.monotonic()基準の絶対時刻で保持します。
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# 現在の処理の期限（monotonic時刻）。未設定の場合はNone
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def new_deadline(seconds: float) -> float:
+    """現在時刻から指定秒数後の期限を作成
+
+    Args:
+        seconds: 期限までの秒数
+
+    Returns:
+        期限（monotonic時刻）
+    """
+    return time.monotonic() + seconds
+
+
+def get_deadline() -> Optional[float]:
+    """現在の処理の期限を取得
+
+    Returns:
+        期限（monotonic時刻）。未設定の場合はNone
+    """
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """期限までの残り秒数を取得
+
+    Returns:
+        残り秒数（期限切れの場合は0以下）。期限が未設定の場合はNone
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]) -> Iterator[None]:
+    """ブロック内の処理に期限を設定
+
+    すでに設定されている期限の方が早い場合は、そちらを優先します。
+
+    Args:
+        deadline: 期限（monotonic時刻）。Noneの場合は現在の期限を引き継ぐ
+    """
+    current = _deadline.get()
+    if deadline is None or (current is not None and current < deadline):
+        deadline = current
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
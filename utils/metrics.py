@@ -0,0 +1,104 @@
+"""メトリクス収集ユーティリティ
+
+このモジュールは、各コンポーネントの統計情報を集約するための簡易的な仕組みを提供します。
+レイテンシの分位点計算や、統計プロバイダーの登録・一括取得を担当します。
+"""
+
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict
+
+# 登録済みの統計プロバイダー
+_stats_providers: Dict[str, Callable[[], dict]] = {}
+_providers_lock = threading.Lock()
+
+
+class LatencyRecorder:
+    """レイテンシ記録クラス
+
+    直近のサンプルをリングバッファに保持し、分位点を計算します。
+    """
+
+    def __init__(self, window_size: int = 1024):
+        """初期化
+
+        Args:
+            window_size: 保持するサンプル数の上限
+        """
+        self._samples: Deque[float] = deque(maxlen=window_size)
+        self._count = 0
+        self._total = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """サンプルを記録
+
+        Args:
+            seconds: 計測値（秒）
+        """
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+            self._total += seconds
+
+    def percentile(self, q: float) -> float:
+        """分位点を取得
+
+        Args:
+            q: 分位（0.0〜1.0）
+
+        Returns:
+            分位点の値（サンプルがない場合は0.0）
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, max(0, round(q * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> dict:
+        """統計情報のスナップショットを取得
+
+        Returns:
+            件数・平均・p50/p95/p99を含む辞書
+        """
+        with self._lock:
+            count = self._count
+            total = self._total
+        return {
+            "count": count,
+            "avg": total / count if count else 0.0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+def register_stats_provider(name: str, provider: Callable[[], dict]) -> None:
+    """統計プロバイダーを登録
+
+    Args:
+        name: プロバイダー名（統計情報のキー）
+        provider: 統計情報の辞書を返す関数
+    """
+    with _providers_lock:
+        _stats_providers[name] = provider
+
+
+def collect_stats() -> Dict[str, dict]:
+    """登録済みのすべての統計情報を取得
+
+    Returns:
+        プロバイダー名をキーとした統計情報の辞書
+    """
+    with _providers_lock:
+        providers = dict(_stats_providers)
+
+    stats = {}
+    for name, provider in providers.items():
+        try:
+            stats[name] = provider()
+        except Exception as e:
+            stats[name] = {"error": str(e)}
+    return stats
@@ -0,0 +1,144 @@
+"""Prometheusメトリクスモジュール
+
+このモジュールは、/metricsエンドポイントで公開するPrometheusメトリクスを定義します。
+エージェントのステップ・ツール呼び出し・モデルのトークン使用量・意図ルーターの振り分け・セッション履歴の圧縮に加え、
+WebhookとLINE APIのレイテンシを記録します。
+register_stats_providerで登録された統計情報もゲージとして公開します。
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from utils.metrics import collect_stats
+
+# エージェントのレイテンシは数秒〜数十秒になるため、上限を広めに取る
+AGENT_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90)
+API_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+AGENT_RUN_SECONDS = Histogram(
+    "agent_run_seconds",
+    "Wall time of one agent run (user turn), per entry agent",
+    ["mode", "outcome", "agent"],
+    buckets=AGENT_LATENCY_BUCKETS,
+)
+AGENT_STEP_SECONDS = Histogram(
+    "agent_step_seconds",
+    "Time between consecutive agent events, attributed to the author of the later event",
+    ["author"],
+    buckets=AGENT_LATENCY_BUCKETS,
+)
+AGENT_TOOL_SECONDS = Histogram(
+    "agent_tool_call_seconds",
+    "Duration of a tool call, from function call to function response",
+    ["tool"],
+    buckets=AGENT_LATENCY_BUCKETS,
+)
+AGENT_MODEL_TOKENS = Counter(
+    "agent_model_tokens",
+    "Tokens reported in usage_metadata, per model",
+    ["model", "kind"],
+)
+WEBHOOK_REQUEST_SECONDS = Histogram(
+    "webhook_request_seconds",
+    "Time to acknowledge a LINE webhook request",
+    ["status"],
+    buckets=API_LATENCY_BUCKETS,
+)
+WEBHOOK_TURNAROUND_SECONDS = Histogram(
+    "webhook_turnaround_seconds",
+    "Time from webhook ingress until the event batch has been fully handled",
+    buckets=AGENT_LATENCY_BUCKETS,
+)
+INTENT_ROUTER_DECISIONS = Counter(
+    "intent_router_decisions",
+    "Text messages classified by the intent router, per intent and action",
+    ["intent", "action"],
+)
+SESSION_TOKENS_SAVED = Histogram(
+    "session_history_tokens_saved",
+    "Estimated history tokens per turn removed from the prompt by session compaction",
+    buckets=(0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000),
+)
+SESSION_COMPACTIONS = Counter(
+    "session_compactions",
+    "Session history compactions, per summarizer and outcome",
+    ["summarizer", "outcome"],
+)
+LINE_API_SECONDS = Histogram(
+    "line_api_request_seconds",
+    "Latency of LINE Messaging API calls",
+    ["operation", "outcome"],
+    buckets=API_LATENCY_BUCKETS,
+)
+
+
+@contextmanager
+def observe_line_api(operation: str) -> Iterator[None]:
+    """ブロック内のLINE API呼び出しの時間を記録
+
+    例外が発生した場合は outcome=error として記録します。
+
+    Args:
+        operation: API操作名（reply / push / content など）
+    """
+    started_at = time.monotonic()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        LINE_API_SECONDS.labels(operation=operation, outcome=outcome).observe(
+            time.monotonic() - started_at
+        )
+
+
+class StatsProviderCollector(Collector):
+    """登録済みの統計プロバイダーの数値をゲージとして公開するコレクター"""
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        gauge = GaugeMetricFamily(
+            "app_stats",
+            "Numeric values from the /stats providers",
+            labels=["provider", "key"],
+        )
+        for provider, stats in collect_stats().items():
+            for key, value in _flatten(stats):
+                gauge.add_metric([provider, key], value)
+        yield gauge
+
+
+def _flatten(stats: dict, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """入れ子の統計情報から数値のみを取り出す
+
+    Args:
+        stats: 統計情報の辞書
+        prefix: キーの接頭辞
+
+    Yields:
+        ドット区切りのキーと数値の組
+    """
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}.")
+        elif isinstance(value, bool):
+            yield name, float(value)
+        elif isinstance(value, (int, float)):
+            yield name, float(value)
+
+
+REGISTRY.register(StatsProviderCollector())
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Prometheusのテキスト形式でメトリクスを出力
+
+    Returns:
+        メトリクス本文とContent-Type
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,124 @@
+"""スプール付きバッファモジュール
+
+このモジュールは、小さいデータはメモリ上に、一定サイズを超えたデータは
+一時ファイルに退避して保持するバッファを提供します。
+内容はコピーせずにmemoryviewとして参照できます（ファイルの場合はmmap経由）。
+一時ファイルに退避した場合は、パスを渡して別プロセスから読み込むこともできます。
+"""
+
+import io
+import mmap
+import tempfile
+from typing import BinaryIO, Optional
+
+from utils.logging import setup_cloud_logging
+
+logger = setup_cloud_logging("spooled_buffer")
+
+
+class SpooledBuffer:
+    """スプール付きバッファクラス
+
+    tempfile.SpooledTemporaryFileと同様に、閾値まではBytesIOに書き込み、
+    超えた時点で一時ファイルへ移します。getbuffer()で取得したmemoryviewは
+    使い終わったら release()（またはwith文）で解放してください。
+    """
+
+    def __init__(self, max_memory_size: int):
+        """初期化
+
+        Args:
+            max_memory_size: メモリ上に保持する最大バイト数
+        """
+        self.max_memory_size = max_memory_size
+        self._file: BinaryIO = io.BytesIO()
+        self._mmap: Optional[mmap.mmap] = None
+        self._size = 0
+        self._rolled_over = False
+
+    @property
+    def size(self) -> int:
+        """書き込まれたバイト数"""
+        return self._size
+
+    @property
+    def rolled_over(self) -> bool:
+        """一時ファイルに退避済みかどうか"""
+        return self._rolled_over
+
+    @property
+    def path(self) -> Optional[str]:
+        """書き込み済みの内容を反映した一時ファイルのパス（メモリ上に保持している場合はNone）"""
+        if not self._rolled_over:
+            return None
+        self._file.flush()
+        return self._file.name
+
+    def write(self, data: bytes) -> None:
+        """データを追記
+
+        Args:
+            data: 追記するデータ
+        """
+        if not self._rolled_over and self._size + len(data) > self.max_memory_size:
+            self._roll_over()
+        self._file.write(data)
+        self._size += len(data)
+
+    def getbuffer(self) -> memoryview:
+        """内容をコピーせずに参照するmemoryviewを取得
+
+        Returns:
+            バッファ全体のmemoryview
+        """
+        if not self._rolled_over:
+            return self._file.getbuffer()
+
+        if self._mmap is None:
+            self._file.flush()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)
+
+    def getvalue(self) -> bytes:
+        """内容をbytesとして取得
+
+        一時ファイルの場合は中間バッファを経由せず、直接bytesに読み込みます。
+
+        Returns:
+            バッファ全体の内容
+        """
+        if not self._rolled_over:
+            return self._file.getvalue()
+
+        self._file.flush()
+        self._file.seek(0)
+        try:
+            return self._file.read(self._size)
+        finally:
+            self._file.seek(0, 2)
+
+    def close(self) -> None:
+        """バッファを破棄し、メモリと一時ファイルを解放"""
+        try:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._file.close()
+        except BufferError as e:
+            logger.warning(f"Spooled buffer closed while still referenced: {e}")
+
+    def _roll_over(self) -> None:
+        """メモリ上の内容を一時ファイルに移す"""
+        # 別プロセスからパスで読み込めるよう、名前付きの一時ファイルにする（閉じると削除される）
+        spool_file = tempfile.NamedTemporaryFile(prefix="spool-")
+        with self._file.getbuffer() as view:
+            spool_file.write(view)
+        self._file.close()
+        self._file = spool_file
+        self._rolled_over = True
+
+    def __enter__(self) -> "SpooledBuffer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()